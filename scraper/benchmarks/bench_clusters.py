@@ -0,0 +1,133 @@
+"""Time duplicate detection: signing reports and clustering them by site.
+
+With the scraper package installed:
+
+    python benchmarks/bench_clusters.py [--sizes 50000,500000] [--pairwise-limit 50000]
+
+Each size is a cache of that many open reports spread over sites with a
+long-tailed distribution, written from the webcompat.com template. A fifth
+of them are near-copies of another report for the same site. For each size
+this times signing every report with update_signatures(), a second,
+no-op update_signatures(), and duplicate_clusters(). Up to --pairwise-limit
+reports, it also times comparing every pair of signatures within each site,
+which finds the same pairs LSH is estimating.
+"""
+import os
+import random
+import tempfile
+import time
+import warnings
+from typing import List
+
+import click
+import numpy as np
+
+from scraper.cache import GithubCache
+from scraper.dump import duplicate_clusters
+from scraper.similarity import NUM_HASHES, THRESHOLD
+
+TEMPLATE = """\
+<!-- @browser: Firefox {version}.0 -->
+**URL**: https://{hostname}/page/{number}
+
+**Browser / Version**: Firefox {version}.0
+**Operating System**: {os}
+**Tested Another Browser**: Yes
+
+**Problem type**: {problem}
+**Description**: {description}
+**Steps to Reproduce**:
+{steps}
+
+<details><summary>Browser Configuration</summary>gfx.webrender.all: false</details>
+
+_From [webcompat.com](https://webcompat.com/) with ❤️_
+"""
+PROBLEMS = ["Site is not usable", "Design is broken", "Video or audio doesn't play",
+            "Something else"]
+OSES = ["Windows 10", "Mac OS X 10.14", "Android 9", "Linux"]
+
+
+def sentence(rng: random.Random, vocabulary: List[str], n: int) -> str:
+    return " ".join(rng.choice(vocabulary) for _ in range(n))
+
+
+def generate(n: int, seed: int = 0) -> List[dict]:
+    rng = random.Random(seed)
+    vocabulary = ["word%d" % i for i in range(20000)]
+    n_sites = max(1, n // 20)
+    # Zipf-ish: a few sites get most of the reports
+    weights = [1 / (rank + 1) for rank in range(n_sites)]
+    sites = rng.choices(range(n_sites), weights, k=n)
+    issues = []
+    first = {}
+    for number, site in enumerate(sites, 1):
+        if site in first and rng.random() < 0.2:
+            words = first[site].split()
+            for i in rng.sample(range(len(words)), 3):
+                words[i] = rng.choice(vocabulary)
+            description = " ".join(words)
+        else:
+            description = sentence(rng, vocabulary, rng.randrange(20, 120))
+            first.setdefault(site, description)
+        body = TEMPLATE.format(
+            version=rng.randrange(60, 70), hostname="site%d.example" % site, number=number,
+            os=rng.choice(OSES), problem=rng.choice(PROBLEMS), description=description,
+            steps=sentence(rng, vocabulary, 10))
+        issues.append({
+            "number": number, "title": "site%d.example - see bug description" % site,
+            "body": body, "state": "open", "created_at": "2018-01-01T00:00:00Z",
+            "closed_at": None, "updated_at": "2018-01-01T00:00:00Z",
+        })
+    return issues
+
+
+def pairwise(signed) -> int:
+    """Count the similar pairs within each site by comparing every pair."""
+    by_site = {}
+    for _, _, hostname, signature in signed:
+        by_site.setdefault(hostname, []).append(signature)
+    pairs = 0
+    for signatures in by_site.values():
+        matrix = np.frombuffer(b"".join(signatures), dtype=np.uint32).reshape(-1, NUM_HASHES)
+        for i in range(len(matrix) - 1):
+            agreement = (matrix[i + 1:] == matrix[i]).mean(axis=1)
+            pairs += int((agreement >= THRESHOLD).sum())
+    return pairs
+
+
+def timed(label: str, n: int, f):
+    started = time.perf_counter()
+    value = f()
+    click.echo("%9d  %-22s %9.3fs" % (n, label, time.perf_counter() - started))
+    return value
+
+
+@click.command()
+@click.option("--sizes", default="50000,500000",
+              help="Comma-separated numbers of open reports to generate.")
+@click.option("--pairwise-limit", default=50000, show_default=True,
+              help="Largest size to also compare every pair of reports for.")
+def main(sizes, pairwise_limit):
+    warnings.filterwarnings("ignore", "Creating database")
+    for n in (int(size) for size in sizes.split(",")):
+        issues = generate(n)
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = GithubCache(os.path.join(tmp, "issues.db"), None)
+            for i in range(0, n, 1000):
+                cache._store(issues[i:i + 1000])
+            timed("update_signatures", n, cache.update_signatures)
+            timed("update_signatures again", n, cache.update_signatures)
+            signed = timed("open_signatures", n, cache.open_signatures)
+            clusters = timed("duplicate_clusters", n, lambda: duplicate_clusters(
+                signed, by="hostname", limit=None, per_site=None))
+            in_clusters = sum(c["size"] for site in clusters.values() for c in site)
+            click.echo("%9d  %d reports in %d clusters" % (
+                n, in_clusters, sum(map(len, clusters.values()))))
+            if n <= pairwise_limit:
+                pairs = timed("pairwise", n, lambda: pairwise(signed))
+                click.echo("%9d  %d similar pairs" % (n, pairs))
+
+
+if __name__ == "__main__":
+    main()
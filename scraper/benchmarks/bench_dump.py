@@ -0,0 +1,134 @@
+"""Time each stage of the dump pipeline on synthetic data.
+
+With the scraper package installed:
+
+    python benchmarks/bench_dump.py [--sizes 10000,100000,1000000] [--json out.json]
+
+For each size, this writes that many webcompat issues to a real GithubCache
+on disk, generates a tenth as many Bugzilla bugs linking to them (and as many
+platform-rel bugs), then times each stage and records its peak traced memory.
+If pyarrow is installed, it also times writing an Arrow snapshot and reading
+the issues back from it.
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from typing import Any, Callable, Dict, List
+
+import click
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "scraper", "tests"))
+import generate_fixtures  # noqa: E402
+
+from scraper import dump  # noqa: E402
+from scraper.cache import BugzillaCache, GithubCache  # noqa: E402
+
+try:
+    import pyarrow  # noqa: F401
+except ImportError:
+    snapshot = None
+else:
+    from scraper import snapshot  # noqa: E402
+
+
+class FakeBugzillaClient:
+    def __init__(self, see_also, partner_rel):
+        self.see_also = see_also
+        self.partner_rel = partner_rel
+
+    def search(self, params):
+        return self.see_also if params.get("f1") == "see_also" else self.partner_rel
+
+
+def measure(name: str, f: Callable, *args, trace: bool = True) -> Dict[str, Any]:
+    if trace:
+        tracemalloc.start()
+    started = time.perf_counter()
+    value = f(*args)
+    elapsed = time.perf_counter() - started
+    peak = None
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    rows = len(value) if hasattr(value, "__len__") else None
+    return {"stage": name, "seconds": elapsed, "peak_mb": peak, "rows": rows, "value": value}
+
+
+def run(n: int, trace: bool) -> List[Dict[str, Any]]:
+    issues = generate_fixtures.generate_webcompat_at_scale(n)
+    numbers = [issue["number"] for issue in issues]
+    see_also = generate_fixtures.generate_bugzilla_at_scale(max(1, n // 10), numbers)["bugs"]
+    partner_rel = generate_fixtures.generate_platform_rel_at_scale(max(1, n // 10))["bugs"]
+
+    stages = []
+    warnings.filterwarnings("ignore", "Creating database")
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = GithubCache(os.path.join(tmp, "issues.db"), None)
+        stages.append(measure("cache store", lambda: cache._store(issues) or issues, trace=trace))
+        stages.append(measure("load_issues", dump.load_issues, cache, trace=trace))
+
+        bz = pd.DataFrame(see_also).set_index("id")
+        stages.append(measure("see_also join", dump.see_also_join_table, bz, trace=trace))
+
+        by_partner = measure("sort_partner_rel_bugs", dump.sort_partner_rel_bugs, partner_rel,
+                             trace=trace)
+        stages.append(by_partner)
+        dates_x = [d.date() for d in pd.date_range("2016-01-01", pd.Timestamp.today())]
+        stages.append(measure("open_bugs_series", dump.open_bugs_series, by_partner["value"],
+                              dates_x, trace=trace))
+
+        fetchers = dump.fetch_bugzilla_webcompat_bugs, dump.fetch_bugzilla_partner_rel_bugs
+        dump.fetch_bugzilla_webcompat_bugs = lambda: see_also
+        dump.fetch_bugzilla_partner_rel_bugs = lambda: partner_rel
+        try:
+            stages.append(measure("dump", dump.dump, cache, trace=trace))
+        finally:
+            dump.fetch_bugzilla_webcompat_bugs, dump.fetch_bugzilla_partner_rel_bugs = fetchers
+
+        if snapshot is not None:
+            path = os.path.join(tmp, "issues.db")
+            bugzilla_cache = BugzillaCache(path, FakeBugzillaClient(see_also, partner_rel))
+            bugzilla_cache.update()
+            directory = os.path.join(tmp, "snapshot")
+            stages.append(measure(
+                "snapshot export",
+                lambda: snapshot.export(cache, bugzilla_cache, directory)["months"],
+                trace=trace))
+            stages.append(measure("snapshot read_issues", snapshot.read_issues, directory,
+                                  trace=trace))
+            stages.append(measure(
+                "dump from snapshot", dump.dump, cache, bugzilla_cache, False, None, None,
+                directory, trace=trace))
+        cache.db.close()
+
+    for stage in stages:
+        del stage["value"]
+        stage["size"] = n
+    return stages
+
+
+@click.command()
+@click.option("--sizes", default="10000,100000,1000000",
+              help="Comma-separated numbers of webcompat issues to generate.")
+@click.option("--memory/--no-memory", default=True,
+              help="Trace peak memory per stage. Tracing slows every stage down.")
+@click.option("--json", "json_path", help="Also write the results to this file.")
+def main(sizes, memory, json_path):
+    results = []
+    for n in (int(size) for size in sizes.split(",")):
+        for stage in run(n, memory):
+            results.append(stage)
+            peak = "%10.1f" % stage["peak_mb"] if stage["peak_mb"] is not None else "%10s" % "-"
+            click.echo("%9d  %-22s %9.3fs %s MB" % (n, stage["stage"], stage["seconds"], peak))
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Measure how long the scraper's entry points take to import.
+
+With the scraper package installed:
+
+    python benchmarks/bench_import.py [--module scraper.dump] [--max-ms 300]
+
+Each module is imported in a fresh interpreter under `python -X importtime`.
+This reports the total and the slowest top-level imports, and fails if a
+heavy dependency that should only load when a stage runs got imported, or
+if an import takes longer than --max-ms.
+"""
+import re
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+import click
+
+# Only the stages that need these should import them
+HEAVY = ["pandas", "numpy", "github3", "dateutil", "requests"]
+LINE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def import_times(module: str) -> Tuple[Dict[str, int], List[Tuple[int, str]]]:
+    """Return ({module: cumulative us}, [(cumulative us, name)] of module's direct imports)."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + module],
+        stderr=subprocess.PIPE, universal_newlines=True, check=True).stderr
+    cumulative = {}
+    seen: List[Tuple[int, int, str]] = []
+    for line in stderr.splitlines():
+        match = LINE_RE.match(line)
+        if match:
+            us, depth, name = int(match.group(2)), len(match.group(3)), match.group(4)
+            cumulative[name] = us
+            seen.append((depth, us, name))
+
+    # A module's imports are listed before it, indented one level deeper
+    position = next(i for i, (_, _, name) in enumerate(seen) if name == module)
+    depth = seen[position][0]
+    children = []
+    for child_depth, us, name in reversed(seen[:position]):
+        if child_depth <= depth:
+            break
+        if child_depth == depth + 2:
+            children.append((us, name))
+    return cumulative, children
+
+
+@click.command()
+@click.option("--module", "modules", multiple=True,
+              default=["scraper.dump", "scraper.compact", "scraper.daemon", "scraper.api"],
+              show_default=True)
+@click.option("--max-ms", type=float, help="Fail if any module takes longer than this.")
+@click.option("--top", default=5, show_default=True, help="How many slow imports to list.")
+def main(modules, max_ms, top):
+    failed = False
+    for module in modules:
+        cumulative, children = import_times(module)
+        total = cumulative[module] / 1000
+        click.echo("%s: %.1f ms" % (module, total))
+        for us, name in sorted(children, reverse=True)[:top]:
+            click.echo("  %8.1f ms  %s" % (us / 1000, name))
+        heavy = [name for name in HEAVY if name in cumulative]
+        if heavy:
+            click.echo("  imports %s" % ", ".join(heavy), err=True)
+            failed = True
+        if max_ms is not None and total > max_ms:
+            click.echo("  over the %.0f ms budget" % max_ms, err=True)
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Compare the vectorized open-bug series against the original per-day loop.
+
+With the scraper package installed:
+
+    python benchmarks/bench_partner_series.py [n_bugs]
+"""
+import datetime as dt
+import random
+import sys
+import time
+
+import dateutil.parser
+from dateutil.rrule import rrule, DAILY
+
+from scraper.dump import SITE_TO_TAGS, open_bugs_series
+
+
+def legacy_open_bugs_series(by_partner, dates_x):
+    result = {}
+    for partner, bugs in by_partner.items():
+        open_bugs = [0] * len(dates_x)
+        for bug in bugs:
+            created = dateutil.parser.parse(bug["creation_time"]).date()
+            if bug["cf_last_resolved"]:
+                last_resolved = dateutil.parser.parse(bug["cf_last_resolved"]).date()
+            else:
+                last_resolved = dt.date.max
+            for j, d in enumerate(dates_x):
+                if created <= d <= last_resolved:
+                    open_bugs[j] += 1
+        result[partner] = open_bugs
+    return result
+
+
+def synthetic_bugs(n_bugs, seed=0):
+    rng = random.Random(seed)
+    start = dt.datetime(2015, 6, 1)
+    span = (dt.datetime.now() - start).days
+    partners = list(SITE_TO_TAGS)
+    by_partner = {}
+    for _ in range(n_bugs):
+        created = start + dt.timedelta(days=rng.randrange(span), seconds=rng.randrange(86400))
+        resolved = None
+        if rng.random() < 0.7:
+            resolved = created + dt.timedelta(days=rng.randrange(400))
+        by_partner.setdefault(rng.choice(partners), []).append({
+            "creation_time": created.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "cf_last_resolved": resolved and resolved.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        })
+    return by_partner
+
+
+def timed(f, *args):
+    started = time.perf_counter()
+    value = f(*args)
+    return value, time.perf_counter() - started
+
+
+def main(n_bugs=100_000):
+    dates_x = [x.date() for x in rrule(DAILY, dtstart=dt.date(2016, 1, 1), until=dt.date.today())]
+    by_partner = synthetic_bugs(n_bugs)
+    print(f"{n_bugs} bugs, {len(by_partner)} partners, {len(dates_x)} days")
+
+    fast, fast_elapsed = timed(open_bugs_series, by_partner, dates_x)
+    print(f"vectorized: {fast_elapsed:.3f}s")
+    slow, slow_elapsed = timed(legacy_open_bugs_series, by_partner, dates_x)
+    print(f"legacy loop: {slow_elapsed:.3f}s ({slow_elapsed / fast_elapsed:.0f}x)")
+
+    assert fast == slow, "vectorized series differs from the legacy loop"
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,68 @@
+"""Compare the vectorized see_also join table against the original loop.
+
+With the scraper package installed:
+
+    python benchmarks/bench_see_also.py [n_bugs]
+"""
+import os
+import re
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "scraper", "tests"))
+import generate_fixtures  # noqa: E402
+
+from scraper.dump import see_also_join_table  # noqa: E402
+
+
+def legacy_see_also_join_table(bz):
+    join_table_rows = []
+    for key, urls in bz["see_also"].items():
+        for url in urls:
+            if "webcompat" not in url:
+                continue
+            m = re.search(r"\d{2,}", url)
+            if not m:
+                continue
+            webcompat_id = int(m[0])
+            join_table_rows.append({
+                "bugzilla_id": key,
+                "webcompat_id": webcompat_id,
+            })
+    return (
+        pd.DataFrame(join_table_rows, columns=["bugzilla_id", "webcompat_id"])
+        .drop_duplicates()
+    )
+
+
+def timed(f, *args):
+    started = time.perf_counter()
+    value = f(*args)
+    return value, time.perf_counter() - started
+
+
+def main(n_bugs=100_000):
+    numbers = list(range(1, n_bugs * 2))
+    bugs = generate_fixtures.generate_bugzilla_at_scale(n_bugs, numbers)["bugs"]
+    for i, bug in enumerate(bugs):
+        # Mix in links the join should skip
+        if i % 3 == 0:
+            bug["see_also"].append("https://bugs.chromium.org/p/chromium/issues/detail?id=%d" % i)
+        if i % 7 == 0:
+            bug["see_also"].append("https://webcompat.com/")
+    bz = pd.DataFrame(bugs).set_index("id")
+    n_urls = sum(len(urls) for urls in bz["see_also"])
+    print(f"{n_bugs} bugs, {n_urls} see_also URLs")
+
+    fast, fast_elapsed = timed(see_also_join_table, bz)
+    print(f"vectorized: {fast_elapsed:.3f}s")
+    slow, slow_elapsed = timed(legacy_see_also_join_table, bz)
+    print(f"legacy loop: {slow_elapsed:.3f}s ({slow_elapsed / fast_elapsed:.1f}x)")
+
+    pd.testing.assert_frame_equal(fast, slow.astype("int64"))
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
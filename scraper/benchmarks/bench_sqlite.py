@@ -0,0 +1,125 @@
+"""Compare GithubCache's SQLite settings against the old defaults.
+
+With the scraper package installed:
+
+    python benchmarks/bench_sqlite.py [--size 500000] [--per-row 5000]
+
+Each configuration gets a fresh cache on disk. "default" is SQLite's own
+settings (rollback journal, synchronous=FULL, a 2 MB page cache, no memory
+map); "tuned" is what GithubCache now opens with. For each, this times
+
+  per-row insert   one _store() call, and so one commit, per issue, over the
+                   first --per-row issues
+  batched insert   the rest, in update()'s batches of 1000
+  scan             reading every issue back with issue_chunks()
+  load_issues      the same scan, built into dump()'s frame
+  scan under write scanning while another thread stores a batch of issues
+                   from a second repository, as when a dump overlaps a sync
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from typing import Any, Callable, Dict, List
+
+import click
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "scraper", "tests"))
+import generate_fixtures  # noqa: E402
+
+from scraper.cache import GithubCache  # noqa: E402
+from scraper.dump import load_issues  # noqa: E402
+
+BATCH_SIZE = 1000
+# SQLite's compiled-in defaults
+DEFAULT_SETTINGS = dict(cache_size=2000 * 1024, mmap_size=0)
+
+
+def open_cache(path: str, config: str, read_only: bool = False) -> GithubCache:
+    if config == "tuned":
+        return GithubCache(path, None, read_only=read_only)
+    cache = GithubCache(path, None, read_only=read_only, **DEFAULT_SETTINGS)
+    if not read_only:
+        cache.db.execute("PRAGMA journal_mode = DELETE")
+        cache.db.execute("PRAGMA synchronous = FULL")
+    return cache
+
+
+def timed(f: Callable[[], int]) -> Dict[str, float]:
+    started = time.perf_counter()
+    rows = f()
+    seconds = time.perf_counter() - started
+    return {"seconds": seconds, "rows": rows, "rows_per_second": rows / seconds}
+
+
+def scan(cache: GithubCache) -> int:
+    return sum(len(rows) for rows in cache.issue_chunks())
+
+
+def scan_under_write(path: str, config: str, issues: List[Dict[str, Any]]) -> int:
+    reader = open_cache(path, config, read_only=True)
+    started = threading.Event()
+
+    def write():
+        # Connections can't cross threads, so the writer opens its own
+        writer = open_cache(path, config)
+        started.set()
+        for i in range(0, len(issues), BATCH_SIZE):
+            writer._store(issues[i:i + BATCH_SIZE], "example/other-bugs")
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    started.wait()
+    try:
+        return scan(reader)
+    finally:
+        thread.join()
+
+
+def run(n: int, per_row: int, config: str) -> Dict[str, Dict[str, float]]:
+    issues = generate_fixtures.generate_webcompat_at_scale(n)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "issues.db")
+        cache = open_cache(path, config)
+
+        def insert_per_row():
+            for issue in issues[:per_row]:
+                cache._store([issue])
+            return per_row
+
+        def insert_batched():
+            for i in range(per_row, n, BATCH_SIZE):
+                cache._store(issues[i:i + BATCH_SIZE])
+            return n - per_row
+
+        results["per-row insert"] = timed(insert_per_row)
+        results["batched insert"] = timed(insert_batched)
+        cache.db.close()
+
+        reader = open_cache(path, config, read_only=True)
+        results["scan"] = timed(lambda: scan(reader))
+        results["load_issues"] = timed(lambda: len(load_issues(reader)))
+        reader.db.close()
+        results["scan under write"] = timed(
+            lambda: scan_under_write(path, config, issues[:n // 10]))
+    return results
+
+
+@click.command()
+@click.option("--size", default=500000, show_default=True,
+              help="Number of webcompat issues to generate.")
+@click.option("--per-row", default=5000, show_default=True,
+              help="How many of them to insert with a commit each.")
+def main(size, per_row):
+    warnings.filterwarnings("ignore", "Creating database")
+    for config in ("default", "tuned"):
+        for stage, result in run(size, per_row, config).items():
+            click.echo("%-8s %-17s %9d rows %8.2fs %10.0f rows/s" % (
+                config, stage, result["rows"], result["seconds"], result["rows_per_second"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+from collections import OrderedDict
+import datetime as dt
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import json
+import threading
+import time
+from typing import Any, Dict, Hashable, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+import click
+
+from .cache import BugzillaCache, GithubCache
+from .dump import SITE_TO_TAGS, open_bugs_series, sort_partner_rel_bugs
+
+
+class NotFound(Exception):
+    pass
+
+
+class ResponseCache:
+    """A least-recently-used cache whose entries also expire after ttl seconds.
+
+    Safe to share between threads; invalidate() is meant to be registered as
+    a listener on the caches the responses were computed from.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 60.0) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def parse_time(params: Dict[str, str], name: str) -> Optional[dt.datetime]:
+    if name not in params:
+        return None
+    try:
+        value = dt.datetime.fromisoformat(params[name])
+    except ValueError:
+        raise ValueError("%s must be an ISO date or time" % name)
+    if value.tzinfo is not None:
+        # The caches store naive UTC times
+        value = value.astimezone(dt.timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class DashboardAPI:
+    """Answers ad hoc dashboard queries from the caches at path.
+
+    GET /hostnames/open?limit=N
+        Hostnames with the most open issues.
+    GET /hostnames/created?since=DATE[&until=DATE][&limit=N]
+        Hostnames with the most issues created in [since, until).
+    GET /hostnames/<hostname>[?since=DATE][&until=DATE]
+        Open issues and issues created per day for one hostname.
+    GET /partners
+        Partner sites and how many open platform-rel bugs each has.
+    GET /partners/<partner>[?since=DATE][&until=DATE]
+        Open platform-rel bugs per day for one partner.
+
+    Responses are cached until either cache's contents change or ttl
+    seconds pass; they are keyed on the caches' versions, so this holds
+    for writes from other processes too.
+    SQLite connections can't be shared between threads, so each thread that
+    answers queries opens its own, read-only, which never waits on a sync
+    writing to the same cache.
+    """
+
+    def __init__(self, path: str, cache_size: int = 256, ttl: float = 60.0) -> None:
+        self.path = path
+        self.responses = ResponseCache(cache_size, ttl)
+        self._local = threading.local()
+
+    @property
+    def cache(self) -> GithubCache:
+        if not hasattr(self._local, "cache"):
+            self._local.cache = GithubCache(self.path, None, read_only=True)
+        return self._local.cache
+
+    @property
+    def bugzilla_cache(self) -> BugzillaCache:
+        if not hasattr(self._local, "bugzilla_cache"):
+            self._local.bugzilla_cache = BugzillaCache(self.path, read_only=True)
+        return self._local.bugzilla_cache
+
+    def watch(self, *caches: Any) -> None:
+        """Drop cached responses whenever one of caches is updated."""
+        for cache in caches:
+            cache.listeners.append(self.responses.invalidate)
+
+    def get(self, url: str) -> Tuple[int, bytes]:
+        """Return (HTTP status, JSON body) for a request URL."""
+        key = (url, self.cache.version(), tuple(self.bugzilla_cache.version()))
+        response = self.responses.get(key)
+        if response is not None:
+            return response
+        parsed = urlparse(url)
+        params = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+        path = [unquote(part) for part in parsed.path.strip("/").split("/")]
+        try:
+            body = self.route(path, params)
+        except NotFound:
+            return 404, json.dumps({"error": "no such resource"}).encode("utf-8")
+        except ValueError as e:
+            return 400, json.dumps({"error": str(e)}).encode("utf-8")
+        response = 200, json.dumps(body).encode("utf-8")
+        self.responses.put(key, response)
+        return response
+
+    def route(self, path, params):
+        limit = int(params.get("limit", 10))
+        since, until = parse_time(params, "since"), parse_time(params, "until")
+        if path == ["hostnames", "open"]:
+            return dict(self.cache.open_hostname_counts(limit))
+        if path == ["hostnames", "created"]:
+            if since is None:
+                raise ValueError("since is required")
+            return dict(self.cache.created_hostname_counts(since, limit, until))
+        if len(path) == 2 and path[0] == "hostnames":
+            return {
+                "hostname": path[1],
+                "open": self.cache.open_count(path[1]),
+                "created": self.cache.hostname_history(path[1], since, until),
+            }
+        if path == ["partners"]:
+            by_partner = sort_partner_rel_bugs(self.bugzilla_cache.bugs("partner_rel"))
+            return {
+                partner: sum(bug["resolution"] == "" for bug in bugs)
+                for partner, bugs in by_partner.items()
+            }
+        if len(path) == 2 and path[0] == "partners":
+            return self.partner_series(path[1], since, until)
+        raise NotFound()
+
+    def partner_series(self, partner, since, until):
+        if partner not in SITE_TO_TAGS:
+            raise NotFound()
+        by_partner = sort_partner_rel_bugs(self.bugzilla_cache.bugs("partner_rel"))
+        start = since.date() if since else dt.date(2016, 1, 1)
+        end = until.date() if until else dt.date.today() + dt.timedelta(days=1)
+        dates_x = [start + dt.timedelta(days=i) for i in range((end - start).days)]
+        series = open_bugs_series({partner: by_partner.get(partner, [])}, dates_x)
+        return {
+            "dates_x": [date.isoformat() for date in dates_x],
+            "open_bugs_y": series[partner],
+        }
+
+
+def handler(api: DashboardAPI):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            status, body = api.get(self.path)
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            # Let a dashboard served from elsewhere query us
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(api: DashboardAPI, host: str = "127.0.0.1", port: int = 8000) -> HTTPServer:
+    """Start answering requests on a background thread and return the server.
+
+    Queries take milliseconds, so one thread serves them all and keeps one
+    SQLite connection.
+    """
+    server = HTTPServer((host, port), handler(api))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@click.command()
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option("--port", default=8000, show_default=True)
+@click.option("--ttl", default=60.0, show_default=True,
+              help="Seconds to cache each response for.")
+@click.argument("cache", required=False)
+def cli(host, port, ttl, cache):
+    """Serve dashboard queries over HTTP from an existing cache."""
+    api = DashboardAPI(cache or "issues.db", ttl=ttl)
+    server = HTTPServer((host, port), handler(api))
+    click.echo("Serving on http://%s:%d/" % server.server_address)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    cli()
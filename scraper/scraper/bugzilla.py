@@ -0,0 +1,90 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+BUGZILLA_URL = "https://bugzilla.mozilla.org/rest"
+
+# Bugs that link to webcompat.com issues
+WEBCOMPAT_SEE_ALSO_QUERY = {
+    "o1": "regexp",
+    "v1": ".*webcompat.*",
+    "f1": "see_also",
+    "include_fields": [
+        "id",
+        "summary",
+        "product",
+        "component",
+        "votes",
+        "creation_time",
+        "last_change_time",
+        "status",
+        "resolution",
+        "see_also"]
+}
+
+# Bugs tagged as affecting one of our partner sites
+PARTNER_REL_QUERY = {
+    "status_whiteboard_type": "substring",
+    "status_whiteboard": "[platform-rel",
+}
+
+
+class BugzillaClient:
+    """Searches the Bugzilla REST API one page at a time.
+
+    Asking Bugzilla for every result at once (limit=0) makes it build the
+    whole response before sending any of it, which tends to time out for
+    large searches. Instead we count the matches, then fetch fixed-size
+    pages concurrently over a pooled session that retries failed requests
+    with exponential backoff.
+    """
+
+    def __init__(
+            self,
+            base_url: str = BUGZILLA_URL,
+            page_size: int = 1000,
+            max_workers: int = 4,
+            retries: int = 5,
+            backoff_factor: float = 1.0,
+            timeout: float = 120) -> None:
+        # Imported here so that loading the module stays cheap
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        self.base_url = base_url.rstrip("/")
+        self.page_size = page_size
+        self.max_workers = max_workers
+        self.timeout = timeout
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _get(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        response = self.session.get(self.base_url + "/bug", params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def count(self, params: Dict[str, Any]) -> int:
+        return self._get(dict(params, count_only=1))["bug_count"]
+
+    def page(self, params: Dict[str, Any], offset: int) -> List[Dict[str, Any]]:
+        page_params = dict(params, order="bug_id", limit=self.page_size, offset=offset)
+        return self._get(page_params)["bugs"]
+
+    def search(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        n_bugs = self.count(params)
+        offsets = range(0, n_bugs, self.page_size)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pages = list(executor.map(lambda offset: self.page(params, offset), offsets))
+
+        bugs = [bug for page in pages for bug in page]
+        # Pick up anything filed between the count and the last page.
+        while pages and len(pages[-1]) == self.page_size:
+            pages.append(self.page(params, len(bugs)))
+            bugs.extend(pages[-1])
+        return bugs
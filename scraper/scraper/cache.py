@@ -1,49 +1,788 @@
+from concurrent.futures import ThreadPoolExecutor
+import datetime as dt
+import json
 import os
+import pathlib
+import queue
+import re
 import sqlite3
-from typing import List
+import threading
+from typing import (
+    TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set,
+    Tuple, Union)
 import warnings
+import zlib
 
-from github3 import GitHub
+from .bugzilla import BugzillaClient, PARTNER_REL_QUERY, WEBCOMPAT_SEE_ALSO_QUERY
+from .github import GITHUB_API_URL, GithubClient
+from .timing import Timer
+
+if TYPE_CHECKING:
+    from github3 import GitHub
+
+DEFAULT_REPO = "webcompat/web-bugs"
+
+URL_RE = re.compile(r"(\*\*)?URL(\*\*)?:\s+([^\r\n]+)\r?\n")
+HOSTNAME_RE = re.compile(r"(.*://)?(www\.)?([^:/]+)[:/]?.*")
+
+# Columns materialized from the issue JSON at update time, so that reads
+# don't have to json_extract every row.
+PARSED_COLUMNS = [
+    ("created_at", "TEXT"),
+    ("closed_at", "TEXT"),
+    ("state", "TEXT"),
+    ("url", "TEXT"),
+    ("hostname", "TEXT"),
+]
+
+ISSUES_TABLE = """
+    CREATE TABLE IF NOT EXISTS issues (
+        repo TEXT NOT NULL,
+        number INTEGER NOT NULL,
+        updated TEXT,
+        content TEXT,
+        created_at TEXT,
+        closed_at TEXT,
+        state TEXT,
+        url TEXT,
+        hostname TEXT,
+        -- Bumped on every write, so readers can pick up just the rows
+        -- written since they last looked, whatever their updated times
+        synced_seq INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (repo, number)
+    )
+    """
+
+# Per-repository sync cursors in sync_state, stored as "<repo>:<key>"
+SYNC_KEYS = ["since", "backfill_page", "backfill_done"]
+
+# Issue fields the dashboard reads. Compacted caches store only these (and
+# any extras asked for), zlib-compressed, instead of the full API response.
+COMPACT_FIELDS = ["number", "title", "state", "created_at", "updated_at", "closed_at", "body"]
+
+
+def encode_content(data: dict, fields: Optional[Sequence[str]] = None) -> Union[str, bytes]:
+    if fields is None:
+        return json.dumps(data)
+    compact = {field: data.get(field) for field in fields}
+    return zlib.compress(json.dumps(compact).encode("utf-8"))
+
+
+def decode_content(content: Union[str, bytes]) -> dict:
+    if isinstance(content, bytes):
+        content = zlib.decompress(content)
+    return json.loads(content)
+
+
+# Running totals over the issues table, kept up to date by triggers so that
+# an incremental dump only pays for the issues that changed. Each is
+# (table, key columns, key expressions, condition) where {row} is OLD, NEW
+# or issues.
+AGGREGATES = [
+    ("open_hostnames",
+     ["hostname", "repo"],
+     ["{row}.hostname", "{row}.repo"],
+     "{row}.state = 'open'"),
+    ("created_days",
+     ["day", "hostname", "repo"],
+     ["substr({row}.created_at, 1, 10)", "{row}.hostname", "{row}.repo"],
+     "{row}.created_at IS NOT NULL"),
+]
+COUNTED_HOSTNAME = "{row}.hostname IS NOT NULL AND {row}.hostname != 'None'"
+
+
+def aggregate_sql(table: str, columns: List[str], exprs: List[str], condition: str) -> List[str]:
+    cols = ", ".join(columns)
+
+    def where(row):
+        return ("(%s) AND %s" % (condition, COUNTED_HOSTNAME)).format(row=row)
+
+    def keys(row):
+        return ", ".join(expr.format(row=row) for expr in exprs)
+
+    def add(row):
+        return (
+            "INSERT INTO {table} ({cols}, n) SELECT {keys}, 1 WHERE {where} "
+            "ON CONFLICT ({cols}) DO UPDATE SET n = n + 1;"
+        ).format(table=table, cols=cols, keys=keys(row), where=where(row))
+
+    def remove(row):
+        match = " AND ".join(
+            "%s = %s" % (col, expr.format(row=row)) for col, expr in zip(columns, exprs))
+        return "UPDATE {table} SET n = n - 1 WHERE {match} AND {where};".format(
+            table=table, match=match, where=where(row))
+
+    return [
+        "CREATE TABLE {table} ({typed}, n INTEGER, PRIMARY KEY ({cols}))".format(
+            table=table, typed=", ".join("%s TEXT" % col for col in columns), cols=cols),
+        "INSERT INTO {table} ({cols}, n) SELECT {keys}, count(*) FROM issues "
+        "WHERE {where} GROUP BY {keys}".format(
+            table=table, cols=cols, keys=keys("issues"), where=where("issues")),
+        "CREATE TRIGGER {table}_insert AFTER INSERT ON issues BEGIN {add} END".format(
+            table=table, add=add("NEW")),
+        "CREATE TRIGGER {table}_delete AFTER DELETE ON issues BEGIN {remove} END".format(
+            table=table, remove=remove("OLD")),
+        "CREATE TRIGGER {table}_update AFTER UPDATE OF state, hostname, created_at ON issues "
+        "BEGIN {remove} {add} END".format(table=table, remove=remove("OLD"), add=add("NEW")),
+    ]
+
+
+def extract_url(body: Optional[str]) -> Optional[str]:
+    if not body:
+        return None
+    match = URL_RE.search(body)
+    return match and match.group(3)
+
+
+def extract_hostname(url: Optional[str]) -> Optional[str]:
+    if url is None:
+        return None
+    match = HOSTNAME_RE.search(url)
+    return match and match.group(3)
+
+
+def parse_issue(data: dict) -> Tuple[Optional[str], ...]:
+    url = extract_url(data.get("body"))
+    return (
+        data.get("created_at"),
+        data.get("closed_at"),
+        data.get("state"),
+        url,
+        extract_hostname(url),
+    )
+
+
+# Page cache and memory map sizes, in bytes. Reads of mapped pages skip a
+# copy into SQLite's own cache; both are upper bounds, not allocations.
+DEFAULT_CACHE_SIZE = 64 * 2**20
+DEFAULT_MMAP_SIZE = 256 * 2**20
+
+
+def connect(
+        path: str,
+        read_only: bool = False,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        mmap_size: int = DEFAULT_MMAP_SIZE) -> sqlite3.Connection:
+    """Open the cache database with the settings both caches share.
+
+    Writers switch the database to write-ahead logging, so readers (dump(),
+    the API) see the last committed state while update() is writing instead
+    of waiting on its lock. synchronous=NORMAL only syncs at checkpoints;
+    in WAL mode that can lose the last commits on power loss, but never
+    corrupts the database, and the next sync fetches them again.
+    """
+    if read_only:
+        db = sqlite3.connect(pathlib.Path(path).absolute().as_uri() + "?mode=ro", uri=True)
+    else:
+        db = sqlite3.connect(path)
+        db.execute("PRAGMA journal_mode = WAL")
+        db.execute("PRAGMA synchronous = NORMAL")
+    # A negative cache_size is in KiB rather than pages
+    db.execute("PRAGMA cache_size = %d" % -(cache_size // 1024))
+    db.execute("PRAGMA mmap_size = %d" % mmap_size)
+    return db
+
+
+def updated_time(data: dict) -> str:
+    # Matches what github3's Issue.updated_at.isoformat() used to give us
+    return dt.datetime.fromisoformat(data["updated_at"].replace("Z", "+00:00")).isoformat()
 
 
 class GithubCache:
-    def __init__(self, path: str, github_session: GitHub) -> None:
+    def __init__(
+            self,
+            path: str,
+            github_session: "GitHub",
+            api_url: str = GITHUB_API_URL,
+            batch_size: int = 1000,
+            max_workers: int = 4,
+            repos: Sequence[str] = (DEFAULT_REPO,),
+            read_only: bool = False,
+            cache_size: int = DEFAULT_CACHE_SIZE,
+            mmap_size: int = DEFAULT_MMAP_SIZE) -> None:
         self.gh = github_session
-        if not os.path.exists(path):
-            warnings.warn("Creating database %s" % path)
-        self.db = sqlite3.connect(path)
+        self.api_url = api_url
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        # Repositories, as "owner/name", that update() syncs
+        self.repos = list(repos)
+        # Called with no arguments after each update()
+        self.listeners: List[Callable[[], None]] = []
+        if read_only:
+            # For readers like dump(); the schema is whatever the last
+            # writable open left, so a writer must have opened it first.
+            self.db = connect(path, True, cache_size, mmap_size)
+        else:
+            if not os.path.exists(path):
+                warnings.warn("Creating database %s" % path)
+            self.db = connect(path, False, cache_size, mmap_size)
+            self._create_schema()
+        self.db.row_factory = sqlite3.Row
+        compact_fields = self._state("compact_fields")
+        self.compact_fields = compact_fields and json.loads(compact_fields)
+
+    def _create_schema(self) -> None:
         with self.db:
+            self.db.execute(ISSUES_TABLE)
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+                """)
             self.db.execute("""
-                CREATE TABLE IF NOT EXISTS issues (
-                    number INTEGER PRIMARY KEY,
+                CREATE TABLE IF NOT EXISTS signatures (
+                    repo TEXT NOT NULL,
+                    number INTEGER NOT NULL,
                     updated TEXT,
-                    content TEXT
+                    signature BLOB,
+                    PRIMARY KEY (repo, number)
                 )
                 """)
-        self.db.row_factory = sqlite3.Row
-        self.db.text_factory = bytes
+            self._migrate()
+            self._create_aggregates()
+            self.db.execute("CREATE INDEX IF NOT EXISTS issues_state ON issues (state)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS issues_created_at ON issues (created_at)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS issues_updated ON issues (updated)")
+            self.db.execute(
+                "CREATE INDEX IF NOT EXISTS issues_synced_seq ON issues (synced_seq)")
+            self.db.execute(
+                "CREATE INDEX IF NOT EXISTS issues_hostname ON issues (hostname, created_at)")
+
+    def _migrate(self) -> None:
+        existing = {row[1] for row in self.db.execute("PRAGMA table_info(issues)")}
+        self._add_parsed_columns(existing)
+        if "repo" not in existing:
+            self._add_repo_column()
+        elif "synced_seq" not in existing:
+            self.db.execute(
+                "ALTER TABLE issues ADD COLUMN synced_seq INTEGER NOT NULL DEFAULT 0")
+
+    def _add_parsed_columns(self, existing: Set[str]) -> None:
+        missing = [(name, kind) for name, kind in PARSED_COLUMNS if name not in existing]
+        if not missing:
+            return
+        warnings.warn("Migrating issue cache; this only happens once")
+        for name, kind in missing:
+            self.db.execute("ALTER TABLE issues ADD COLUMN %s %s" % (name, kind))
+        rows = self.db.execute("SELECT number, content FROM issues").fetchall()
+        self.db.executemany(
+            """
+            UPDATE issues
+            SET created_at = ?, closed_at = ?, state = ?, url = ?, hostname = ?
+            WHERE number = ?
+            """,
+            (parse_issue(decode_content(content)) + (number,) for number, content in rows))
+
+    def _add_repo_column(self) -> None:
+        # Caches from before multi-repository support hold only DEFAULT_REPO,
+        # keyed on number alone. Rebuild the table with a (repo, number) key;
+        # the aggregates are rebuilt with a repo column afterwards.
+        warnings.warn("Migrating issue cache to support several repositories")
+        for table, _, _, _ in AGGREGATES:
+            for event in ("insert", "delete", "update"):
+                self.db.execute("DROP TRIGGER IF EXISTS %s_%s" % (table, event))
+            self.db.execute("DROP TABLE IF EXISTS %s" % table)
+        self.db.execute("ALTER TABLE issues RENAME TO issues_single_repo")
+        self.db.execute(ISSUES_TABLE)
+        self.db.execute(
+            """
+            INSERT INTO issues
+            (repo, number, updated, content, created_at, closed_at, state, url, hostname)
+            SELECT ?, number, updated, content, created_at, closed_at, state, url, hostname
+            FROM issues_single_repo
+            """,
+            (DEFAULT_REPO,))
+        self.db.execute("DROP TABLE issues_single_repo")
+        self.db.executemany(
+            "UPDATE sync_state SET key = ? WHERE key = ?",
+            ((self._repo_key(DEFAULT_REPO, key), key) for key in SYNC_KEYS))
+
+    def _create_aggregates(self) -> None:
+        tables = {row[0] for row in self.db.execute("SELECT name FROM sqlite_master")}
+        for table, columns, exprs, condition in AGGREGATES:
+            if table in tables:
+                continue
+            for sql in aggregate_sql(table, columns, exprs, condition):
+                self.db.execute(sql)
+
+    def _state(self, key: str) -> Optional[str]:
+        row = self.db.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row and row[0]
+
+    @staticmethod
+    def _repo_key(repo: str, key: str) -> str:
+        return "%s:%s" % (repo, key)
+
+    def _repo_state(self, repo: str, key: str) -> Optional[str]:
+        return self._state(self._repo_key(repo, key))
+
+    def _store(self, issues: List[Dict[str, Any]], repo: str = DEFAULT_REPO, **state: str) -> None:
+        with self.db:
+            self.db.executemany(
+                """
+                INSERT INTO issues
+                (repo, number, updated, content, created_at, closed_at, state, url, hostname,
+                 synced_seq)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?,
+                        (SELECT coalesce(max(synced_seq), 0) + 1 FROM issues))
+                ON CONFLICT (repo, number) DO UPDATE SET
+                    synced_seq = excluded.synced_seq,
+                    updated = excluded.updated,
+                    content = excluded.content,
+                    created_at = excluded.created_at,
+                    closed_at = excluded.closed_at,
+                    state = excluded.state,
+                    url = excluded.url,
+                    hostname = excluded.hostname
+                """,
+                ((repo, data["number"], updated_time(data),
+                  encode_content(data, self.compact_fields)) + parse_issue(data)
+                 for data in issues))
+            self.db.executemany(
+                "INSERT OR REPLACE INTO sync_state VALUES (?, ?)",
+                ((self._repo_key(repo, key), value) for key, value in state.items()))
+
+    def _sync_start(self, repo: str) -> Dict[str, Any]:
+        state: Dict[str, Any] = {key: self._repo_state(repo, key) for key in SYNC_KEYS}
+        state["max_updated"], state["cached"] = self.db.execute(
+            "SELECT max(updated), count(*) > 0 FROM issues WHERE repo = ?", (repo,)).fetchone()
+        return state
+
+    def _backfill(
+            self,
+            client: GithubClient,
+            start: Dict[str, Any]) -> Iterator[Tuple[List[Dict[str, Any]], Dict[str, str]]]:
+        # Pages are committed in order, so backfill_page is always the last
+        # page we have everything up to, and an interrupted backfill can pick
+        # up from the page after it.
+        start_page = int(start["backfill_page"] or 0) + 1
+        batch: List[Dict[str, Any]] = []
+        state: Dict[str, str] = {}
+        for page, issues, fetched_at in client.backfill(start_page, self.max_workers):
+            if page == 1:
+                # Anything updated after we started will need fetching again
+                state["since"] = fetched_at
+            batch.extend(issues)
+            state["backfill_page"] = str(page)
+            if len(batch) >= self.batch_size:
+                yield batch, state
+                batch, state = [], {}
+        yield batch, dict(state, backfill_done="1")
+
+    def _sync(
+            self,
+            repo: str,
+            start: Dict[str, Any]) -> Iterator[Tuple[List[Dict[str, Any]], Dict[str, str]]]:
+        """Yield (issues, sync state) batches that bring repo up to date.
+
+        This runs on a worker thread, so it works from the state in start
+        rather than reading the database.
+        """
+        owner, name = repo.split("/")
+        client = GithubClient(self.gh.session, owner, name, self.api_url)
+        since = start["since"]
+        if not start["backfill_done"]:
+            if start["backfill_page"] is None and start["cached"]:
+                # Filled by the old serial sync, which had no cursor
+                yield [], {"backfill_done": "1"}
+            else:
+                for issues, state in self._backfill(client, start):
+                    since = state.get("since", since)
+                    yield issues, state
+
+        batch: List[Dict[str, Any]] = []
+        for issue in client.updated_since(since or start["max_updated"]):
+            batch.append(issue)
+            if len(batch) >= self.batch_size:
+                yield batch, {"since": updated_time(batch[-1])}
+                batch = []
+        if batch:
+            yield batch, {"since": updated_time(batch[-1])}
+
+    def update(self, timer: Optional[Timer] = None) -> Dict[str, int]:
+        """Sync every repository in repos; return how many issues each sent.
 
-    def update(self) -> None:
-        last_updated = self.db.execute("SELECT max(updated) FROM issues").fetchone()
-        last_updated = last_updated[0].decode("ascii") if last_updated else None
+        Repositories are fetched concurrently over the GitHub session's
+        shared connection pool. SQLite connections can't be shared between
+        threads, so batches are written here as they arrive.
+        """
+        timer = timer or Timer()
+        starts = {repo: self._sync_start(repo) for repo in self.repos}
+        received = dict.fromkeys(self.repos, 0)
+        batches: "queue.Queue[Tuple[str, Optional[List], Dict[str, str]]]" = queue.Queue()
+        stop = threading.Event()
 
-        issue_iter = self.gh.issues_on("webcompat", "web-bugs", state="all", since=last_updated)
+        def fetch(repo):
+            try:
+                for issues, state in self._sync(repo, starts[repo]):
+                    batches.put((repo, issues, state))
+                    if stop.is_set():
+                        return
+            finally:
+                batches.put((repo, None, {}))
+
+        with timer.stage("sync") as span:
+            executor = ThreadPoolExecutor(max_workers=len(self.repos))
+            futures = [executor.submit(fetch, repo) for repo in self.repos]
+            try:
+                remaining = len(futures)
+                while remaining:
+                    repo, issues, state = batches.get()
+                    if issues is None:
+                        remaining -= 1
+                        continue
+                    self._store(issues, repo, **state)
+                    received[repo] += len(issues)
+            finally:
+                stop.set()
+                executor.shutdown(wait=True)
+            span.rows = sum(received.values())
+        for future in futures:
+            # Raise the first repository's error, if any; the others' progress is saved
+            future.result()
+        for listener in self.listeners:
+            listener()
+        return received
+
+    def compact(self, extra_fields: Iterable[str] = (), batch_size: int = 1000) -> None:
+        """Rewrite the cache to keep only the issue fields the dashboard uses.
+
+        Issues fetched later are stored the same way. Fields dropped here
+        can only come back by deleting the cache and syncing from scratch.
+        """
+        fields = COMPACT_FIELDS + [f for f in extra_fields if f not in COMPACT_FIELDS]
+        if self.compact_fields:
+            fields = [f for f in fields if f in self.compact_fields]
+        last = -1
+        while True:
+            with self.db:
+                rows = self.db.execute(
+                    "SELECT rowid, content FROM issues WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                    (last, batch_size)).fetchall()
+                self.db.executemany(
+                    "UPDATE issues SET content = ? WHERE rowid = ?",
+                    ((encode_content(decode_content(content), fields), rowid)
+                     for rowid, content in rows))
+            if len(rows) < batch_size:
+                break
+            last = rows[-1][0]
         with self.db:
-            for issue in issue_iter:
-                self.db.execute("INSERT OR REPLACE INTO issues VALUES (?, ?, ?)",
-                                (issue.number,
-                                 issue.updated_at.isoformat(),
-                                 issue.as_json()))
+            self.db.execute(
+                "INSERT OR REPLACE INTO sync_state VALUES ('compact_fields', ?)",
+                (json.dumps(fields),))
+        self.compact_fields = fields
+        self.db.execute("VACUUM")
+
+    def update_signatures(self, batch_size: int = 5000) -> int:
+        """Compute similarity signatures for open issues that changed since the last call.
+
+        A signature is current when it was computed from the issue's latest
+        update; closed issues keep whatever they had. Reports with no words
+        outside the template get a NULL signature. Returns how many issues
+        were signed.
+        """
+        from .similarity import SIGNATURE_VERSION, signatures
+
+        if self._state("signature_version") != str(SIGNATURE_VERSION):
+            with self.db:
+                self.db.execute("DELETE FROM signatures")
+                self.db.execute(
+                    "INSERT OR REPLACE INTO sync_state VALUES ('signature_version', ?)",
+                    (str(SIGNATURE_VERSION),))
+        signed = 0
+        last = -1
+        while True:
+            # Read each batch in full before writing, since the query reads signatures
+            rows = self.db.execute(
+                """
+                SELECT issues.rowid, issues.repo, issues.number, issues.updated, issues.content
+                FROM issues LEFT JOIN signatures USING (repo, number)
+                WHERE issues.rowid > ? AND issues.state = 'open'
+                AND signatures.updated IS NOT issues.updated
+                ORDER BY issues.rowid LIMIT ?
+                """,
+                (last, batch_size)).fetchall()
+            if not rows:
+                return signed
+            texts = []
+            for row in rows:
+                data = decode_content(row["content"])
+                texts.append("%s\n%s" % (data.get("title") or "", data.get("body") or ""))
+            computed, has_words = signatures(texts)
+            with self.db:
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO signatures VALUES (?, ?, ?, ?)",
+                    ((row["repo"], row["number"], row["updated"],
+                      signature.tobytes() if words else None)
+                     for row, signature, words in zip(rows, computed, has_words)))
+            signed += len(rows)
+            last = rows[-1]["rowid"]
+
+    def open_signatures(self) -> List[Tuple[str, int, Optional[str], bytes]]:
+        """Return (repo, number, hostname, signature) for open issues with current signatures."""
+        rows = self.db.execute(
+            """
+            SELECT issues.repo, issues.number, issues.hostname, signatures.signature
+            FROM issues JOIN signatures USING (repo, number)
+            WHERE issues.state = 'open' AND signatures.updated = issues.updated
+            AND signatures.signature IS NOT NULL
+            ORDER BY issues.repo, issues.number
+            """)
+        return [tuple(row) for row in rows]
+
+    def version(self) -> Tuple[int, Optional[int]]:
+        """Return (issue count, last write sequence); this changes whenever the issues do.
+
+        Pass the sequence to issue_chunks() later to read only the issues
+        written since.
+        """
+        return tuple(self.db.execute("SELECT count(*), max(synced_seq) FROM issues").fetchone())
+
+    def repositories(self) -> List[str]:
+        """Return the repositories with cached issues."""
+        return [row[0] for row in self.db.execute("SELECT DISTINCT repo FROM issues ORDER BY repo")]
+
+    def content(self, number: int, repo: str = DEFAULT_REPO) -> Optional[dict]:
+        row = self.db.execute(
+            "SELECT content FROM issues WHERE repo = ? AND number = ?", (repo, number)).fetchone()
+        return row and decode_content(row[0])
+
+    def open_hostname_counts(self, limit: int, repo: Optional[str] = None) -> List[Tuple[str, int]]:
+        """Count open issues by hostname, in repo or across every repository."""
+        rows = self.db.execute(
+            "SELECT hostname, sum(n) AS total FROM open_hostnames "
+            "WHERE :repo IS NULL OR repo = :repo "
+            "GROUP BY hostname HAVING total > 0 "
+            "ORDER BY total DESC, hostname LIMIT :limit",
+            {"repo": repo, "limit": limit})
+        return [tuple(row) for row in rows]
+
+    def created_hostname_counts(
+            self,
+            since: dt.datetime,
+            limit: int,
+            until: Optional[dt.datetime] = None,
+            repo: Optional[str] = None) -> List[Tuple[str, int]]:
+        """Count issues created in [since, until) by hostname, in repo or everywhere.
+
+        Whole days come from created_days; the partial days at either end
+        are counted from the issues table, which is indexed on created_at.
+        """
+        first = dt.datetime.combine(since.date() + dt.timedelta(days=1), dt.time())
+        if until is None:
+            last = dt.datetime.max
+            head_end = first
+        else:
+            last = dt.datetime.combine(until.date(), dt.time())
+            head_end = min(first, until)
+        tail_start = max(first, last)
+        rows = self.db.execute(
+            """
+            SELECT hostname, sum(n) AS total FROM (
+                SELECT hostname, n FROM created_days
+                WHERE day >= :first AND day < :last AND {in_repo}
+                UNION ALL
+                SELECT hostname, 1 FROM issues
+                WHERE created_at >= :since AND created_at < :head_end AND {counted} AND {in_repo}
+                UNION ALL
+                SELECT hostname, 1 FROM issues
+                WHERE created_at >= :tail_start AND created_at < :until AND {counted} AND {in_repo}
+            )
+            GROUP BY hostname
+            HAVING total > 0
+            ORDER BY total DESC, hostname
+            LIMIT :limit
+            """.format(
+                counted=COUNTED_HOSTNAME.format(row="issues"),
+                in_repo="(:repo IS NULL OR repo = :repo)"),
+            {
+                "repo": repo,
+                "first": first.date().isoformat(),
+                "last": last.date().isoformat(),
+                "since": since.isoformat(),
+                "head_end": head_end.isoformat(),
+                "tail_start": tail_start.isoformat(),
+                "until": until.isoformat() if until else "",
+                "limit": limit,
+            })
+        return [tuple(row) for row in rows]
+
+    def hostname_history(
+            self,
+            hostname: str,
+            since: Optional[dt.datetime] = None,
+            until: Optional[dt.datetime] = None,
+            repo: Optional[str] = None) -> List[Tuple[str, int]]:
+        """Return (day, issues created) for one hostname, oldest first."""
+        rows = self.db.execute(
+            """
+            SELECT substr(created_at, 1, 10) AS day, count(*) FROM issues
+            WHERE hostname = :hostname AND created_at >= :since AND created_at < :until
+            AND (:repo IS NULL OR repo = :repo)
+            GROUP BY day ORDER BY day
+            """,
+            {"hostname": hostname,
+             "since": since.isoformat() if since else "",
+             "until": until.isoformat() if until else "9999",
+             "repo": repo})
+        return [tuple(row) for row in rows]
+
+    def open_count(self, hostname: str) -> int:
+        row = self.db.execute(
+            "SELECT sum(n) FROM open_hostnames WHERE hostname = ?", (hostname,)).fetchone()
+        return row[0] or 0
+
+    def hostnames(
+            self,
+            numbers: Iterable[int],
+            repo: str = DEFAULT_REPO) -> List[Tuple[int, Optional[str]]]:
+        numbers = list(numbers)
+        result: List[Tuple[int, Optional[str]]] = []
+        # Stay under SQLite's limit on bound parameters
+        for i in range(0, len(numbers), 500):
+            chunk = numbers[i:i + 500]
+            params: List[Any] = [repo, *chunk]
+            rows = self.db.execute(
+                "SELECT number, hostname FROM issues WHERE repo = ? AND number IN (%s)" %
+                ", ".join("?" * len(chunk)), params)
+            result.extend(tuple(row) for row in rows)
+        return result
+
+    def issue_chunks(
+            self,
+            size: int = 10000,
+            synced_after: Optional[int] = None) -> Iterator[List[Tuple]]:
+        query = "SELECT repo, number, created_at, closed_at, state, hostname FROM issues"
+        params: Tuple = ()
+        if synced_after is not None:
+            query += " WHERE synced_seq > ?"
+            params = (synced_after,)
+        cursor = self.db.cursor()
+        cursor.row_factory = None
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(size)
+            if not rows:
+                return
+            yield rows
 
     def issues(self) -> List[sqlite3.Row]:
         sql = """
-            SELECT
-                number,
-                json_extract(content, "$.created_at") AS created_at,
-                json_extract(content, "$.closed_at") AS closed_at,
-                json_extract(content, "$.state") AS state,
-                json_extract(content, "$.body") AS body
+            SELECT repo, number, created_at, closed_at, url AS domain, state, hostname
             FROM issues
             """
         issues = self.db.execute(sql).fetchall()
         return issues
+
+
+class BugzillaCache:
+    """Caches the results of our Bugzilla searches, keyed by bug id.
+
+    After the first sync, update() only asks Bugzilla for bugs changed since
+    the newest last_change_time it has seen. It also asks for just the ids
+    of every bug each search matches, and drops the bugs that no longer
+    match, say because a partner tag or see_also link was removed.
+    """
+
+    QUERIES: Dict[str, Dict[str, Any]] = {
+        "see_also": WEBCOMPAT_SEE_ALSO_QUERY,
+        "partner_rel": PARTNER_REL_QUERY,
+    }
+
+    def __init__(
+            self,
+            path: str,
+            client: Optional[BugzillaClient] = None,
+            read_only: bool = False,
+            cache_size: int = DEFAULT_CACHE_SIZE,
+            mmap_size: int = DEFAULT_MMAP_SIZE) -> None:
+        self.client = client or BugzillaClient()
+        self.listeners: List[Callable[[], None]] = []
+        self.db = connect(path, read_only, cache_size, mmap_size)
+        if read_only:
+            return
+        with self.db:
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS bugzilla_bugs (
+                    query TEXT,
+                    id INTEGER,
+                    last_change_time TEXT,
+                    content TEXT,
+                    PRIMARY KEY (query, id)
+                )
+                """)
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS bugzilla_sync (
+                    query TEXT PRIMARY KEY,
+                    synced_at TEXT
+                )
+                """)
+
+    def populated(self) -> bool:
+        synced = {row[0] for row in self.db.execute("SELECT query FROM bugzilla_sync")}
+        return synced >= set(self.QUERIES)
+
+    def version(self) -> List[Tuple[str, int, Optional[str]]]:
+        """Return (query, bug count, newest change time) for each cached query."""
+        return [tuple(row) for row in self.db.execute(
+            "SELECT query, count(*), max(last_change_time) FROM bugzilla_bugs "
+            "GROUP BY query ORDER BY query")]
+
+    def _since(self, query: str) -> Optional[str]:
+        row = self.db.execute(
+            "SELECT max(last_change_time) FROM bugzilla_bugs WHERE query = ?",
+            (query,)).fetchone()
+        return row[0]
+
+    def _fetch(self, query: str, since: Optional[str]) -> List[Dict[str, Any]]:
+        params = dict(self.QUERIES[query])
+        if since:
+            # Bugzilla returns bugs changed at or after this time
+            params["last_change_time"] = since
+        return self.client.search(params)
+
+    def _fetch_ids(self, query: str) -> Set[int]:
+        params = dict(self.QUERIES[query], include_fields=["id"])
+        return {bug["id"] for bug in self.client.search(params)}
+
+    def update(self, full: bool = False) -> None:
+        since = {query: None if full else self._since(query) for query in self.QUERIES}
+        # Searches that start over replace everything they had anyway
+        pruned = [query for query in self.QUERIES if since[query] is not None]
+        with ThreadPoolExecutor(max_workers=len(self.QUERIES) + len(pruned)) as executor:
+            results = {
+                query: executor.submit(self._fetch, query, since[query])
+                for query in self.QUERIES
+            }
+            id_results = {query: executor.submit(self._fetch_ids, query) for query in pruned}
+            fetched = {query: future.result() for query, future in results.items()}
+            matching = {query: future.result() for query, future in id_results.items()}
+
+        with self.db:
+            for query, bugs in fetched.items():
+                if since[query] is None:
+                    self.db.execute("DELETE FROM bugzilla_bugs WHERE query = ?", (query,))
+                else:
+                    # A bug changed between the two searches is in one or the other
+                    keep = matching[query] | {bug["id"] for bug in bugs}
+                    cached = self.db.execute(
+                        "SELECT id FROM bugzilla_bugs WHERE query = ?", (query,)).fetchall()
+                    self.db.executemany(
+                        "DELETE FROM bugzilla_bugs WHERE query = ? AND id = ?",
+                        ((query, bug_id) for bug_id, in cached if bug_id not in keep))
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO bugzilla_bugs VALUES (?, ?, ?, ?)",
+                    ((query, bug["id"], bug["last_change_time"], json.dumps(bug))
+                     for bug in bugs))
+                self.db.execute(
+                    "INSERT OR REPLACE INTO bugzilla_sync VALUES (?, datetime('now'))",
+                    (query,))
+        for listener in self.listeners:
+            listener()
+
+    def bugs(self, query: str) -> List[Dict[str, Any]]:
+        rows = self.db.execute(
+            "SELECT content FROM bugzilla_bugs WHERE query = ? ORDER BY id",
+            (query,))
+        return [json.loads(content) for content, in rows]
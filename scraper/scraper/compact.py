@@ -0,0 +1,24 @@
+import os
+
+import click
+
+from .cache import COMPACT_FIELDS, GithubCache
+
+
+@click.command()
+@click.option("--keep", "-k", multiple=True,
+              help="Issue field to keep in addition to %s." % ", ".join(COMPACT_FIELDS))
+@click.argument("cache", required=False)
+def cli(keep, cache):
+    """Shrink an issue cache by dropping issue fields the dashboard doesn't use."""
+    path = cache or "issues.db"
+    if not os.path.exists(path):
+        raise click.BadParameter("%s doesn't exist" % path, param_hint="cache")
+    before = os.path.getsize(path)
+    GithubCache(path, None).compact(keep)
+    after = os.path.getsize(path)
+    click.echo("Compacted %s from %d to %d bytes." % (path, before, after))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,151 @@
+import datetime as dt
+import signal
+import threading
+from typing import TYPE_CHECKING, Any, Optional, Tuple
+
+import click
+
+from .api import DashboardAPI, serve
+from .cache import (
+    DEFAULT_CACHE_SIZE, DEFAULT_MMAP_SIZE, DEFAULT_REPO, BugzillaCache, GithubCache)
+from .dump import dump, github_login, load_issues, merge_issues
+from .output import compact_series as encode_series, write_output
+from .timing import Timer
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+class Dashboard:
+    """Keeps the dashboard output current from one long-running process.
+
+    The issue frame stays in memory between refreshes; each refresh reads
+    back only the issues the GitHub sync touched. The output is rewritten
+    only when the caches' contents, or the date, have changed since the
+    last write.
+    """
+
+    def __init__(
+            self,
+            cache: GithubCache,
+            bugzilla_cache: BugzillaCache,
+            output: str,
+            sharded: bool = False,
+            compact_series: bool = False) -> None:
+        self.cache = cache
+        self.bugzilla_cache = bugzilla_cache
+        self.output = output
+        self.sharded = sharded
+        self.compact_series = compact_series
+        self.issues: Optional["pd.DataFrame"] = None
+        self._loaded_through: Optional[int] = None
+        self._written: Optional[Tuple[Any, ...]] = None
+
+    def inputs(self) -> Tuple[Any, ...]:
+        # Windows like "last 30 days" move with the (UTC) date even if nothing else does
+        return (
+            self.cache.version(), self.bugzilla_cache.version(),
+            dt.datetime.now(dt.timezone.utc).date())
+
+    def load(self) -> None:
+        # Read the sequence first: rows written while we load are read again next time
+        _, synced = self.cache.version()
+        if self.issues is None:
+            self.issues = load_issues(self.cache)
+        elif synced != self._loaded_through:
+            changed = load_issues(self.cache, synced_after=self._loaded_through)
+            self.issues = merge_issues(self.issues, changed)
+        self._loaded_through = synced
+
+    def regenerate(self, timer: Optional[Timer] = None) -> bool:
+        """Rewrite the output if its inputs changed; return whether it was."""
+        timer = timer or Timer()
+        inputs = self.inputs()
+        if inputs == self._written:
+            return False
+        with timer.stage("load_issues"):
+            self.load()
+        with timer.stage("signatures"):
+            self.cache.update_signatures()
+        with timer.stage("dump"):
+            body = dump(self.cache, self.bugzilla_cache, timer=timer, issues=self.issues)
+        with timer.stage("write"):
+            if self.compact_series:
+                body = encode_series(body)
+            write_output(body, self.output, self.sharded)
+        self._written = inputs
+        return True
+
+    def refresh(self, timer: Optional[Timer] = None) -> bool:
+        timer = timer or Timer()
+        with timer.stage("update_issues"):
+            self.cache.update(timer)
+        with timer.stage("update_bugzilla"):
+            self.bugzilla_cache.update()
+        return self.regenerate(timer)
+
+    def run(self, interval: float, stop: threading.Event, verbose: bool = False) -> None:
+        """Refresh every interval seconds until stop is set."""
+        while True:
+            started = dt.datetime.now()
+            try:
+                written = self.refresh()
+            except Exception as e:
+                # A failed sync shouldn't take the dashboard down; try again next time
+                click.echo("%s: refresh failed: %r" % (started.isoformat(), e), err=True)
+            else:
+                if verbose:
+                    elapsed = (dt.datetime.now() - started).total_seconds()
+                    click.echo("%s: %s in %.1fs" % (
+                        started.isoformat(), "wrote output" if written else "no changes", elapsed))
+            if stop.wait(interval):
+                return
+
+
+@click.command()
+@click.option("--interval", default=900, show_default=True,
+              help="Seconds between refreshes.")
+@click.option("--sharded", is_flag=True,
+              help="Write OUTPUT, which must be given, as a directory of per-section "
+                   "files and a manifest.")
+@click.option("--compact-series", is_flag=True,
+              help="Encode dates and daily counts compactly instead of as full lists.")
+@click.option("--port", type=int,
+              help="Also answer dashboard queries over HTTP on this port; see scraper.api.")
+@click.option("--repo", "repos", multiple=True, default=[DEFAULT_REPO], show_default=True,
+              help="GitHub repository, as owner/name, to sync issues from; may be repeated.")
+@click.option("--sqlite-cache-mb", default=DEFAULT_CACHE_SIZE // 2**20, show_default=True,
+              help="SQLite page cache size for each connection to CACHE.")
+@click.option("--sqlite-mmap-mb", default=DEFAULT_MMAP_SIZE // 2**20, show_default=True,
+              help="How much of CACHE SQLite may memory-map; 0 turns mapping off.")
+@click.option("--verbose", "-v", is_flag=True)
+@click.option("--github-token", envvar="GITHUB_TOKEN")
+@click.argument("cache", required=False)
+@click.argument("output", required=False)
+def cli(interval, sharded, compact_series, port, repos, sqlite_cache_mb, sqlite_mmap_mb,
+        verbose, github_token, cache, output):
+    """Refresh the caches and regenerate the dashboard on a schedule."""
+    if sharded and not output:
+        # The sharded writer deletes old shards, so don't guess where they are
+        raise click.UsageError("--sharded needs an OUTPUT directory")
+    cache_path = cache or "issues.db"
+    tuning = dict(cache_size=sqlite_cache_mb * 2**20, mmap_size=sqlite_mmap_mb * 2**20)
+    dashboard = Dashboard(
+        GithubCache(cache_path, github_login(github_token), repos=repos, **tuning),
+        BugzillaCache(cache_path, **tuning),
+        output or "webcompat.json",
+        sharded=sharded,
+        compact_series=compact_series)
+    if port is not None:
+        api = DashboardAPI(cache_path)
+        api.watch(dashboard.cache, dashboard.bugzilla_cache)
+        serve(api, port=port)
+
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *args: stop.set())
+    dashboard.run(interval, stop, verbose)
+
+
+if __name__ == "__main__":
+    cli()
@@ -1,80 +1,138 @@
 from collections import Counter
+import cProfile
+from concurrent.futures import ThreadPoolExecutor
 import datetime as dt
-from dateutil.rrule import rrule, DAILY
-import json
-import os
+from functools import partial
 import re
 import sys
-from typing import List
+from typing import Dict, Iterable, List, Set
 from urllib.parse import urlencode
 
 import attr
 import click
-import dateutil
-import github3
-import pandas as pd
-import requests
-
-from .cache import GithubCache
-
-
-with open(os.path.join(os.path.dirname(__file__), "world_ranks.json")) as f:
-    world_ranks = json.load(f)
-
-
-def load_issues(cache):
-    issues = cache.issues()
-    rows = []
-    for i in issues:
-        match = re.search(b"(\\*\\*)?URL(\\*\\*)?:\\s+([^\r\n]+)\r?\n", i["body"])
-        domain = match and match.group(3).decode("utf-8")
-        d = {
-            "number": i["number"],
-            "created_at": i["created_at"].decode("ascii"),
-            "closed_at": i["closed_at"] and i["closed_at"].decode("ascii"),
-            "domain": domain,
-            "state": i["state"].decode("ascii"),
-        }
-        rows.append(d)
-
-    df = pd.DataFrame(rows)
-    df.closed_at = pd.to_datetime(df.closed_at)
-    df.created_at = pd.to_datetime(df.created_at)
-    hostname_re = r"(.*://)?(www\.)?([^:/]+)[:/]?.*"
-    df["hostname"] = df.domain.str.extract(hostname_re)[2]
-    return df
-
-
-def fetch_bugzilla_webcompat_bugs():
-    bugs = requests.get(
-        "https://bugzilla.mozilla.org/rest/bug",
-        params={
-            "o1": "regexp",
-            "v1": ".*webcompat.*",
-            "f1": "see_also",
-            "limit": 0,
-            "include_fields": [
-                "id",
-                "summary",
-                "product",
-                "component",
-                "votes",
-                "creation_time",
-                "last_change_time",
-                "status",
-                "resolution",
-                "see_also"]
-        }).json()["bugs"]
-    return bugs
-
-
-def fetch_bugzilla_partner_rel_bugs():
-    return requests.get(
-        "https://bugzilla.mozilla.org/rest/bug",
-        {
-            "status_whiteboard_type": "substring",
-            "status_whiteboard": "[platform-rel",
-        }).json()["bugs"]
+
+from .bugzilla import BugzillaClient, PARTNER_REL_QUERY, WEBCOMPAT_SEE_ALSO_QUERY
+from .cache import (
+    DEFAULT_CACHE_SIZE, DEFAULT_MMAP_SIZE, DEFAULT_REPO, BugzillaCache, GithubCache)
+from .output import compact_series as encode_series, write_output
+from .ranks import world_ranks
+from .suffixes import site_of
+from .timing import Timer
+
+# Rolling windows, in days, whose top domains dump() reports as last<N>
+WINDOWS = [7, 30, 90]
+# Weeks of history dump() reports for the busiest domains of the longest window
+HISTORY_WEEKS = 52
+
+# pandas, numpy and github3 are slow to import, so the functions that need
+# them import them; refreshing the caches or printing --help doesn't pay for
+# them.
+
+
+def _to_datetime(values):
+    import pandas as pd
+
+    # GitHub timestamps are UTC; keep them naive so they compare with datetime.now()
+    return pd.Series(pd.to_datetime(values, utc=True)).dt.tz_localize(None)
+
+
+def concat_issues(frames):
+    """Concatenate issue frames, keeping repo, state, hostname and site categorical."""
+    import pandas as pd
+    from pandas.api.types import union_categoricals
+
+    frames = [frame for frame in frames if len(frame)]
+    if not frames:
+        return pd.DataFrame({
+            "repo": pd.Categorical([]),
+            "number": pd.Series([], dtype="int64"),
+            "created_at": pd.Series([], dtype="datetime64[ns]"),
+            "closed_at": pd.Series([], dtype="datetime64[ns]"),
+            "state": pd.Categorical([]),
+            "hostname": pd.Categorical([]),
+            "site": pd.Categorical([]),
+        })
+    return pd.DataFrame({
+        "repo": union_categoricals([frame.repo for frame in frames], sort_categories=True),
+        "number": pd.concat([frame.number for frame in frames], ignore_index=True),
+        "created_at": pd.concat([frame.created_at for frame in frames], ignore_index=True),
+        "closed_at": pd.concat([frame.closed_at for frame in frames], ignore_index=True),
+        "state": union_categoricals([frame.state for frame in frames], sort_categories=True),
+        "hostname": union_categoricals(
+            [frame.hostname for frame in frames], sort_categories=True),
+        "site": union_categoricals([frame.site for frame in frames], sort_categories=True),
+    })
+
+
+def group_sites(hostnames):
+    """Map a hostname categorical to the registrable domain of each hostname.
+
+    Only the distinct hostnames are looked up, so this costs the same for a
+    thousand issues on a site as for one.
+    """
+    import numpy as np
+    import pandas as pd
+
+    sites = [site_of(hostname) for hostname in hostnames.categories]
+    codes, categories = pd.factorize(pd.Series(sites, dtype=object), sort=True)
+    # Categorical codes of -1 (missing) pick up the -1 appended at the end
+    codes = np.append(codes, -1)[hostnames.codes]
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+
+def load_issues(cache, chunk_size=10000, synced_after=None):
+    """Build a frame of every cached issue, a chunk of rows at a time.
+
+    Each chunk is converted to typed columns before the next is read, so we
+    never hold the whole result set as Python objects. repo, state and
+    hostname have few distinct values and are stored as categoricals. site
+    groups hostnames by registrable domain, so m.example.com and
+    example.com both count towards example.com. With synced_after, a write
+    sequence from cache.version(), only issues written since are loaded.
+    """
+    import pandas as pd
+
+    frames = []
+    for rows in cache.issue_chunks(chunk_size, synced_after=synced_after):
+        repo, number, created_at, closed_at, state, hostname = zip(*rows)
+        hostname = pd.Categorical(hostname)
+        frames.append(pd.DataFrame({
+            "repo": pd.Categorical(repo),
+            "number": pd.Series(number, dtype="int64"),
+            "created_at": _to_datetime(created_at),
+            "closed_at": _to_datetime(closed_at),
+            "state": pd.Categorical(state),
+            "hostname": hostname,
+            "site": group_sites(hostname),
+        }))
+    return concat_issues(frames)
+
+
+def merge_issues(issues, changed):
+    """Replace rows of issues with the rows in changed for the same repo and number.
+
+    The result is ordered by repo, then number.
+    """
+    import pandas as pd
+
+    def keys(frame):
+        return pd.MultiIndex.from_arrays([frame.repo.astype(str), frame.number])
+
+    kept = issues[~keys(issues).isin(keys(changed))]
+    return (
+        concat_issues([kept, changed])
+        .sort_values(["repo", "number"], kind="mergesort")
+        .reset_index(drop=True))
+
+
+def fetch_bugzilla_webcompat_bugs(client=None):
+    client = client or BugzillaClient()
+    return client.search(WEBCOMPAT_SEE_ALSO_QUERY)
+
+
+def fetch_bugzilla_partner_rel_bugs(client=None):
+    client = client or BugzillaClient()
+    return client.search(PARTNER_REL_QUERY)
 
 
 @attr.s
@@ -164,203 +222,488 @@ SITE_TO_TAGS = {
 }
 
 
-def sort_partner_rel_bugs(bugs):
+class PartnerTagIndex:
+    """Maps platform-rel whiteboard tags to the partners they include or exclude.
+
+    Built once from a partner -> PlatformRelSpec mapping, so classifying a
+    bug only costs a lookup per tag on that bug, however many partners
+    there are.
+    """
+
+    def __init__(self, specs: Dict[str, PlatformRelSpec]) -> None:
+        self.partners = list(specs)
+        self.include: Dict[str, Set[int]] = {}
+        self.exclude: Dict[str, Set[int]] = {}
+        for i, spec in enumerate(specs.values()):
+            for tag in spec.prefixed_include():
+                self.include.setdefault(tag, set()).add(i)
+            for tag in spec.prefixed_exclude():
+                self.exclude.setdefault(tag, set()).add(i)
+
+    def partners_for(self, tags: Iterable[str]) -> List[str]:
+        included: Set[int] = set()
+        excluded: Set[int] = set()
+        for tag in tags:
+            included.update(self.include.get(tag, ()))
+            excluded.update(self.exclude.get(tag, ()))
+        return [self.partners[i] for i in sorted(included - excluded)]
+
+
+PARTNER_TAG_INDEX = PartnerTagIndex(SITE_TO_TAGS)
+
+
+def sort_partner_rel_bugs(bugs, index=PARTNER_TAG_INDEX):
     by_partner = {}
     for bug in bugs:
         tags = re.findall(r"\[([^\]]+)\]", bug["whiteboard"].lower())
-        for partner, spec in SITE_TO_TAGS.items():
-            if any(tag in spec.prefixed_exclude() for tag in tags):
-                continue
-            if any(tag in spec.prefixed_include() for tag in tags):
-                by_partner.setdefault(partner, []).append(bug)
+        for partner in index.partners_for(tags):
+            by_partner.setdefault(partner, []).append(bug)
     return by_partner
 
 
-def annotate_rankings(d):
-    to_rename = []
-    for key in d:
-        for site in world_ranks:
-            if key == site or key.endswith(f".{site}"):
-                to_rename.append((key, site))
-                break
-    for key, site in to_rename:
-        d[f"{key} {world_ranks[site]}"] = d.pop(key)
-    return d
+def _day_offsets(timestamps, start):
+    import numpy as np
+    import pandas as pd
+
+    # Bugzilla timestamps are ISO 8601; the leading YYYY-MM-DD is the date
+    # dateutil would have given us, without parsing the rest.
+    days = pd.to_datetime(timestamps.str[:10], format="%Y-%m-%d").values.astype("datetime64[D]")
+    return (days - start).astype(np.int64)
+
+
+def open_bugs_series(by_partner, dates_x):
+    """Count the open bugs for each partner on each day of dates_x.
+
+    A bug counts as open from the day it was created through the day it was
+    last resolved, inclusive. dates_x must be consecutive days. Rather than
+    testing every bug against every day, this marks +1 on the creation day
+    and -1 on the day after resolution in one array per partner, and takes
+    a cumulative sum.
+    """
+    import numpy as np
+    import pandas as pd
+
+    partners = list(by_partner)
+    n_days = len(dates_x)
+    rows = [
+        (i, bug["creation_time"], bug["cf_last_resolved"] or None)
+        for i, partner in enumerate(partners)
+        for bug in by_partner[partner]
+    ]
+    if not rows or not n_days:
+        return {partner: [0] * n_days for partner in partners}
+    bugs = pd.DataFrame(rows, columns=["partner", "created", "resolved"])
+    start = np.datetime64(dates_x[0], "D")
+
+    first = _day_offsets(bugs.created, start)
+    last = np.full(len(bugs), n_days - 1, dtype=np.int64)
+    resolved = bugs.resolved.notnull().values
+    last[resolved] = _day_offsets(bugs.resolved[resolved], start)
+
+    first = np.maximum(first, 0)
+    last = np.minimum(last, n_days - 1)
+    valid = first <= last
+    partner = bugs.partner.values[valid]
+
+    diff = np.zeros((len(partners), n_days + 1), dtype=np.int64)
+    np.add.at(diff, (partner, first[valid]), 1)
+    np.add.at(diff, (partner, last[valid] + 1), -1)
+    counts = diff.cumsum(axis=1)[:, :n_days]
+    return {partner: counts[i].tolist() for i, partner in enumerate(partners)}
+
+
+def see_also_join_table(bz):
+    import pandas as pd
+
+    # Make a mapping of bugzilla ID <-see also-> webcompat bugs
+    urls = bz["see_also"].explode()
+    urls = urls[urls.str.contains("webcompat", regex=False, na=False)]
+    webcompat_ids = urls.str.extract(r"(\d{2,})", expand=False).dropna()
+    return (
+        pd.DataFrame({
+            "bugzilla_id": webcompat_ids.index.values,
+            "webcompat_id": webcompat_ids.values.astype("int64"),
+        })
+        .drop_duplicates()
+    )
 
 
-def dump(cache):
-    df = load_issues(cache)
+def rank(series, limit=10):
+    """Return the limit largest nonzero counts in series as a dict, largest first.
 
-    result = {
-        "last_updated": dt.datetime.now().isoformat(),
+    Ties are broken by name, as in top_counts(), whatever order the index is in.
+    """
+    import numpy as np
+
+    ranked = series[series > 0]
+    ranked = ranked.iloc[np.lexsort((ranked.index.astype(str), -ranked.values))]
+    return (ranked if limit is None else ranked[:limit]).to_dict()
+
+
+def top_hostnames(issues, limit=10, by="site"):
+    """Count issues by site or hostname, both across repositories and in each one.
+
+    Returns ({site: n}, {repo: {site: n}}), each keeping the limit largest
+    counts. Both come from a single groupby over the frame.
+    """
+    counts = (
+        issues
+        .loc[~issues.hostname.isnull() & (issues.hostname != "None"), :]
+        .groupby(["repo", by], observed=True)["number"]
+        .count())
+    combined = rank(counts.groupby(level=by, observed=True).sum(), limit)
+    by_repo = {
+        repo: rank(counts.xs(repo, level="repo"), limit)
+        for repo in counts.index.unique(level="repo")
     }
+    return combined, by_repo
+
+
+def top_counts(hostname_counts, limit=10, by="site"):
+    """Total (hostname, n) pairs by site or hostname and keep the limit largest."""
+    totals = Counter()
+    for hostname, n in hostname_counts:
+        totals[site_of(hostname) if by == "site" else hostname] += n
+    ranked = sorted(totals.items(), key=lambda item: (-item[1], item[0]))
+    return dict(ranked if limit is None else ranked[:limit])
+
+
+def history_weeks(today, weeks=HISTORY_WEEKS):
+    """Return the first day of each of the weeks ending today, oldest first."""
+    return [today - dt.timedelta(days=7 * k + 6) for k in reversed(range(weeks))]
+
+
+def created_windows(issues, today, by="site", windows=WINDOWS, weeks=HISTORY_WEEKS, limit=10):
+    """Count the issues created in each rolling window and week, in one pass.
+
+    Each issue falls into one bin of days before today, with bin edges at
+    every window length and week boundary. Counting issues per (repo, site)
+    and bin gives a small matrix whose cumulative sum along the bins is the
+    number created within N days for every edge N at once; a week is the
+    difference of two neighbouring edges.
+
+    Windows are whole days, today included. Returns ({window: {site: n}},
+    {repo: {window: {site: n}}}, history), where history holds weekly counts
+    for the limit busiest sites of the longest window.
+    """
+    import numpy as np
+    import pandas as pd
+
+    edges = sorted(set(windows) | {7 * k for k in range(1, weeks + 1)})
+    counted = issues.loc[
+        ~issues.hostname.isnull() & (issues.hostname != "None") & issues.created_at.notnull(),
+        ["repo", by, "created_at"]]
+    days = counted.created_at.values.astype("datetime64[D]")
+    age = (np.datetime64(today, "D") - days).astype(np.int64)
+    recent = (age >= 0) & (age < edges[-1])
+    counted, age = counted[recent], age[recent]
+
+    groups = counted.groupby(["repo", by], observed=True)
+    keys = groups.size().index
+    cells = groups.ngroup().values * len(edges) + np.searchsorted(edges, age, side="right")
+    counts = np.bincount(cells, minlength=len(keys) * len(edges)).reshape(len(keys), len(edges))
+    # within[N] counts the issues created less than N days ago
+    within = pd.DataFrame(counts.cumsum(axis=1), index=keys, columns=edges)
+    combined = within.groupby(level=by, observed=True).sum()
+
+    top = {"last%d" % w: rank(combined[w], limit) for w in windows}
+    by_repo = {
+        repo: {"last%d" % w: rank(within.xs(repo, level="repo")[w], limit) for w in windows}
+        for repo in within.index.unique(level="repo")
+    }
+    busiest = list(top["last%d" % max(windows)])
+    week_ends = [7 * (k + 1) for k in range(weeks)]
+    # Newest week first, so reverse each row
+    weekly = np.diff(combined.loc[busiest, week_ends].values, axis=1, prepend=0)[:, ::-1]
+    history = {
+        "weeks": [day.isoformat() for day in history_weeks(today, weeks)],
+        "counts": {site: row.tolist() for site, row in zip(busiest, weekly)},
+    }
+    return top, by_repo, history
+
+
+def cached_windows(
+        cache, today, repos, by="site", windows=WINDOWS, weeks=HISTORY_WEEKS, limit=10):
+    """Answer created_windows() from the daily totals the cache keeps."""
+    until = dt.datetime.combine(today + dt.timedelta(days=1), dt.time())
+
+    def created(days, end_days=0, repo=None, limit=limit):
+        start = until - dt.timedelta(days=days)
+        end = until - dt.timedelta(days=end_days)
+        return top_counts(cache.created_hostname_counts(start, -1, end, repo=repo), limit, by)
+
+    top = {"last%d" % w: created(w) for w in windows}
+    by_repo = {repo: {"last%d" % w: created(w, repo=repo) for w in windows} for repo in repos}
+    busiest = list(top["last%d" % max(windows)])
+    weekly = [created(7 * (k + 1), 7 * k, limit=None) for k in reversed(range(weeks))]
+    history = {
+        "weeks": [day.isoformat() for day in history_weeks(today, weeks)],
+        "counts": {site: [week.get(site, 0) for week in weekly] for site in busiest},
+    }
+    return top, by_repo, history
+
+
+def duplicate_clusters(signed, by="site", limit=10, per_site=3, listed=20):
+    """Group open reports for the same site that look like duplicates of each other.
+
+    signed holds (repo, number, hostname, signature) rows from
+    GithubCache.open_signatures(). Returns {site: [cluster, ...]} for the
+    limit sites with the largest clusters, largest first, keeping each
+    site's per_site largest clusters of two or more reports. A cluster is
+    {"size": n, "issues": ["owner/name#number", ...]}, listing at most
+    listed issues in (repo, number) order. A limit or per_site of None
+    keeps them all.
+    """
+    import numpy as np
+    import pandas as pd
+
+    from .similarity import NUM_HASHES, find_clusters
+
+    signed = [row for row in signed if row[2] is not None and row[2] != "None"]
+    if not signed:
+        return {}
+    repos, numbers, hostnames, signatures = zip(*signed)
+    keys = [site_of(hostname) for hostname in hostnames] if by == "site" else list(hostnames)
+    codes, _ = pd.factorize(pd.Series(keys))
+    matrix = np.frombuffer(b"".join(signatures), dtype=np.uint32).reshape(-1, NUM_HASHES)
+    frame = pd.DataFrame({
+        "site": keys,
+        "ref": ["%s#%d" % (repo, number) for repo, number in zip(repos, numbers)],
+        "cluster": find_clusters(codes, matrix),
+    })
+    frame["n"] = frame.groupby("cluster")["ref"].transform("size")
+    # Rows stay in (repo, number) order within each cluster; clusters are
+    # labelled by their first row, which breaks ties between equal sizes
+    frame = frame[frame.n >= 2].sort_values(["n", "site", "cluster"], ascending=[False, True, True],
+                                            kind="mergesort")
+    result = {}
+    for _, members in frame.groupby("cluster", sort=False):
+        site = members.site.iloc[0]
+        if site not in result and limit is not None and len(result) >= limit:
+            continue
+        clusters = result.setdefault(site, [])
+        if per_site is None or len(clusters) < per_site:
+            clusters.append({"size": len(members), "issues": members.ref[:listed].tolist()})
+    return result
 
-    # Top open domains
-    result["open"] = (
-        df
-        .loc[
-            (df.state == "open") &
-            ~df.hostname.isnull() &
-            (df.hostname != "None"), :]
-        .groupby("hostname")["number"]
-        .count()
-        .sort_values(ascending=False)
-        [:10]
-        .to_dict())
-    result["open"] = annotate_rankings(result["open"])
 
-    # Top domains, last 30 days
-    result["last30"] = (
-        df
-        .loc[
-            (df.created_at >= dt.datetime.now() - dt.timedelta(days=30)) &
-            ~df.hostname.isnull() &
-            (df.hostname != "None"), :]
-        .groupby("hostname")
-        ["number"]
-        .count()
-        .sort_values(ascending=False)
-        [:10]
-        .to_dict())
-    result["last30"] = annotate_rankings(result["last30"])
-
-    bugzilla_see_also = fetch_bugzilla_webcompat_bugs()
-    bz = pd.DataFrame(bugzilla_see_also).set_index("id")
+def annotate_rankings(d):
+    to_rename = [key for key in d if world_ranks().find(key) is not None]
+    for key in to_rename:
+        d[world_ranks().annotate(key)] = d.pop(key)
+    return d
 
-    # Make a mapping of bugzilla ID <-see also-> webcompat bugs
-    join_table_rows = []
-    for key, urls in bz["see_also"].items():
-        for url in urls:
-            if "webcompat" not in url:
-                continue
-            m = re.search(r"\d{2,}", url)
-            if not m:
-                continue
-            webcompat_id = int(m[0])
-            join_table_rows.append({
-                "bugzilla_id": key,
-                "webcompat_id": webcompat_id,
-            })
-    join_table = (
-        pd.DataFrame(join_table_rows, columns=["bugzilla_id", "webcompat_id"])
-        .drop_duplicates()
-    )
 
-    wc_dupes = (
-        join_table
-        .merge(
-            # fetch indices of open bugs
-            bz.query(
-                "status == 'UNCONFIRMED' or status == 'NEW' "
-                "or status == 'ASSIGNED' or status == 'REOPENED'")[[]],
-            how="inner",
-            left_on="bugzilla_id",
-            right_index=True)
-        .merge(
-            df[["number", "hostname"]],
-            how="left",
-            left_on="webcompat_id",
-            right_on="number")
-    )
+def dump(cache, bugzilla_cache=None, incremental=False, timer=None, issues=None, snapshot=None,
+         by="site"):
+    """Summarize the cached issues and Bugzilla bugs for the dashboard.
+
+    issues may be a frame from load_issues() that the caller keeps up to
+    date, in which case the issues aren't read from the cache again.
+    snapshot may be a directory written by scraper.snapshot.export(), which
+    the issues and see-also bugs are then read from instead. by is "site"
+    to count the top domains by registrable domain, or "hostname" to count
+    each hostname separately.
+    """
+    import pandas as pd
+
+    from . import snapshot as snapshots
+
+    timer = timer or Timer()
+    if bugzilla_cache is None:
+        # Query Bugzilla in the background while we work through the GitHub issues
+        executor = ThreadPoolExecutor(max_workers=2)
+        bugzilla_see_also = executor.submit(fetch_bugzilla_webcompat_bugs).result
+        partner_rel_bugs = executor.submit(fetch_bugzilla_partner_rel_bugs).result
+        executor.shutdown(wait=False)
+    else:
+        bugzilla_see_also = partial(bugzilla_cache.bugs, "see_also")
+        partner_rel_bugs = partial(bugzilla_cache.bugs, "partner_rel")
+
+    now = dt.datetime.now()
+    result = {
+        "last_updated": now.isoformat(),
+    }
 
-    n_dupes = wc_dupes.groupby("bugzilla_id")["webcompat_id"].count()
-    most_duped = (
-        wc_dupes
-        .groupby("bugzilla_id")
-        ["webcompat_id"]
-        .count()
-        .sort_values(ascending=False)
-        [:10])
-
-    def most_common(col):
-        c = Counter(col)
-        result = []
-        for key, n in c.most_common(3):
-            if not isinstance(key, str):
-                continue
-            for site in world_ranks:
-                if key == site or key.endswith(f".{site}"):
-                    key = f"{key} {world_ranks[site]}"
-                    break
-            result.append(f"{key} ({n})")
-        return ", ".join(result)
-
-    domains_per_bz_issue = (
-        wc_dupes
-        .groupby("bugzilla_id")
-        ["hostname"]
-        .agg(most_common)
-    )
+    # Issues are binned by the UTC day they were created, so count days in UTC too
+    today = dt.datetime.now(dt.timezone.utc).date()
+    if incremental:
+        # Read the running totals the cache keeps, instead of every issue
+        with timer.stage("top_domains"):
+            repos = cache.repositories()
+            result["open"] = top_counts(cache.open_hostname_counts(-1), by=by)
+            open_by_repo = {
+                repo: top_counts(cache.open_hostname_counts(-1, repo), by=by) for repo in repos
+            }
+        with timer.stage("windows"):
+            windows, windows_by_repo, history = cached_windows(cache, today, repos, by)
+    else:
+        with timer.stage("load_issues") as span:
+            if issues is not None:
+                df = issues
+            elif snapshot:
+                df = snapshots.read_issues(snapshot)
+            else:
+                df = load_issues(cache)
+            span.rows = len(df)
+
+        with timer.stage("top_domains"):
+            repos = sorted(df.repo.unique())
+            result["open"], open_by_repo = top_hostnames(df[df.state == "open"], by=by)
+        with timer.stage("windows"):
+            windows, windows_by_repo, history = created_windows(df, today, by)
 
-    annotated = bz.copy()
-    annotated["most_reported"] = domains_per_bz_issue
-    annotated["wc_dupes"] = n_dupes
+    result["open"] = annotate_rankings(result["open"])
+    result["windows"] = {name: annotate_rankings(top) for name, top in windows.items()}
+    # The dashboard's "last 30 days" view
+    result["last30"] = dict(result["windows"]["last30"])
+    history["counts"] = annotate_rankings(history["counts"])
+    result["history"] = history
+    result["by_repo"] = {}
+    for repo in repos:
+        repo_windows = {
+            name: annotate_rankings(top)
+            for name, top in windows_by_repo.get(repo, {}).items()
+        }
+        result["by_repo"][repo] = {
+            "open": annotate_rankings(open_by_repo.get(repo, {})),
+            "last30": dict(repo_windows.get("last30", {})),
+            "windows": repo_windows,
+        }
 
-    result["bugzilla"] = (
-        annotated
-        .loc[most_duped.index, ["wc_dupes", "component", "summary", "most_reported"]]
-        .reset_index()
-        .to_dict(orient="records"))
+    with timer.stage("clusters") as span:
+        signed = cache.open_signatures()
+        span.rows = len(signed)
+        result["clusters"] = annotate_rankings(duplicate_clusters(signed, by=by))
+
+    with timer.stage("bugzilla_see_also") as span:
+        if snapshot:
+            bz = snapshots.read_bugzilla(snapshot)
+        else:
+            bz = pd.DataFrame(bugzilla_see_also()).set_index("id")
+        span.rows = len(bz)
+
+    with timer.stage("see_also_join") as span:
+        join_table = snapshots.read_see_also(snapshot) if snapshot else see_also_join_table(bz)
+        span.rows = len(join_table)
+
+    with timer.stage("dupes") as span:
+        # Bugzilla's see-also links point at webcompat.com, whose issues are DEFAULT_REPO's
+        if incremental:
+            hostnames = pd.DataFrame(
+                cache.hostnames(join_table.webcompat_id.unique().tolist()),
+                columns=["number", "hostname"]).astype({"number": "int64"})
+        else:
+            hostnames = df.loc[df.repo == DEFAULT_REPO, ["number", "hostname"]]
+        wc_dupes = (
+            join_table
+            .merge(
+                # fetch indices of open bugs
+                bz.query(
+                    "status == 'UNCONFIRMED' or status == 'NEW' "
+                    "or status == 'ASSIGNED' or status == 'REOPENED'")[[]],
+                how="inner",
+                left_on="bugzilla_id",
+                right_index=True)
+            .merge(
+                hostnames,
+                how="left",
+                left_on="webcompat_id",
+                right_on="number")
+        )
+        span.rows = len(wc_dupes)
+
+        n_dupes = wc_dupes.groupby("bugzilla_id")["webcompat_id"].count()
+        most_duped = (
+            wc_dupes
+            .groupby("bugzilla_id")
+            ["webcompat_id"]
+            .count()
+            .sort_values(ascending=False)
+            [:10])
+
+        def most_common(col):
+            c = Counter(col)
+            result = []
+            for key, n in c.most_common(3):
+                if not isinstance(key, str):
+                    continue
+                result.append(f"{world_ranks().annotate(key)} ({n})")
+            return ", ".join(result)
+
+        domains_per_bz_issue = (
+            wc_dupes
+            .groupby("bugzilla_id")
+            ["hostname"]
+            .agg(most_common)
+        )
+
+        annotated = bz.copy()
+        annotated["most_reported"] = domains_per_bz_issue
+        annotated["wc_dupes"] = n_dupes
+
+        result["bugzilla"] = (
+            annotated
+            .loc[most_duped.index, ["wc_dupes", "component", "summary", "most_reported"]]
+            .reset_index()
+            .to_dict(orient="records"))
 
     # Assemble per-partner results
-    partner_rel_bugs = fetch_bugzilla_partner_rel_bugs()
-    by_partner = sort_partner_rel_bugs(partner_rel_bugs)
+    with timer.stage("bugzilla_partner_rel") as span:
+        partner_rel = partner_rel_bugs()
+        span.rows = len(partner_rel)
+
+    with timer.stage("sort_partner_rel_bugs"):
+        by_partner = sort_partner_rel_bugs(partner_rel)
 
-    dates_x = [x.date() for x in rrule(DAILY, dtstart=dt.date(2016, 1, 1), until=dt.date.today())]
+    first_day = dt.date(2016, 1, 1)
+    dates_x = [first_day + dt.timedelta(days=i)
+               for i in range((dt.date.today() - first_day).days + 1)]
     result["dates_x"] = [d.isoformat() for d in dates_x]
 
-    retain_keys = ["id", "summary", "resolution"]
-    subset = {}
-    for partner, bugs in by_partner.items():
-        regression_bugs = []
-        open_bugs = [0] * len(dates_x)
-        n_open = 0
-        n_sitewait = 0
-        n_regression = 0
-        bugs = sorted(
-            bugs,
-            key=lambda bug: dateutil.parser.parse(bug["creation_time"]),
-            reverse=True)
-        for bug in bugs:
-            if bug["resolution"] == "":
-                n_open += 1
-                if "regression" in bug["keywords"]:
-                    regression_bugs.append({k: bug[k] for k in retain_keys})
-                    n_regression += 1
-                n_sitewait += 1 if "sitewait" in bug["whiteboard"].lower() else 0
-            created = dateutil.parser.parse(bug["creation_time"]).date()
-            if bug["cf_last_resolved"]:
-                last_resolved = dateutil.parser.parse(bug["cf_last_resolved"]).date()
-            else:
-                last_resolved = dt.date.max
-            for j, d in enumerate(dates_x):
-                if created <= d <= last_resolved:
-                    open_bugs[j] += 1
-        d = {
-            "summary": {
-                "n_open": n_open,
-                "open_url": SITE_TO_TAGS[partner].open_query_url(),
-                "n_sitewait": n_sitewait,
-                "sitewait_url": SITE_TO_TAGS[partner].sitewait_query_url(),
-                "n_regression": n_regression,
-                "regression_url": SITE_TO_TAGS[partner].regression_query_url(),
-                "open_bugs_y": open_bugs,
-            },
-            "regression_bugs": regression_bugs,
-        }
-        subset[partner] = d
-    result["by_partner"] = subset
+    with timer.stage("open_bugs_series") as span:
+        open_bugs_y = open_bugs_series(by_partner, dates_x)
+        span.rows = len(dates_x)
+
+    with timer.stage("partner_summaries") as span:
+        retain_keys = ["id", "summary", "resolution"]
+        subset = {}
+        for partner, bugs in by_partner.items():
+            regression_bugs = []
+            n_open = 0
+            n_sitewait = 0
+            n_regression = 0
+            created = pd.to_datetime([bug["creation_time"] for bug in bugs], utc=True)
+            order = sorted(range(len(bugs)), key=created.__getitem__, reverse=True)
+            for bug in (bugs[i] for i in order):
+                if bug["resolution"] == "":
+                    n_open += 1
+                    if "regression" in bug["keywords"]:
+                        regression_bugs.append({k: bug[k] for k in retain_keys})
+                        n_regression += 1
+                    n_sitewait += 1 if "sitewait" in bug["whiteboard"].lower() else 0
+            d = {
+                "summary": {
+                    "n_open": n_open,
+                    "open_url": SITE_TO_TAGS[partner].open_query_url(),
+                    "n_sitewait": n_sitewait,
+                    "sitewait_url": SITE_TO_TAGS[partner].sitewait_query_url(),
+                    "n_regression": n_regression,
+                    "regression_url": SITE_TO_TAGS[partner].regression_query_url(),
+                    "open_bugs_y": open_bugs_y[partner],
+                },
+                "regression_bugs": regression_bugs,
+            }
+            subset[partner] = d
+        result["by_partner"] = subset
+        span.rows = len(subset)
 
     return result
 
 
-@click.command()
-@click.option("--refresh/--no-refresh", default=False)
-@click.option("--verbose", "-v", is_flag=True)
-@click.option("--github-token", envvar="GITHUB_TOKEN")
-@click.argument("cache", required=False)
-@click.argument("output", required=False)
-def cli(refresh, verbose, github_token, cache, output):
+def github_login(github_token):
+    import github3
+
     if not github_token:
         try:
             with open(".token", "r") as f:
@@ -369,21 +712,106 @@ def cli(refresh, verbose, github_token, cache, output):
             click.echo("Couldn't open .token; please specify a --github-token "
                        "or set GITHUB_TOKEN.", err=True)
             sys.exit(1)
+    return github3.login(token=github_token)
 
-    github_session = github3.login(token=github_token)
-    cache = GithubCache(cache or "issues.db", github_session)
-    output = output or "webcompat.json"
 
+@click.command()
+@click.option("--refresh/--no-refresh", default=False)
+@click.option("--refresh-only", is_flag=True,
+              help="Update the caches, then exit without summarizing them.")
+@click.option("--full-refresh", is_flag=True,
+              help="Re-download every Bugzilla bug instead of only recent changes.")
+@click.option("--incremental", is_flag=True,
+              help="Use the issue counts kept in the cache instead of recounting every issue.")
+@click.option("--sharded", is_flag=True,
+              help="Write OUTPUT, which must be given, as a directory of per-section "
+                   "files and a manifest.")
+@click.option("--compact-series", is_flag=True,
+              help="Encode dates and daily counts compactly instead of as full lists.")
+@click.option("--by", type=click.Choice(["site", "hostname"]), default="site", show_default=True,
+              help="Count the top domains by registrable domain or by exact hostname.")
+@click.option("--snapshot", "snapshot_path",
+              help="Keep an Arrow snapshot of the caches in this directory and summarize from it. "
+                   "Needs pyarrow.")
+@click.option("--profile", "profile_path",
+              help="Write a JSON report of how long each stage took, and its memory use, "
+                   "to this file.")
+@click.option("--cprofile", "cprofile_path",
+              help="Also run under cProfile and write pstats output to this file.")
+@click.option("--repo", "repos", multiple=True, default=[DEFAULT_REPO], show_default=True,
+              help="GitHub repository, as owner/name, to sync issues from; may be repeated.")
+@click.option("--sqlite-cache-mb", default=DEFAULT_CACHE_SIZE // 2**20, show_default=True,
+              help="SQLite page cache size for each connection to CACHE.")
+@click.option("--sqlite-mmap-mb", default=DEFAULT_MMAP_SIZE // 2**20, show_default=True,
+              help="How much of CACHE SQLite may memory-map; 0 turns mapping off.")
+@click.option("--verbose", "-v", is_flag=True)
+@click.option("--github-token", envvar="GITHUB_TOKEN")
+@click.argument("cache", required=False)
+@click.argument("output", required=False)
+def cli(refresh, refresh_only, full_refresh, incremental, sharded, compact_series, by,
+        snapshot_path, profile_path, cprofile_path, repos, sqlite_cache_mb, sqlite_mmap_mb,
+        verbose, github_token, cache, output):
+    if sharded and not output:
+        # The sharded writer deletes old shards, so don't guess where they are
+        raise click.UsageError("--sharded needs an OUTPUT directory")
+    github_session = github_login(github_token)
+    cache_path = cache or "issues.db"
+    tuning = dict(cache_size=sqlite_cache_mb * 2**20, mmap_size=sqlite_mmap_mb * 2**20)
+    cache = GithubCache(cache_path, github_session, repos=repos, **tuning)
+    bugzilla_cache = BugzillaCache(cache_path, **tuning)
+    output = output or "webcompat.json"
+    # Only a profile report is worth resetting the process's peak memory for
+    timer = Timer(track_peak=bool(profile_path))
+    profiler = None
+    if cprofile_path:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    refresh = refresh or refresh_only
     if refresh:
         if verbose:
             click.echo("Updating issue cache...")
-        cache.update()
+        with timer.stage("update_issues"):
+            cache.update(timer)
+    if refresh or full_refresh or not bugzilla_cache.populated():
+        if verbose:
+            click.echo("Updating Bugzilla cache...")
+        with timer.stage("update_bugzilla"):
+            bugzilla_cache.update(full=full_refresh)
+
+    if not refresh_only:
+        # Signing needs numpy, so a refresh on its own leaves it to the next summary
+        with timer.stage("signatures"):
+            cache.update_signatures()
+
+    # Everything from here on only reads, so it can't hold up another
+    # process that is syncing the same cache.
+    cache = GithubCache(cache_path, None, read_only=True, **tuning)
+    bugzilla_cache = BugzillaCache(cache_path, read_only=True, **tuning)
 
-    if verbose:
-        click.echo("Summarizing bugs...")
-    body = dump(cache)
-    with open(output, "w") as f:
-        json.dump(body, f)
+    if snapshot_path:
+        from .snapshot import export
+
+        if verbose:
+            click.echo("Updating snapshot...")
+        with timer.stage("snapshot"):
+            export(cache, bugzilla_cache, snapshot_path, timer)
+
+    if not refresh_only:
+        if verbose:
+            click.echo("Summarizing bugs...")
+        with timer.stage("dump"):
+            body = dump(cache, bugzilla_cache, incremental, timer, snapshot=snapshot_path, by=by)
+        with timer.stage("write"):
+            if compact_series:
+                body = encode_series(body)
+            write_output(body, output, sharded)
+
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(cprofile_path)
+    if profile_path:
+        timer.write(profile_path)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,136 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+import re
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+if TYPE_CHECKING:
+    import requests
+
+GITHUB_API_URL = "https://api.github.com"
+
+
+def server_time(response: "requests.Response") -> str:
+    return parsedate_to_datetime(response.headers["Date"]).isoformat()
+
+
+class GithubClient:
+    """Fetches a repository's issues from the GitHub REST API page by page.
+
+    Requests share one session, so this can be used from several threads.
+    Every response's rate limit headers are tracked, and once fewer than
+    min_remaining requests are left in the window, callers wait for the
+    window to reset instead of running into 403s.
+    """
+
+    def __init__(
+            self,
+            session: "requests.Session",
+            owner: str,
+            repo: str,
+            api_url: str = GITHUB_API_URL,
+            per_page: int = 100,
+            min_remaining: int = 10) -> None:
+        self.session = session
+        self.url = "%s/repos/%s/%s/issues" % (api_url.rstrip("/"), owner, repo)
+        self.per_page = per_page
+        self.min_remaining = min_remaining
+        self._lock = threading.Lock()
+        self._remaining: Optional[int] = None
+        self._reset = 0.0
+
+    def _throttle(self) -> None:
+        with self._lock:
+            if self._remaining is None or self._remaining > self.min_remaining:
+                return
+            delay = self._reset - time.time()
+            if delay > 0:
+                time.sleep(delay + 1)
+            self._remaining = None
+
+    def _record_limits(self, response: "requests.Response") -> None:
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        reset = response.headers.get("X-RateLimit-Reset")
+        if remaining is None or reset is None:
+            return
+        with self._lock:
+            self._remaining = int(remaining)
+            self._reset = float(reset)
+
+    def _get(self, params: Dict[str, Any]) -> "requests.Response":
+        while True:
+            self._throttle()
+            response = self.session.get(self.url, params=params)
+            self._record_limits(response)
+            if response.status_code == 403 and self._remaining == 0:
+                continue
+            response.raise_for_status()
+            return response
+
+    def page(self, page: int, **params: Any) -> Tuple[List[Dict[str, Any]], "requests.Response"]:
+        params = dict(params, state="all", per_page=self.per_page, page=page)
+        response = self._get(params)
+        return response.json(), response
+
+    def last_page(self, response: "requests.Response") -> int:
+        last = response.links.get("last")
+        url = response.url if last is None else last["url"]
+        match = re.search(r"[?&]page=(\d+)", url)
+        if match is None:
+            raise ValueError("No page number in %s" % url)
+        return int(match[1])
+
+    def backfill(
+            self,
+            start_page: int = 1,
+            max_workers: int = 4) -> Iterator[Tuple[int, List[Dict[str, Any]], str]]:
+        """Yield (page number, issues, server time) in page order from start_page.
+
+        Issues are sorted by creation time, so page boundaries stay put while
+        we fetch pages concurrently.
+        """
+        params = {"sort": "created", "direction": "asc"}
+        first, response = self.page(start_page, **params)
+        yield start_page, first, server_time(response)
+        if len(first) < self.per_page:
+            return
+        next_page, last_page = start_page + 1, self.last_page(response)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Keep a bounded window of requests in flight, so that stopping
+            # early doesn't leave the rest of the repository queued up.
+            pending: Deque[Tuple[int, Future]] = deque()
+            while pending or next_page <= last_page:
+                while next_page <= last_page and len(pending) < 2 * max_workers:
+                    future = executor.submit(self.page, next_page, **params)
+                    pending.append((next_page, future))
+                    next_page += 1
+                page, future = pending.popleft()
+                issues, response = future.result()
+                yield page, issues, server_time(response)
+
+    def updated_since(self, since: str) -> Iterator[Dict[str, Any]]:
+        """Yield issues updated at or after since, least recently updated first.
+
+        Issues updated while we page through would shift the later pages
+        under us, so each request starts over from the last update time
+        seen instead of asking for the next page. Issues already yielded at
+        exactly that time are skipped when they come back.
+        """
+        page = 1
+        seen: Set[int] = set()
+        while True:
+            issues, _ = self.page(page, since=since, sort="updated", direction="asc")
+            for issue in issues:
+                if issue["updated_at"] != since or issue["number"] not in seen:
+                    yield issue
+            if len(issues) < self.per_page:
+                return
+            last = issues[-1]["updated_at"]
+            if last == since:
+                # A whole page updated in the same second; step past it
+                page += 1
+            else:
+                since, page, seen = last, 1, set()
+            seen.update(issue["number"] for issue in issues if issue["updated_at"] == since)
@@ -0,0 +1,145 @@
+import copy
+import datetime as dt
+import gzip
+import hashlib
+import json
+import os
+import re
+from typing import Any, Dict, List, Set, Union
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MANIFEST = "webcompat.manifest.json"
+SHARD_RE = re.compile(r"^.+\.[0-9a-f]{12}\.json(\.gz|\.br)?$")
+
+
+def encode_dates(dates: List[str]) -> Union[List[str], Dict[str, Any]]:
+    """Replace a list of consecutive ISO dates with its start and length."""
+    if not dates:
+        return dates
+    start = dt.date.fromisoformat(dates[0])
+    expected = (start + dt.timedelta(days=i) for i in range(len(dates)))
+    if any(date != day.isoformat() for date, day in zip(dates, expected)):
+        return dates
+    return {"encoding": "range", "start": dates[0], "step_days": 1, "length": len(dates)}
+
+
+def encode_counts(counts: List[int]) -> Dict[str, Any]:
+    """Run-length encode the day-to-day changes in a series of counts.
+
+    Open bug counts change on few days, so the deltas are mostly long runs
+    of zeros. runs is a flat list of [delta, repeat, delta, repeat, ...].
+    """
+    runs: List[int] = []
+    previous = 0
+    for count in counts:
+        delta = count - previous
+        previous = count
+        if runs and runs[-2] == delta:
+            runs[-1] += 1
+        else:
+            runs.extend([delta, 1])
+    return {"encoding": "delta-rle", "length": len(counts), "runs": runs}
+
+
+def compact_series(body: Dict[str, Any]) -> Dict[str, Any]:
+    """Return a copy of a dump() result with its time series encoded compactly.
+
+    site/index.html decodes both forms; see encode_dates and encode_counts
+    for the formats.
+    """
+    body = copy.deepcopy(body)
+    body["dates_x"] = encode_dates(body["dates_x"])
+    for data in body["by_partner"].values():
+        data["summary"]["open_bugs_y"] = encode_counts(data["summary"]["open_bugs_y"])
+    return body
+
+
+def shards(body: Dict[str, Any]) -> Dict[str, Any]:
+    """Split a dump() result into the pieces the site loads separately."""
+    pieces = {
+        "domains": {"open": body["open"], "last30": body["last30"], "by_repo": body["by_repo"]},
+        "trends": {"windows": body["windows"], "history": body["history"]},
+        "clusters": {"clusters": body["clusters"]},
+        "bugzilla": {"bugzilla": body["bugzilla"]},
+        "dates_x": {"dates_x": body["dates_x"]},
+    }
+    for partner, data in body["by_partner"].items():
+        pieces["partner-" + partner] = data
+    return pieces
+
+
+def write_atomic(path: str, data: bytes) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def write_output(body: Dict[str, Any], output: str, sharded: bool = False) -> None:
+    """Write body to the file output, or as shards into the directory output.
+
+    Either way readers never see a partly written file. site/index.html
+    prefers a manifest to the single file, so writing the single file
+    removes any manifest left beside it.
+    """
+    if sharded:
+        write_sharded(body, output)
+    else:
+        write_atomic(output, json.dumps(body).encode("utf-8"))
+        try:
+            os.remove(os.path.join(os.path.dirname(output), MANIFEST))
+        except FileNotFoundError:
+            pass
+
+
+def write_shard(directory: str, name: str, payload: Any) -> str:
+    data = json.dumps(payload, sort_keys=True).encode("utf-8")
+    filename = "%s.%s.json" % (name, hashlib.sha256(data).hexdigest()[:12])
+    path = os.path.join(directory, filename)
+    if not os.path.exists(path):
+        write_atomic(path + ".gz", gzip.compress(data, mtime=0))
+        if brotli is not None:
+            write_atomic(path + ".br", brotli.compress(data))
+        write_atomic(path, data)
+    return filename
+
+
+def referenced(directory: str) -> Set[str]:
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            return set(json.load(f)["files"].values())
+    except (OSError, ValueError, KeyError):
+        return set()
+
+
+def write_sharded(body: Dict[str, Any], directory: str) -> Dict[str, Any]:
+    """Write body as content-addressed shards plus a small manifest naming them.
+
+    Shard names change whenever their content does, so they can be served
+    with long cache lifetimes; only the manifest needs revalidating. Each
+    shard also gets a gzip sibling, and a brotli one if the brotli module
+    is installed. Shards that neither this manifest nor the one it replaces
+    refer to are deleted.
+    """
+    os.makedirs(directory, exist_ok=True)
+    keep = referenced(directory)
+    files = {name: write_shard(directory, name, payload) for name, payload in shards(body).items()}
+    manifest = {
+        "last_updated": body["last_updated"],
+        "partners": list(body["by_partner"]),
+        "files": files,
+    }
+    write_atomic(
+        os.path.join(directory, MANIFEST),
+        json.dumps(manifest, indent=2).encode("utf-8"))
+
+    keep |= set(files.values())
+    for filename in os.listdir(directory):
+        match = SHARD_RE.match(filename)
+        if match and filename[:len(filename) - len(match.group(1) or "")] not in keep:
+            os.remove(os.path.join(directory, filename))
+    return manifest
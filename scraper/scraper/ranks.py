@@ -0,0 +1,59 @@
+from functools import lru_cache
+import json
+import os
+from typing import Dict, Optional, Tuple
+
+WORLD_RANKS_PATH = os.path.join(os.path.dirname(__file__), "world_ranks.json")
+
+
+class DomainRanks:
+    """Resolves hostnames to the ranked site they belong to.
+
+    A hostname belongs to a ranked site if it is the site or a subdomain of
+    it. Lookups walk the hostname's label suffixes against a dict, so they
+    cost O(labels) no matter how many sites are ranked. If several suffixes
+    are ranked, the one listed first in the source wins.
+    """
+
+    def __init__(self, ranks: Dict[str, str]) -> None:
+        self._ranks: Dict[str, Tuple[int, str]] = {
+            site: (i, rank) for i, (site, rank) in enumerate(ranks.items())
+        }
+
+    @classmethod
+    def from_json(cls, path: str) -> "DomainRanks":
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def __len__(self) -> int:
+        return len(self._ranks)
+
+    def __contains__(self, site: str) -> bool:
+        return site in self._ranks
+
+    def __getitem__(self, site: str) -> str:
+        return self._ranks[site][1]
+
+    def find(self, hostname: str) -> Optional[str]:
+        best = None
+        suffix = hostname
+        while True:
+            entry = self._ranks.get(suffix)
+            if entry is not None and (best is None or entry[0] < self._ranks[best][0]):
+                best = suffix
+            dot = suffix.find(".")
+            if dot == -1:
+                return best
+            suffix = suffix[dot + 1:]
+
+    def annotate(self, hostname: str) -> str:
+        site = self.find(hostname)
+        if site is None:
+            return hostname
+        return f"{hostname} {self[site]}"
+
+
+@lru_cache(maxsize=None)
+def world_ranks() -> DomainRanks:
+    """Load the bundled rankings the first time they're needed."""
+    return DomainRanks.from_json(WORLD_RANKS_PATH)
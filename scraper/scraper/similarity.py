@@ -0,0 +1,200 @@
+from functools import lru_cache
+import re
+from typing import TYPE_CHECKING, List, Sequence, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Reports are compared by MinHash: each signature holds NUM_HASHES minimums
+# of hashed word shingles, and two signatures agree in any one position
+# with probability equal to the Jaccard similarity of the reports'
+# shingles. Bump SIGNATURE_VERSION whenever anything here changes what a
+# signature holds, so that caches compute theirs again.
+SIGNATURE_VERSION = 1
+NUM_HASHES = 64
+SHINGLE_SIZE = 3
+
+# Locality-sensitive hashing splits signatures into BANDS bands of
+# NUM_HASHES // BANDS hashes. Reports that match on a whole band share a
+# bucket; with 16 bands of 4, pairs at THRESHOLD similarity meet in some
+# bucket 64% of the time, and pairs at 0.7 almost always do.
+BANDS = 16
+THRESHOLD = 0.5
+
+# Markdown field labels and HTML comments and <details> blocks are the
+# webcompat.com report template, the same in every report. Links mostly
+# differ only in the path, which says little about what broke.
+TEMPLATE_RE = re.compile(
+    r"<(?:!--.*?--|details>.*?</details)>|\*\*[^*\n]+\*\*|https?://\S+", re.DOTALL)
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Words are hashed as polynomials in WORD_BASE, modulo 2**64, over at most
+# their first MAX_WORD_BYTES bytes
+WORD_BASE = 0x100000001B3
+MAX_WORD_BYTES = 32
+SHINGLE_BASE = 0x9E3779B97F4A7C15
+
+
+def tokens(text: str) -> List[str]:
+    """Split a report into lowercase words, without the template or links.
+
+    shingle_hashes() splits texts the same way, in bulk.
+    """
+    return TOKEN_RE.findall(TEMPLATE_RE.sub(" ", text).lower())
+
+
+def _coefficients() -> Tuple["np.ndarray", "np.ndarray"]:
+    import numpy as np
+
+    # Fixed seed: signatures stored by one run are compared by the next
+    words = np.random.RandomState(1).randint(
+        0, 2**32, size=(4, NUM_HASHES), dtype=np.int64).astype(np.uint64)
+    multipliers = (words[0] << np.uint64(32)) | words[1] | np.uint64(1)
+    offsets = (words[2] << np.uint64(32)) | words[3]
+    return multipliers, offsets
+
+
+@lru_cache(maxsize=None)
+def _byte_tables() -> Tuple["np.ndarray", "np.ndarray"]:
+    """Return (each byte lowercased, whether each byte is a letter or digit)."""
+    import numpy as np
+
+    lowercase = np.arange(256, dtype=np.uint8)
+    lowercase[ord("A"):ord("Z") + 1] += 32
+    word = np.zeros(256, dtype=bool)
+    for first, last in ("az", "09"):
+        word[ord(first):ord(last) + 1] = True
+    return lowercase, word
+
+
+def _words(texts: Sequence[str]) -> Tuple["np.ndarray", "np.ndarray"]:
+    """Return (hash, index into texts) for every word in texts, in order.
+
+    The texts are joined into one byte array, where words are runs of
+    ASCII letters and digits. Words are hashed a byte position at a time,
+    longest first, so each step only touches the words that are still
+    going; the work grows with the total length of the words.
+    """
+    import numpy as np
+
+    encoded = [TEMPLATE_RE.sub(" ", text).encode("utf-8") + b" " for text in texts]
+    lowercase, word_bytes = _byte_tables()
+    data = lowercase[np.frombuffer(b"".join(encoded), dtype=np.uint8)]
+    edges = np.diff(word_bytes[data].astype(np.int8), prepend=0, append=0)
+    starts = np.flatnonzero(edges == 1)
+    lengths = np.flatnonzero(edges == -1) - starts
+
+    order = np.argsort(-lengths, kind="stable")
+    longest_first = lengths[order]
+    hashes = np.zeros(len(starts), dtype=np.uint64)
+    for offset in range(min(longest_first[:1].sum(), MAX_WORD_BYTES)):
+        going = np.searchsorted(-longest_first, -offset, side="left")
+        hashes[:going] = (
+            hashes[:going] * np.uint64(WORD_BASE) + data[starts[order[:going]] + offset])
+    # Longer words are told apart by their length as well as their first bytes
+    hashes = hashes * np.uint64(WORD_BASE) + longest_first.astype(np.uint64)
+    in_order = np.empty_like(hashes)
+    in_order[order] = hashes
+
+    text_ends = np.cumsum([len(text) for text in encoded])
+    return in_order, np.searchsorted(text_ends, starts, side="right")
+
+
+def shingle_hashes(texts: Sequence[str]) -> Tuple["np.ndarray", "np.ndarray"]:
+    """Return (hash, index into texts) for every shingle in texts.
+
+    Texts shorter than SHINGLE_SIZE words are one shingle; texts with no
+    words have none.
+    """
+    import numpy as np
+
+    words, text = _words(texts)
+    lengths = np.bincount(text, minlength=len(texts))
+    ends = np.cumsum(lengths)[text]
+    position = np.arange(len(words))
+    hashes = np.zeros(len(words), dtype=np.uint64)
+    for offset in range(SHINGLE_SIZE):
+        index = position + offset
+        hashes = hashes * np.uint64(SHINGLE_BASE) + np.where(
+            index < ends, words[np.minimum(index, len(words) - 1)], np.uint64(0))
+    starts = (ends - lengths[text]) == position
+    keep = (position + SHINGLE_SIZE <= ends) | (starts & (lengths[text] < SHINGLE_SIZE))
+    return hashes[keep], text[keep]
+
+
+def signatures(texts: Sequence[str]) -> Tuple["np.ndarray", "np.ndarray"]:
+    """Return (MinHash signatures as uint32 rows, whether each text had any words)."""
+    import numpy as np
+
+    hashes, text = shingle_hashes(texts)
+    result = np.full((len(texts), NUM_HASHES), 0xFFFFFFFF, dtype=np.uint32)
+    if not len(hashes):
+        return result, np.zeros(len(texts), dtype=bool)
+    # Shingles come grouped by text, so each text's minimum is one reduceat
+    boundaries = np.flatnonzero(np.r_[True, text[1:] != text[:-1]])
+    present = text[boundaries]
+    multipliers, offsets = _coefficients()
+    for k in range(NUM_HASHES):
+        # Multiply-shift hashing; uint64 arithmetic wraps
+        values = ((hashes * multipliers[k] + offsets[k]) >> np.uint64(32)).astype(np.uint32)
+        result[present, k] = np.minimum.reduceat(values, boundaries)
+    has_words = np.zeros(len(texts), dtype=bool)
+    has_words[present] = True
+    return result, has_words
+
+
+def _components(n: int, first: "np.ndarray", second: "np.ndarray") -> "np.ndarray":
+    # Label propagation with pointer jumping: every label is the index of a
+    # node no greater than itself, so labels[labels] stays in the component.
+    import numpy as np
+
+    labels = np.arange(n)
+    while True:
+        before = labels
+        lowest = np.minimum(labels[first], labels[second])
+        labels = labels.copy()
+        np.minimum.at(labels, first, lowest)
+        np.minimum.at(labels, second, lowest)
+        labels = labels[labels]
+        if np.array_equal(labels, before):
+            return labels
+
+
+def find_clusters(
+        keys: "np.ndarray",
+        signatures: "np.ndarray",
+        threshold: float = THRESHOLD) -> "np.ndarray":
+    """Label each signature with the lowest index in its cluster.
+
+    Only signatures with equal keys (hostname codes, say) are clustered.
+    For each band, signatures are sorted by a hash of their key and band,
+    and each one is compared with the first in its bucket, so the work
+    grows with the number of signatures rather than pairs of them.
+    Clusters are the connected components of the pairs whose estimated
+    similarity reaches threshold.
+    """
+    import numpy as np
+
+    n = len(keys)
+    rows = NUM_HASHES // BANDS
+    multipliers, _ = _coefficients()
+    keys = np.asarray(keys).astype(np.uint64)
+    first, second = [], []
+    for band in range(BANDS):
+        bucket = keys * multipliers[0]
+        for j in range(band * rows, (band + 1) * rows):
+            bucket = (bucket ^ signatures[:, j].astype(np.uint64)) * multipliers[j % rows + 1]
+        order = np.argsort(bucket, kind="stable")
+        starts = np.r_[True, bucket[order][1:] != bucket[order][:-1]]
+        leader = order[np.flatnonzero(starts)][np.cumsum(starts) - 1]
+        paired = leader != order
+        first.append(leader[paired])
+        second.append(order[paired])
+    first, second = np.concatenate(first), np.concatenate(second)
+    if len(first):
+        pairs = np.unique(first * n + second)
+        first, second = pairs // n, pairs % n
+        agreement = (signatures[first] == signatures[second]).mean(axis=1)
+        similar = (keys[first] == keys[second]) & (agreement >= threshold)
+        first, second = first[similar], second[similar]
+    return _components(n, first, second)
@@ -0,0 +1,208 @@
+import json
+import os
+import shutil
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+import click
+
+from .cache import BugzillaCache, GithubCache
+from .dump import concat_issues, load_issues, merge_issues, see_also_join_table
+from .output import write_atomic
+from .timing import Timer
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import pyarrow as pa
+
+# A snapshot directory holds
+#
+#   issues/month=YYYY-MM/part-0.arrow   the load_issues() frame, by creation month
+#   bugzilla.arrow                      the see-also Bugzilla bugs
+#   see_also.arrow                      the Bugzilla <-> webcompat join table
+#   snapshot.json                       which cache versions the files were built from
+#
+# The files are uncompressed Arrow IPC, so they can be memory-mapped, and the
+# issues directory reads as a hive-partitioned dataset:
+#
+#   pyarrow.dataset.dataset("snapshot/issues", format="ipc", partitioning="hive")
+#
+# pyarrow is an optional dependency (pip install webcompat_scraper[arrow]) and
+# is only imported when a snapshot is written or read.
+
+MANIFEST = "snapshot.json"
+FORMAT = 4
+NO_MONTH = "unknown"
+CATEGORICAL = ["repo", "state", "hostname", "site"]
+
+
+def _jsonable(value: Any) -> Any:
+    # Cache versions are tuples; compare them the way they read back from JSON
+    return json.loads(json.dumps(value))
+
+
+def read_manifest(directory: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get("format") == FORMAT else None
+
+
+def write_frame(path: str, frame: "pd.DataFrame") -> None:
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    # pandas gives each categorical the narrowest index type its categories
+    # fit, but partitions read together must unify into one dictionary
+    schema = pa.schema([
+        field.with_type(pa.dictionary(pa.int32(), field.type.value_type))
+        if pa.types.is_dictionary(field.type) else field
+        for field in table.schema
+    ], metadata=table.schema.metadata)
+    table = table.cast(schema)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with pa.OSFile(tmp, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp, path)
+
+
+def read_table(path: str) -> "pa.Table":
+    import pyarrow as pa
+
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+def read_frame(path: str) -> "pd.DataFrame":
+    return read_table(path).to_pandas()
+
+
+def months(issues: "pd.DataFrame") -> "pd.Series":
+    return issues.created_at.dt.strftime("%Y-%m").fillna(NO_MONTH)
+
+
+def partition_path(directory: str, month: str) -> str:
+    return os.path.join(directory, "issues", "month=" + month, "part-0.arrow")
+
+
+def read_issues(directory: str, only: Optional[List[str]] = None) -> "pd.DataFrame":
+    """Read back the issue frame, or just the partitions for the months in only.
+
+    The partitions are joined as Arrow tables and converted to pandas once;
+    converting each one and concatenating the frames is several times slower.
+    """
+    import pyarrow as pa
+
+    manifest = read_manifest(directory)
+    if manifest is None:
+        raise ValueError("%s is not a snapshot directory" % directory)
+    tables = [
+        read_table(partition_path(directory, month))
+        for month in manifest["months"]
+        if only is None or month in only
+    ]
+    if not tables:
+        return concat_issues([])
+    issues = pa.concat_tables(tables).unify_dictionaries().combine_chunks().to_pandas()
+    # Match load_issues(), whose categories are sorted
+    for column in CATEGORICAL:
+        categories = issues[column].cat.categories
+        issues[column] = issues[column].cat.reorder_categories(sorted(categories))
+    return issues
+
+
+def read_bugzilla(directory: str) -> "pd.DataFrame":
+    return read_frame(os.path.join(directory, "bugzilla.arrow")).set_index("id")
+
+
+def read_see_also(directory: str) -> "pd.DataFrame":
+    return read_frame(os.path.join(directory, "see_also.arrow"))
+
+
+def _write_issues(directory: str, issues: "pd.DataFrame") -> List[str]:
+    written = []
+    for month, frame in issues.groupby(months(issues), sort=True):
+        # Each partition's dictionaries should only hold the values it uses
+        frame = frame.reset_index(drop=True)
+        for column in CATEGORICAL:
+            frame[column] = frame[column].cat.remove_unused_categories()
+        write_frame(partition_path(directory, month), frame)
+        written.append(month)
+    return written
+
+
+def export(
+        cache: GithubCache,
+        bugzilla_cache: BugzillaCache,
+        directory: str,
+        timer: Optional[Timer] = None) -> Dict[str, Any]:
+    """Bring the snapshot in directory up to date with the caches; return its manifest.
+
+    After the first export, only the months holding issues written to the
+    cache since the last one are rewritten. An issue's creation month never changes, so
+    each changed issue replaces its old row in exactly one partition.
+    """
+    import pandas as pd
+
+    timer = timer or Timer()
+    manifest = read_manifest(directory)
+    issues_version = _jsonable(cache.version())
+    bugzilla_version = _jsonable(bugzilla_cache.version())
+    _, synced = issues_version
+
+    if manifest is None:
+        with timer.stage("export_issues") as span:
+            shutil.rmtree(os.path.join(directory, "issues"), ignore_errors=True)
+            issues = load_issues(cache)
+            all_months = _write_issues(directory, issues)
+            span.rows = len(issues)
+    elif manifest["issues_version"] != issues_version:
+        with timer.stage("export_issues") as span:
+            changed = load_issues(cache, synced_after=manifest["synced_through"])
+            touched = sorted(set(months(changed)))
+            existing = [month for month in touched if month in manifest["months"]]
+            merged = merge_issues(read_issues(directory, existing), changed)
+            _write_issues(directory, merged)
+            all_months = sorted(set(manifest["months"]) | set(touched))
+            span.rows = len(changed)
+    else:
+        all_months = manifest["months"]
+
+    if manifest is None or manifest["bugzilla_version"] != bugzilla_version:
+        with timer.stage("export_bugzilla") as span:
+            bz = pd.DataFrame(bugzilla_cache.bugs("see_also"))
+            write_frame(os.path.join(directory, "bugzilla.arrow"), bz)
+            write_frame(
+                os.path.join(directory, "see_also.arrow"),
+                see_also_join_table(bz.set_index("id")).reset_index(drop=True))
+            span.rows = len(bz)
+
+    manifest = {
+        "format": FORMAT,
+        "issues_version": issues_version,
+        "bugzilla_version": bugzilla_version,
+        "synced_through": synced,
+        "months": all_months,
+    }
+    write_atomic(
+        os.path.join(directory, MANIFEST),
+        json.dumps(manifest, indent=2).encode("utf-8"))
+    return manifest
+
+
+@click.command()
+@click.argument("cache", required=False)
+@click.argument("directory", required=False)
+def cli(cache, directory):
+    """Export the cached issues and Bugzilla bugs as Arrow files in DIRECTORY."""
+    cache_path = cache or "issues.db"
+    manifest = export(
+        GithubCache(cache_path, None), BugzillaCache(cache_path), directory or "snapshot")
+    click.echo("Snapshot covers %d months" % len(manifest["months"]))
+
+
+if __name__ == "__main__":
+    cli()
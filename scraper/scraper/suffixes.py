@@ -0,0 +1,76 @@
+from functools import lru_cache
+import os
+from typing import Iterable, Optional
+
+PUBLIC_SUFFIX_LIST_PATH = os.path.join(os.path.dirname(__file__), "public_suffix_list.dat")
+
+
+class PublicSuffixList:
+    """Resolves hostnames to their registrable domain (eTLD+1).
+
+    Rules follow https://publicsuffix.org/list/: a plain rule names a public
+    suffix, "*." matches any one label in its place, and "!" marks an
+    exception to a wildcard. Hostnames that match no rule are treated as
+    having their last label as the public suffix. Like DomainRanks, a lookup
+    walks the hostname's label suffixes against sets, so it costs O(labels).
+    """
+
+    def __init__(self, rules: Iterable[str]) -> None:
+        self.rules = set()
+        self.wildcards = set()
+        self.exceptions = set()
+        for rule in rules:
+            if rule.startswith("!"):
+                self.exceptions.add(rule[1:])
+            elif rule.startswith("*."):
+                self.wildcards.add(rule[2:])
+            else:
+                self.rules.add(rule)
+
+    @classmethod
+    def from_file(cls, path: str) -> "PublicSuffixList":
+        with open(path, encoding="utf-8") as f:
+            return cls(
+                line.split()[0] for line in f
+                if line.strip() and not line.startswith("//"))
+
+    def public_suffix_labels(self, labels) -> int:
+        """Return how many of labels, counted from the right, are the public suffix."""
+        for i in range(len(labels)):
+            suffix = ".".join(labels[i:])
+            if suffix in self.exceptions:
+                return len(labels) - i - 1
+            if suffix in self.rules:
+                return len(labels) - i
+            if i + 1 < len(labels) and ".".join(labels[i + 1:]) in self.wildcards:
+                return len(labels) - i
+        return 1
+
+    def registrable_domain(self, hostname: str) -> Optional[str]:
+        """Return hostname's eTLD+1, or None if hostname is itself a public suffix."""
+        labels = hostname.lower().rstrip(".").split(".")
+        if "" in labels:
+            return None
+        n = self.public_suffix_labels(labels) + 1
+        if n > len(labels):
+            return None
+        return ".".join(labels[-n:])
+
+
+@lru_cache(maxsize=None)
+def public_suffixes() -> PublicSuffixList:
+    """Load the bundled Public Suffix List the first time it's needed."""
+    return PublicSuffixList.from_file(PUBLIC_SUFFIX_LIST_PATH)
+
+
+@lru_cache(maxsize=None)
+def site_of(hostname: str) -> str:
+    """Group hostname with the others under the same registrable domain.
+
+    IP addresses, public suffixes and anything else without a registrable
+    domain are kept as they are. Results are memoized, since the same
+    hostnames come up on every load.
+    """
+    if hostname.replace(".", "").isdigit() or ":" in hostname:
+        return hostname
+    return public_suffixes().registrable_domain(hostname) or hostname
@@ -39,6 +39,7 @@ class WebcompatIssue:
     created_at: str = attr.ib(default=(datetime.now() - timedelta(days=1)).isoformat())
     closed_at: Optional[str] = attr.ib(default=None)
     state: str = attr.ib(default="open")
+    updated_at: str = attr.ib(default=datetime.now().isoformat())
 
     @classmethod
     def for_url(cls, url, **kwargs):
@@ -81,6 +82,70 @@ def generate_webcompat():
     return [attr.asdict(issue) for issue in issues]
 
 
+PARTNER_TAGS = ["google", "youtube", "facebook", "twitter", "amazon", "wikipedia", "yandex"]
+
+
+def _random_time(rng, start=datetime(2016, 1, 1)):
+    span = int((datetime.now() - start).total_seconds())
+    return start + timedelta(seconds=rng.randrange(span))
+
+
+def generate_webcompat_at_scale(n, seed=0):
+    """n issues spread over n // 20 hostnames, created since 2016, half of them closed."""
+    rng = random.Random(seed)
+    hostnames = ["site%d.example" % i for i in range(max(1, n // 20))]
+    issues = []
+    for number in range(1, n + 1):
+        created = _random_time(rng)
+        closed = None
+        if rng.random() < 0.5:
+            closed = (created + timedelta(days=rng.randrange(365))).isoformat()
+        issues.append(WebcompatIssue.for_url(
+            "https://%s/page/%d" % (rng.choice(hostnames), number),
+            number=number,
+            created_at=created.isoformat(),
+            closed_at=closed,
+            state="closed" if closed else "open",
+        ))
+    return [attr.asdict(issue) for issue in issues]
+
+
+def generate_bugzilla_at_scale(n, webcompat_numbers, seed=0):
+    """n Bugzilla bugs, each linking one to three of webcompat_numbers."""
+    rng = random.Random(seed)
+    statuses = ["NEW", "ASSIGNED", "UNCONFIRMED", "RESOLVED", "VERIFIED"]
+    rows = [
+        BugzillaRow.dupe_of(
+            rng.sample(webcompat_numbers, rng.randint(1, 3)),
+            id=i,
+            status=rng.choice(statuses),
+        )
+        for i in range(1, n + 1)
+    ]
+    return {"bugs": [attr.asdict(row) for row in rows]}
+
+
+def generate_platform_rel_at_scale(n, seed=0):
+    """n platform-rel bugs tagged for one or two partners, most of them resolved."""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(1, n + 1):
+        created = _random_time(rng)
+        resolved = None
+        if rng.random() < 0.7:
+            resolved = (created + timedelta(days=rng.randrange(400))).isoformat()
+        tags = rng.sample(PARTNER_TAGS, rng.randint(1, 2))
+        rows.append(BugzillaRow(
+            id=i,
+            creation_time=created.isoformat(),
+            cf_last_resolved=resolved,
+            resolution="FIXED" if resolved else "",
+            whiteboard=" ".join("[platform-rel-%s]" % tag for tag in tags),
+            keywords=["regression"] if rng.random() < 0.1 else [],
+        ))
+    return {"bugs": [attr.asdict(row) for row in rows]}
+
+
 def main():
     with open("bugzilla.json", "w") as f:
         json.dump(generate_bugzilla(), f)
@@ -0,0 +1,137 @@
+import datetime as dt
+import json
+import urllib.request
+
+import attr
+import pytest
+
+import generate_fixtures
+from scraper.api import DashboardAPI, ResponseCache, serve
+from scraper.cache import BugzillaCache, GithubCache
+
+
+def issue(number, url, created_at, state="open"):
+    return dict(
+        attr.asdict(generate_fixtures.WebcompatIssue.for_url(
+            url, number=number, state=state, created_at=created_at)),
+        updated_at=created_at)
+
+
+@pytest.fixture
+def api(tmp_path):
+    path = str(tmp_path / "issues.db")
+    cache = GithubCache(path, None)
+    cache._store([
+        issue(1, "https://a.example/", "2018-01-01T10:00:00Z"),
+        issue(2, "https://a.example/", "2018-01-02T10:00:00Z"),
+        issue(3, "https://a.example/", "2018-01-03T10:00:00Z", state="closed"),
+        issue(4, "https://b.example/", "2018-01-03T12:00:00Z"),
+        issue(5, "https://b.example/", "2018-01-05T10:00:00Z"),
+        issue(6, "https://c.example/", "2018-01-05T12:00:00Z"),
+    ])
+    bugzilla = BugzillaCache(path)
+    with bugzilla.db:
+        for bug in generate_fixtures.generate_platform_rel()["bugs"]:
+            bugzilla.db.execute(
+                "INSERT INTO bugzilla_bugs VALUES ('partner_rel', ?, ?, ?)",
+                (bug["id"], bug["last_change_time"], json.dumps(bug)))
+    return DashboardAPI(path)
+
+
+def get(api, url):
+    status, body = api.get(url)
+    return status, json.loads(body)
+
+
+class TestResponseCache:
+    def test_lru_and_ttl(self, monkeypatch):
+        now = [0.0]
+        monkeypatch.setattr("scraper.api.time.monotonic", lambda: now[0])
+        cache = ResponseCache(maxsize=2, ttl=10)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        assert cache.get("a") == 1
+        cache.put("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        now[0] = 11
+        assert cache.get("a") is None
+
+
+class TestDashboardAPI:
+    def test_hostnames(self, api):
+        assert get(api, "/hostnames/open?limit=2") == (200, {"a.example": 2, "b.example": 2})
+        assert get(api, "/hostnames/created?since=2018-01-02T12:00:00&until=2018-01-05T11:00") == (
+            200, {"a.example": 1, "b.example": 2})
+        assert get(api, "/hostnames/created?since=2018-01-03&until=2018-01-03T11:00") == (
+            200, {"a.example": 1})
+        assert get(api, "/hostnames/a.example?since=2018-01-02") == (
+            200, {"hostname": "a.example", "open": 2,
+                  "created": [["2018-01-02", 1], ["2018-01-03", 1]]})
+
+    def test_times_with_offsets(self, api):
+        url = "/hostnames/created?since=2018-01-01&until=2018-01-04T00:00:00%2B00:00"
+        assert get(api, url) == (200, {"a.example": 3, "b.example": 1})
+        # 2018-01-03T12:00 UTC, so issue 4 is just in
+        url = "/hostnames/created?since=2018-01-03T07:00-05:00&until=2018-01-04T01:00%2B01:00"
+        assert get(api, url) == (200, {"b.example": 1})
+        # 2018-01-02T11:00 UTC, just after issue 2
+        assert get(api, "/hostnames/a.example?since=2018-01-02T09:00:00-02:00") == (
+            200, {"hostname": "a.example", "open": 2, "created": [["2018-01-03", 1]]})
+
+    def test_created_matches_scan(self, api):
+        # Whatever mix of whole and partial days, counts match a plain scan
+        created = [(row["hostname"], row["created_at"]) for row in api.cache.issues()]
+        times = [dt.datetime(2018, 1, 1) + dt.timedelta(hours=7 * i) for i in range(20)]
+        for since in times:
+            for until in times:
+                if until <= since:
+                    continue
+                expected = {}
+                for hostname, created_at in created:
+                    if since.isoformat() <= created_at < until.isoformat():
+                        expected[hostname] = expected.get(hostname, 0) + 1
+                assert dict(api.cache.created_hostname_counts(since, 10, until)) == expected
+
+    def test_partners(self, api):
+        status, partners = get(api, "/partners")
+        assert status == 200 and partners
+        partner = next(iter(partners))
+        status, series = get(api, "/partners/%s?since=2016-01-01&until=2016-01-11" % partner)
+        assert len(series["dates_x"]) == len(series["open_bugs_y"]) == 10
+        assert get(api, "/partners/nonexistent.example")[0] == 404
+
+    def test_errors(self, api):
+        assert get(api, "/nothing")[0] == 404
+        assert get(api, "/hostnames/created")[0] == 400
+        assert get(api, "/hostnames/created?since=yesterday")[0] == 400
+
+    def test_invalidated_on_update(self, api):
+        writer = GithubCache(api.path, None)
+        api.watch(writer)
+        assert get(api, "/hostnames/open")[1]["c.example"] == 1
+        for listener in writer.listeners:
+            listener()
+        assert len(api.responses._entries) == 0
+
+    def test_sees_writes_from_elsewhere(self, api):
+        # As when the API runs on its own, beside a separate sync
+        writer = GithubCache(api.path, None)
+        assert get(api, "/hostnames/open")[1]["c.example"] == 1
+        writer._store([issue(6, "https://c.example/", "2018-01-05T12:00:00Z", state="closed")])
+        assert "c.example" not in get(api, "/hostnames/open")[1]
+        bugzilla = BugzillaCache(api.path)
+        partners = get(api, "/partners")[1]
+        with bugzilla.db:
+            bugzilla.db.execute("DELETE FROM bugzilla_bugs WHERE query = 'partner_rel'")
+        assert get(api, "/partners")[1] != partners
+
+    def test_serves_http(self, api):
+        server = serve(api, port=0)
+        try:
+            url = "http://127.0.0.1:%d/hostnames/open" % server.server_address[1]
+            with urllib.request.urlopen(url) as response:
+                assert json.load(response)["a.example"] == 2
+        finally:
+            server.shutdown()
+            server.server_close()
@@ -0,0 +1,67 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+from typing import Dict, List
+from urllib.parse import parse_qs, urlparse
+
+import attr
+import pytest
+
+import generate_fixtures
+from scraper.bugzilla import BugzillaClient
+
+
+class StubBugzilla(BaseHTTPRequestHandler):
+    bugs = [attr.asdict(generate_fixtures.BugzillaRow(id=i)) for i in range(1, 26)]
+    requests: List[Dict[str, str]] = []
+    failures = 0
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        type(self).requests.append(params)
+        if type(self).failures > 0:
+            type(self).failures -= 1
+            self.send_error(503)
+            return
+        if params.get("count_only"):
+            payload = {"bug_count": len(self.bugs)}
+        else:
+            offset, limit = int(params["offset"]), int(params["limit"])
+            payload = {"bugs": self.bugs[offset:offset + limit]}
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def bugzilla_url():
+    StubBugzilla.requests = []
+    StubBugzilla.failures = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubBugzilla)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:%d/rest" % server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+class TestBugzillaClient:
+    def test_search_paginates(self, bugzilla_url):
+        client = BugzillaClient(bugzilla_url, page_size=10, backoff_factor=0)
+        bugs = client.search({"status_whiteboard": "[platform-rel"})
+        assert [bug["id"] for bug in bugs] == list(range(1, 26))
+        pages = [r for r in StubBugzilla.requests if "offset" in r]
+        assert sorted(int(r["offset"]) for r in pages) == [0, 10, 20]
+        assert all(r["status_whiteboard"] == "[platform-rel" for r in StubBugzilla.requests)
+
+    def test_search_retries(self, bugzilla_url):
+        StubBugzilla.failures = 2
+        client = BugzillaClient(bugzilla_url, page_size=100, backoff_factor=0)
+        assert len(client.search({})) == 25
@@ -0,0 +1,197 @@
+import json
+import sqlite3
+
+import attr
+from click.testing import CliRunner
+import pytest
+
+import generate_fixtures
+from scraper import compact, similarity
+from scraper.cache import DEFAULT_REPO, BugzillaCache, GithubCache, aggregate_sql
+
+
+def write_legacy_db(path, issues):
+    db = sqlite3.connect(path)
+    with db:
+        db.execute("CREATE TABLE issues (number INTEGER PRIMARY KEY, updated TEXT, content TEXT)")
+        db.executemany(
+            "INSERT INTO issues VALUES (?, ?, ?)",
+            ((issue["number"], issue["created_at"], json.dumps(issue)) for issue in issues))
+    db.close()
+
+
+class FakeBugzillaClient:
+    def __init__(self, bugs):
+        self.bugs = bugs
+        self.searches = []
+
+    def search(self, params):
+        self.searches.append(params)
+        since = params.get("last_change_time")
+        return [bug for bug in self.bugs if not since or bug["last_change_time"] >= since]
+
+
+class TestGithubCache:
+    def test_migrates_legacy_database(self, tmp_path):
+        path = str(tmp_path / "issues.db")
+        issues = generate_fixtures.generate_webcompat()
+        write_legacy_db(path, issues)
+
+        cache = GithubCache(path, None)
+        rows = cache.issues()
+        assert len(rows) == len(issues)
+        hostnames = {row["hostname"] for row in rows}
+        assert hostnames == {"example.com", "old.example", "recent.example"}
+        assert {row["state"] for row in rows} == {"open"}
+
+        indexes = {row[1] for row in cache.db.execute("PRAGMA index_list(issues)")}
+        assert {"issues_state", "issues_created_at"} <= indexes
+
+    def test_migrates_single_repo_database(self, tmp_path):
+        path = str(tmp_path / "issues.db")
+        issues = generate_fixtures.generate_webcompat()
+        write_legacy_db(path, issues)
+        # Parsed columns, sync state and aggregates keyed on hostname alone
+        GithubCache(path, None).db.close()
+        db = sqlite3.connect(path)
+        with db:
+            db.execute("DROP TABLE issues")
+            db.execute("""
+                CREATE TABLE issues (
+                    number INTEGER PRIMARY KEY, updated TEXT, content TEXT, created_at TEXT,
+                    closed_at TEXT, state TEXT, url TEXT, hostname TEXT)
+                """)
+            db.execute("DROP TABLE open_hostnames")
+            db.execute("DROP TABLE created_days")
+            for statement in aggregate_sql(
+                    "open_hostnames", ["hostname"], ["{row}.hostname"], "{row}.state = 'open'"):
+                db.execute(statement)
+            db.execute("INSERT INTO sync_state VALUES ('since', '2018-01-01T00:00:00+00:00')")
+            db.execute("INSERT INTO sync_state VALUES ('backfill_done', '1')")
+        db.close()
+        write_legacy_db(path + ".old", issues)
+        legacy = GithubCache(path + ".old", None)
+        db = sqlite3.connect(path)
+        with db:
+            db.executemany(
+                "INSERT INTO issues VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (tuple(row)[1:] for row in legacy.db.execute(
+                    "SELECT repo, number, updated, content, created_at, closed_at, state, url, "
+                    "hostname FROM issues")))
+        db.close()
+
+        cache = GithubCache(path, None)
+        assert {row["repo"] for row in cache.issues()} == {DEFAULT_REPO}
+        assert len(cache.issues()) == len(issues)
+        assert cache._repo_state(DEFAULT_REPO, "since") == "2018-01-01T00:00:00+00:00"
+        assert cache._repo_state(DEFAULT_REPO, "backfill_done") == "1"
+        assert cache._state("since") is None
+        assert cache.open_hostname_counts(10) == legacy.open_hostname_counts(10)
+        assert cache.open_hostname_counts(10, DEFAULT_REPO) == legacy.open_hostname_counts(10)
+        assert cache.open_hostname_counts(10, "mozilla/other-bugs") == []
+        assert cache.content(issues[0]["number"])["number"] == issues[0]["number"]
+
+    def test_compact(self, tmp_path):
+        path = str(tmp_path / "issues.db")
+        issues = generate_fixtures.generate_webcompat()
+        for issue in issues:
+            issue["user"] = {"login": "someone", "avatar_url": "https://example.com/" + "x" * 500}
+            issue["labels"] = [{"name": "browser-firefox"}]
+        write_legacy_db(path, issues)
+        cache = GithubCache(path, None)
+        before = [tuple(row) for row in cache.issues()]
+
+        result = CliRunner().invoke(compact.cli, ["--keep", "labels", path])
+        assert result.exit_code == 0, result.output
+
+        cache = GithubCache(path, None)
+        assert [tuple(row) for row in cache.issues()] == before
+        content = cache.content(issues[0]["number"])
+        assert "user" not in content
+        assert content["labels"] == [{"name": "browser-firefox"}]
+        assert content["body"] == issues[0]["body"]
+
+        issue = dict(issues[0], number=1, updated_at="2018-01-01T00:00:00Z")
+        cache._store([issue])
+        assert "user" not in cache.content(1)
+
+    def test_reads_while_writing(self, tmp_path):
+        path = str(tmp_path / "issues.db")
+        issues = [dict(issue, updated_at="2018-01-01T00:00:00Z")
+                  for issue in generate_fixtures.generate_webcompat()]
+        writer = GithubCache(path, None, mmap_size=2**20)
+        writer._store(issues[1:])
+        assert writer.db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert writer.db.execute("PRAGMA mmap_size").fetchone()[0] == 2**20
+
+        reader = GithubCache(path, None, read_only=True)
+        assert reader.version()[0] == len(issues) - 1
+        with writer.db:
+            writer.db.execute("BEGIN IMMEDIATE")
+            writer.db.execute("DELETE FROM issues")
+            # The reader sees the last commit instead of waiting on the lock
+            assert reader.version()[0] == len(issues) - 1
+            assert len(reader.issues()) == len(issues) - 1
+            writer.db.rollback()
+        writer._store(issues[:1])
+        assert reader.version()[0] == len(issues)
+
+        with pytest.raises(sqlite3.OperationalError):
+            reader._store(issues[:1])
+        BugzillaCache(path, FakeBugzillaClient([])).update()
+        assert BugzillaCache(path, read_only=True).populated()
+
+    def test_updates_signatures(self, tmp_path):
+        cache = GithubCache(str(tmp_path / "issues.db"), None)
+        issues = [
+            dict(issue, title="Video %d doesn't play" % issue["number"],
+                 updated_at="2018-01-01T00:00:00Z")
+            for issue in generate_fixtures.generate_webcompat()
+        ]
+        issues[0]["title"] = ""
+        issues[1]["state"] = "closed"
+        cache._store(issues)
+        assert cache.update_signatures(batch_size=2) == len(issues) - 1
+        assert cache.update_signatures() == 0
+        signed = cache.open_signatures()
+        assert {number for _, number, _, _ in signed} == {
+            issue["number"] for issue in issues[2:]}
+        assert all(len(signature) == 4 * similarity.NUM_HASHES for *_, signature in signed)
+
+        changed = dict(issues[2], body="Something else", updated_at="2018-02-01T00:00:00Z")
+        cache._store([changed])
+        assert cache.update_signatures() == 1
+        assert cache.open_signatures() != signed
+
+        cache.db.execute("UPDATE sync_state SET value = '0' WHERE key = 'signature_version'")
+        assert cache.update_signatures() == len(issues) - 1
+
+
+class TestBugzillaCache:
+    def test_incremental_update(self, tmp_path):
+        path = str(tmp_path / "issues.db")
+        old = attr.asdict(generate_fixtures.BugzillaRow(id=1, last_change_time="2018-01-01"))
+        new = attr.asdict(generate_fixtures.BugzillaRow(id=2, last_change_time="2018-06-01"))
+        client = FakeBugzillaClient([old, new])
+        cache = BugzillaCache(path, client)
+        assert not cache.populated()
+
+        cache.update()
+        assert cache.populated()
+        assert [bug["id"] for bug in cache.bugs("see_also")] == [1, 2]
+        assert all("last_change_time" not in params for params in client.searches)
+
+        client.searches = []
+        client.bugs[0] = dict(old, summary="Changed", last_change_time="2018-07-01")
+        cache.update()
+        changed = [params for params in client.searches if params.get("include_fields") != ["id"]]
+        assert len(changed) == 2
+        assert all(params["last_change_time"] == "2018-06-01" for params in changed)
+        assert cache.bugs("see_also")[0]["summary"] == "Changed"
+        assert [bug["id"] for bug in cache.bugs("partner_rel")] == [1, 2]
+
+        # Bug 2 stops matching the searches without changing again
+        del client.bugs[1]
+        cache.update()
+        assert [bug["id"] for bug in cache.bugs("see_also")] == [1]
+        assert [bug["id"] for bug in cache.bugs("partner_rel")] == [1]
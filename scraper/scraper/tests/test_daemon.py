@@ -0,0 +1,95 @@
+import json
+import threading
+
+import attr
+import pandas as pd
+
+import generate_fixtures
+from scraper.cache import BugzillaCache, GithubCache
+from scraper.daemon import Dashboard
+from scraper.dump import dump, load_issues
+
+
+class FakeBugzillaClient:
+    def __init__(self, bugs):
+        self.bugs = bugs
+
+    def search(self, params):
+        if params.get("f1") == "see_also":
+            return self.bugs
+        return generate_fixtures.generate_platform_rel()["bugs"]
+
+
+def issue(number, url, state="open", updated_at="2018-01-01T00:00:00Z"):
+    return dict(
+        attr.asdict(generate_fixtures.WebcompatIssue.for_url(url, number=number, state=state)),
+        updated_at=updated_at)
+
+
+def make_dashboard(tmp_path):
+    path = str(tmp_path / "issues.db")
+    cache = GithubCache(path, None)
+    cache._store([issue(n, "https://example.com/%d" % n) for n in range(1, 11)])
+    see_also = [attr.asdict(generate_fixtures.BugzillaRow.dupe_of([1, 2, 3]))]
+    bugzilla_cache = BugzillaCache(path, FakeBugzillaClient(see_also))
+    bugzilla_cache.update()
+    return Dashboard(cache, bugzilla_cache, str(tmp_path / "webcompat.json"))
+
+
+class TestDashboard:
+    def test_regenerates_only_on_change(self, tmp_path):
+        dashboard = make_dashboard(tmp_path)
+        assert dashboard.regenerate()
+        with open(dashboard.output) as f:
+            assert json.load(f)["open"] == {"example.com": 10}
+        assert not dashboard.regenerate()
+
+        dashboard.cache._store([
+            issue(2, "https://example.com/2", state="closed", updated_at="2018-02-01T00:00:00Z"),
+            issue(11, "https://other.example/", updated_at="2018-02-01T00:00:00Z"),
+        ])
+        assert dashboard.regenerate()
+        with open(dashboard.output) as f:
+            assert json.load(f)["open"] == {"example.com": 9, "other.example": 1}
+
+    def test_keeps_issues_current(self, tmp_path):
+        dashboard = make_dashboard(tmp_path)
+        dashboard.regenerate()
+        dashboard.cache._store([
+            issue(5, "https://moved.example/", updated_at="2018-03-01T00:00:00Z"),
+            issue(12, "https://new.example/", updated_at="2018-03-01T00:00:00Z"),
+        ])
+        dashboard.load()
+        pd.testing.assert_frame_equal(dashboard.issues, load_issues(dashboard.cache))
+
+        expected = dump(dashboard.cache, dashboard.bugzilla_cache)
+        dashboard.regenerate()
+        with open(dashboard.output) as f:
+            written = json.load(f)
+        del expected["last_updated"], written["last_updated"]
+        assert written == expected
+
+    def test_loads_issues_synced_late(self, tmp_path):
+        # A second repository, or a resumed backfill, writes issues last
+        # updated long before the ones already loaded
+        dashboard = make_dashboard(tmp_path)
+        dashboard.cache._store(
+            [issue(11, "https://new.example/", updated_at="2018-03-01T00:00:00Z")])
+        dashboard.regenerate()
+        dashboard.cache._store(
+            [issue(1, "https://b.example/", updated_at="2017-06-01T00:00:00Z")],
+            "mozilla/other-bugs")
+        assert dashboard.regenerate()
+        with open(dashboard.output) as f:
+            assert json.load(f)["open"] == {
+                "example.com": 10, "new.example": 1, "b.example": 1}
+        assert len(dashboard.issues) == 12
+
+    def test_run_stops(self, tmp_path, monkeypatch):
+        dashboard = make_dashboard(tmp_path)
+        monkeypatch.setattr(dashboard.cache, "update", lambda timer=None: None)
+        stop = threading.Event()
+        stop.set()
+        dashboard.run(60, stop)
+        with open(dashboard.output) as f:
+            assert json.load(f)["open"] == {"example.com": 10}
@@ -1,21 +1,32 @@
+import datetime as dt
+import json
+import subprocess
+import sys
+
+import attr
 import pandas as pd
 import pytest
 
 import generate_fixtures
+from scraper.cache import DEFAULT_REPO, GithubCache, parse_issue
 import scraper.dump as dump
+from scraper.timing import Timer
 
 
 class FakeCache:
     def __init__(self):
-        self._issues = generate_fixtures.generate_webcompat()
-        for field in ("body", "created_at", "closed_at", "state"):
-            for issue in self._issues:
-                if issue[field] is None:
-                    continue
-                issue[field] = issue[field].encode("utf-8")
+        self._issues = []
+        for issue in generate_fixtures.generate_webcompat():
+            created_at, closed_at, state, url, hostname = parse_issue(issue)
+            self._issues.append(
+                (DEFAULT_REPO, issue["number"], created_at, closed_at, state, hostname))
+
+    def issue_chunks(self, size, synced_after=None):
+        for i in range(0, len(self._issues), size):
+            yield self._issues[i:i + size]
 
-    def issues(self):
-        return self._issues
+    def open_signatures(self):
+        return []
 
 
 @pytest.fixture
@@ -23,11 +34,30 @@ def issue_cache():
     return FakeCache()
 
 
+@pytest.fixture
+def sqlite_cache(tmp_path):
+    cache = GithubCache(str(tmp_path / "issues.db"), None)
+    issues = generate_fixtures.generate_webcompat()
+    issues.append(generate_fixtures.WebcompatIssue.for_url(
+        "https://www.example.com/closed", state="closed"))
+    issues = [attr.asdict(issue) if not isinstance(issue, dict) else issue for issue in issues]
+    for issue in issues:
+        issue["updated_at"] = "2018-01-01T00:00:00Z"
+    cache._store(issues)
+    return cache
+
+
 class TestDump:
     def test_loads_issues(self, issue_cache):
         issues = dump.load_issues(issue_cache)
         assert type(issues) == pd.DataFrame
         assert "example.com" in issues.hostname.values
+        assert issues.hostname.dtype == "category"
+
+    def test_loads_issues_in_chunks(self, issue_cache):
+        whole = dump.load_issues(issue_cache)
+        chunked = dump.load_issues(issue_cache, chunk_size=3)
+        pd.testing.assert_frame_equal(whole, chunked)
 
     def test_dump(self, monkeypatch, issue_cache):
         def bugzilla_stub():
@@ -39,12 +69,258 @@ class TestDump:
         monkeypatch.delattr("requests.sessions.Session.request")
         monkeypatch.setattr(dump, "fetch_bugzilla_webcompat_bugs", bugzilla_stub)
         monkeypatch.setattr(dump, "fetch_bugzilla_partner_rel_bugs", partner_rel_stub)
-        result = dump.dump(issue_cache)
+        timer = Timer()
+        result = dump.dump(issue_cache, timer=timer)
+        stages = {span.name: span for span in timer.spans}
+        assert stages["load_issues"].rows == 21
+        assert "open_bugs_series" in stages
         assert "recent.example" in result["last30"].keys()
         assert "old.example" not in result["last30"].keys()
         assert "recent.example" in result["open"].keys()
         assert "old.example" in result["open"].keys()
 
+    def test_incremental_dump(self, monkeypatch, sqlite_cache):
+        numbers = [row["number"] for row in sqlite_cache.issues() if row["state"] == "open"]
+        see_also = [
+            attr.asdict(generate_fixtures.BugzillaRow.dupe_of(numbers[:5])),
+            attr.asdict(generate_fixtures.BugzillaRow.dupe_of(numbers[-3:])),
+        ]
+        monkeypatch.setattr(dump, "fetch_bugzilla_webcompat_bugs", lambda: see_also)
+        monkeypatch.setattr(
+            dump, "fetch_bugzilla_partner_rel_bugs",
+            lambda: generate_fixtures.generate_platform_rel()["bugs"])
+
+        def compare():
+            full = dump.dump(sqlite_cache)
+            incremental = dump.dump(sqlite_cache, incremental=True)
+            del full["last_updated"], incremental["last_updated"]
+            assert full == incremental
+            return incremental
+
+        compare()
+        changed = [
+            dict(attr.asdict(generate_fixtures.WebcompatIssue.for_url(
+                "https://recent.example/", number=number, state="closed")),
+                updated_at="2018-02-01T00:00:00Z")
+            for number in numbers[:4]
+        ]
+        sqlite_cache._store(changed)
+        result = compare()
+        assert sum(result["open"].values()) == 17
+
+    def test_dump_by_repo(self, monkeypatch, sqlite_cache):
+        monkeypatch.setattr(
+            dump, "fetch_bugzilla_webcompat_bugs",
+            lambda: [attr.asdict(generate_fixtures.BugzillaRow.dupe_of([1, 2]))])
+        monkeypatch.setattr(
+            dump, "fetch_bugzilla_partner_rel_bugs",
+            lambda: generate_fixtures.generate_platform_rel()["bugs"])
+        # Same numbers as the default repository's issues, in another repository
+        other = [
+            dict(attr.asdict(generate_fixtures.WebcompatIssue.for_url(
+                "https://other.example/", number=number)),
+                updated_at="2018-01-01T00:00:00Z")
+            for number in range(1, 4)
+        ]
+        sqlite_cache._store(other, "mozilla/other-bugs")
+
+        full = dump.dump(sqlite_cache)
+        incremental = dump.dump(sqlite_cache, incremental=True)
+        del full["last_updated"], incremental["last_updated"]
+        assert full == incremental
+        assert list(full["by_repo"]) == ["mozilla/other-bugs", DEFAULT_REPO]
+        assert full["by_repo"]["mozilla/other-bugs"]["open"] == {"other.example": 3}
+        assert "other.example" not in full["by_repo"][DEFAULT_REPO]["open"]
+        assert full["open"]["other.example"] == 3
+        assert sum(full["open"].values()) == sum(
+            sum(counts["open"].values()) for counts in full["by_repo"].values())
+
+    def test_groups_sites(self, monkeypatch, sqlite_cache):
+        see_also = [attr.asdict(generate_fixtures.BugzillaRow.dupe_of([11]))]
+        monkeypatch.setattr(dump, "fetch_bugzilla_webcompat_bugs", lambda: see_also)
+        monkeypatch.setattr(
+            dump, "fetch_bugzilla_partner_rel_bugs",
+            lambda: generate_fixtures.generate_platform_rel()["bugs"])
+        sqlite_cache._store([
+            dict(attr.asdict(generate_fixtures.WebcompatIssue.for_url(url, number=number)),
+                 updated_at="2018-01-01T00:00:00Z")
+            for number, url in enumerate(
+                ["https://m.example.com/", "https://mobile.example.com/a", "http://localhost/"])
+        ])
+        issues = dump.load_issues(sqlite_cache)
+        assert issues.site.dtype == "category"
+        assert set(issues[issues.hostname == "m.example.com"].site) == {"example.com"}
+
+        for by in ("site", "hostname"):
+            full = dump.dump(sqlite_cache, by=by)
+            incremental = dump.dump(sqlite_cache, incremental=True, by=by)
+            del full["last_updated"], incremental["last_updated"]
+            assert full == incremental
+            if by == "site":
+                n_example = (issues.state == "open") & (issues.site == "example.com")
+                assert full["open"]["example.com"] == n_example.sum()
+                assert "m.example.com" not in full["open"]
+            else:
+                assert full["open"]["m.example.com"] == 1
+
+    def test_windows(self, tmp_path):
+        cache = GithubCache(str(tmp_path / "issues.db"), None)
+        today = dt.date.today()
+        issues = []
+        for number in range(1, 301):
+            created = today - dt.timedelta(days=number % 120)
+            url = "https://%s.example%d.com/" % ("m" if number % 2 else "www", number % 7)
+            issue = attr.asdict(generate_fixtures.WebcompatIssue.for_url(
+                url, number=number, created_at=created.isoformat() + "T12:00:00Z"))
+            issues.append(dict(issue, updated_at="2018-01-01T00:00:00Z"))
+        cache._store(issues, "webcompat/web-bugs")
+        cache._store(issues[:50], "mozilla/other-bugs")
+        frame = dump.load_issues(cache)
+
+        full = dump.created_windows(frame, today, weeks=20)
+        incremental = dump.cached_windows(
+            cache, today, cache.repositories(), weeks=20)
+        assert full == incremental
+        top, by_repo, history = full
+
+        age = (pd.Timestamp(today) - frame.created_at.dt.normalize()).dt.days
+        for days in dump.WINDOWS:
+            expected = frame[age < days].site.value_counts()
+            assert top["last%d" % days] == {
+                site: n for site, n in expected.items() if n > 0}
+        expected = frame[(age < 7) & (frame.repo == "mozilla/other-bugs")].site.value_counts()
+        assert by_repo["mozilla/other-bugs"]["last7"] == {
+            site: n for site, n in expected.items() if n > 0}
+        assert len(history["weeks"]) == 20
+        assert history["weeks"][-1] == (today - dt.timedelta(days=6)).isoformat()
+        assert set(history["counts"]) == set(top["last90"])
+        for site, counts in history["counts"].items():
+            assert counts[-1] == ((age < 7) & (frame.site == site)).sum()
+            assert sum(counts) == ((age < 140) & (frame.site == site)).sum()
+
+    def test_ties_at_cutoff(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(
+            dump, "fetch_bugzilla_webcompat_bugs",
+            lambda: [attr.asdict(generate_fixtures.BugzillaRow.dupe_of([1]))])
+        monkeypatch.setattr(
+            dump, "fetch_bugzilla_partner_rel_bugs",
+            lambda: generate_fixtures.generate_platform_rel()["bugs"])
+        cache = GithubCache(str(tmp_path / "issues.db"), None)
+        created = dt.datetime.now(dt.timezone.utc) - dt.timedelta(hours=1)
+        # One issue for each of 30 sites, stored in the reverse of name order
+        issues = [
+            dict(attr.asdict(generate_fixtures.WebcompatIssue.for_url(
+                "https://site%02d.example/" % (30 - number), number=number,
+                created_at=created.strftime("%Y-%m-%dT%H:%M:%SZ"))),
+                updated_at="2018-01-01T00:00:00Z")
+            for number in range(1, 31)
+        ]
+        cache._store(issues, "webcompat/web-bugs")
+        cache._store(issues[:15], "mozilla/other-bugs")
+
+        full = dump.dump(cache)
+        incremental = dump.dump(cache, incremental=True)
+        del full["last_updated"], incremental["last_updated"]
+        assert json.dumps(full) == json.dumps(incremental)
+        # Sites tied with the last one kept are cut by name
+        assert list(full["last30"]) == ["site%02d.example" % n for n in range(15, 25)]
+        assert list(full["windows"]["last7"]) == list(full["last30"])
+
+    def test_windows_count_in_utc(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(
+            dump, "fetch_bugzilla_webcompat_bugs",
+            lambda: [attr.asdict(generate_fixtures.BugzillaRow.dupe_of([11]))])
+        monkeypatch.setattr(
+            dump, "fetch_bugzilla_partner_rel_bugs",
+            lambda: generate_fixtures.generate_platform_rel()["bugs"])
+        utc_now = dt.datetime.now(dt.timezone.utc)
+
+        class WestOfUTC(dt.datetime):
+            # A host whose local date is still the day before the UTC date
+            @classmethod
+            def now(cls, tz=None):
+                if tz is not None:
+                    return utc_now.astimezone(tz)
+                return (utc_now - dt.timedelta(days=1)).replace(tzinfo=None)
+
+        cache = GithubCache(str(tmp_path / "issues.db"), None)
+        created = (utc_now - dt.timedelta(minutes=5)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        cache._store([dict(
+            attr.asdict(generate_fixtures.WebcompatIssue.for_url(
+                "https://new.example/", number=1, created_at=created)),
+            updated_at="2018-01-01T00:00:00Z")])
+
+        monkeypatch.setattr(dump.dt, "datetime", WestOfUTC)
+        # Local "today" is a day behind the issue's UTC creation date ...
+        today = WestOfUTC.now().date()
+        assert dump.created_windows(dump.load_issues(cache), today)[0]["last7"] == {}
+        # ... but dump() counts days in UTC
+        for incremental in (False, True):
+            result = dump.dump(cache, incremental=incremental)
+            assert result["windows"]["last7"] == {"new.example": 1}
+            assert result["last30"] == {"new.example": 1}
+
+    def test_duplicate_clusters(self, monkeypatch, tmp_path):
+        see_also = [attr.asdict(generate_fixtures.BugzillaRow.dupe_of([11]))]
+        monkeypatch.setattr(dump, "fetch_bugzilla_webcompat_bugs", lambda: see_also)
+        monkeypatch.setattr(
+            dump, "fetch_bugzilla_partner_rel_bugs",
+            lambda: generate_fixtures.generate_platform_rel()["bugs"])
+        cache = GithubCache(str(tmp_path / "issues.db"), None)
+        report = "The video player stays black and the play button does nothing after the ad"
+        other = "Login form rejects valid passwords when the remember me box is ticked"
+        bodies = {
+            1: ("https://www.example.com/a", report),
+            2: ("https://m.example.com/b", report + " again"),
+            3: ("https://www.example.com/c", report),
+            4: ("https://www.example.com/d", other),
+            5: ("https://www.example.com/e", other),
+            6: ("https://other.example.net/", report),
+            7: ("https://www.example.com/f", report),
+        }
+        issues = []
+        for number, (url, description) in bodies.items():
+            issue = attr.asdict(generate_fixtures.WebcompatIssue.for_url(
+                url, number=number, state="closed" if number == 7 else "open"))
+            issue["body"] += "**Description**: %s\n" % description
+            issues.append(dict(issue, updated_at="2018-01-01T00:00:00Z"))
+        cache._store(issues)
+        cache.update_signatures()
+
+        result = dump.dump(cache)
+        assert result["clusters"] == {
+            "example.com": [
+                {"size": 3, "issues": [
+                    "webcompat/web-bugs#1", "webcompat/web-bugs#2", "webcompat/web-bugs#3"]},
+                {"size": 2, "issues": ["webcompat/web-bugs#4", "webcompat/web-bugs#5"]},
+            ],
+        }
+        assert dump.dump(cache, incremental=True)["clusters"] == result["clusters"]
+        by_hostname = dump.dump(cache, by="hostname")["clusters"]
+        # m.example.com's report is on its own
+        assert [cluster["issues"] for cluster in by_hostname["example.com"]] == [
+            ["webcompat/web-bugs#1", "webcompat/web-bugs#3"],
+            ["webcompat/web-bugs#4", "webcompat/web-bugs#5"],
+        ]
+
+    def test_merge_issues_by_repo(self, sqlite_cache):
+        issues = dump.load_issues(sqlite_cache)
+        _, synced = sqlite_cache.version()
+        number = int(issues.number[0])
+        sqlite_cache._store([
+            dict(attr.asdict(generate_fixtures.WebcompatIssue.for_url(
+                "https://other.example/", number=number, state="closed")),
+                updated_at="2018-02-01T00:00:00Z")
+        ], "mozilla/other-bugs")
+        changed = dump.load_issues(sqlite_cache, synced_after=synced)
+        assert len(changed) == 1
+        merged = dump.merge_issues(issues, changed)
+        assert len(merged) == len(issues) + 1
+        # The default repository's issue with the same number is kept
+        same_number = merged[merged.number == number]
+        assert same_number.repo.tolist() == ["mozilla/other-bugs", DEFAULT_REPO]
+        assert same_number.hostname.tolist()[0] == "other.example"
+
     def test_sort_partner_rel_bugs(self):
         bugs = [
             {"id": 1, "whiteboard": "[platform-rel-google] [platform-rel-youtube]"},
@@ -56,3 +332,84 @@ class TestDump:
         assert "google.com" not in sorted.keys()
         assert "facebook.com" in sorted.keys()
         assert len(sorted.keys()) == 2
+
+    def test_open_bugs_series(self):
+        def bug(created, resolved):
+            return {"creation_time": created, "cf_last_resolved": resolved}
+
+        by_partner = {
+            "google.com": [
+                bug("2016-01-03T23:00:00Z", "2016-01-05T01:00:00Z"),
+                bug("2015-12-01T00:00:00Z", None),
+                bug("2015-01-01T00:00:00Z", "2015-02-01T00:00:00Z"),
+                bug("2016-01-09T00:00:00Z", ""),
+                bug("2017-01-01T00:00:00Z", None),
+            ],
+            "youtube.com": [
+                bug("2016-01-10T00:00:00Z", "2016-01-10T00:00:00Z"),
+            ],
+        }
+        dates_x = [dt.date(2016, 1, 1) + dt.timedelta(days=i) for i in range(10)]
+        series = dump.open_bugs_series(by_partner, dates_x)
+        assert series["google.com"] == [1, 1, 2, 2, 2, 1, 1, 1, 2, 2]
+        assert series["youtube.com"] == [0] * 9 + [1]
+
+    def test_partner_tag_index(self):
+        index = dump.PartnerTagIndex({
+            "a.example": dump.PlatformRelSpec(["a", "shared"]),
+            "b.example": dump.PlatformRelSpec(include=["b", "shared"], exclude=["a"]),
+        })
+        assert index.partners_for(["platform-rel-shared"]) == ["a.example", "b.example"]
+        assert index.partners_for(["platform-rel-a", "platform-rel-b"]) == ["a.example"]
+        assert index.partners_for(["platform-rel-c"]) == []
+        bugs = [{"id": 1, "whiteboard": "[platform-rel-B]"}]
+        assert dump.sort_partner_rel_bugs(bugs, index) == {"b.example": bugs}
+
+    def test_see_also_join_table(self):
+        bz = pd.DataFrame([
+            {"id": 1, "see_also": [
+                "https://webcompat.com/issues/1234",
+                "https://github.com/webcompat/web-bugs/issues/1234",
+                "https://bugs.chromium.org/p/chromium/issues/detail?id=99",
+            ]},
+            {"id": 2, "see_also": []},
+            {"id": 3, "see_also": ["https://webcompat.com/", "https://webcompat.com/issues/56"]},
+        ]).set_index("id")
+        join_table = dump.see_also_join_table(bz)
+        assert join_table.values.tolist() == [[1, 1234], [3, 56]]
+
+    def test_cli_imports_are_light(self):
+        # --help and cache refreshes shouldn't pay for pandas
+        code = (
+            "import sys\n"
+            "from click.testing import CliRunner\n"
+            "import scraper.dump\n"
+            "CliRunner().invoke(scraper.dump.cli, ['--help'])\n"
+            "print(' '.join(sorted(sys.modules)))\n")
+        output = subprocess.run(
+            [sys.executable, "-c", code], stdout=subprocess.PIPE, check=True,
+            universal_newlines=True).stdout
+        assert not {"pandas", "numpy", "github3", "dateutil"} & set(output.split())
+
+    def test_refresh_only_imports_are_light(self, tmp_path):
+        # A refresh stores reports that would need signing, but only the summary signs them
+        issues = [
+            dict(attr.asdict(issue) if not isinstance(issue, dict) else issue,
+                 updated_at="2018-01-01T00:00:00Z")
+            for issue in generate_fixtures.generate_webcompat()]
+        code = (
+            "import json, sys\n"
+            "from click.testing import CliRunner\n"
+            "import scraper.cache, scraper.dump\n"
+            "issues = json.loads(sys.argv[1])\n"
+            "scraper.dump.github_login = lambda token: None\n"
+            "scraper.cache.GithubCache._sync = lambda self, repo, start: iter([(issues, {})])\n"
+            "scraper.cache.BugzillaCache.update = lambda self, full=False: None\n"
+            "result = CliRunner().invoke(scraper.dump.cli, ['--refresh-only', sys.argv[2]])\n"
+            "assert result.exit_code == 0, result.output\n"
+            "assert scraper.cache.GithubCache(sys.argv[2], None).version()[0] == len(issues)\n"
+            "print(' '.join(sorted(sys.modules)))\n")
+        output = subprocess.run(
+            [sys.executable, "-c", code, json.dumps(issues), str(tmp_path / "issues.db")],
+            stdout=subprocess.PIPE, check=True, universal_newlines=True).stdout
+        assert not {"pandas", "numpy", "pyarrow"} & set(output.split())
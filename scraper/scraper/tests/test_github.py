@@ -0,0 +1,187 @@
+import datetime as dt
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Set
+from urllib.parse import parse_qs, urlparse
+
+import attr
+import pytest
+import requests
+
+import generate_fixtures
+from scraper.cache import DEFAULT_REPO, GithubCache
+from scraper.github import GithubClient
+
+
+def make_issue(number, updated_at="2018-01-01T00:00:00Z"):
+    issue = attr.asdict(generate_fixtures.WebcompatIssue.for_url(
+        "https://example.com/%d" % number, number=number))
+    issue["updated_at"] = updated_at
+    return issue
+
+
+class FakeGithub(BaseHTTPRequestHandler):
+    issues: List[Dict[str, Any]] = []
+    # Issues for repositories other than webcompat/web-bugs, by URL path
+    other_issues: Dict[str, Optional[List[Dict[str, Any]]]] = {}
+    requests: List[Dict[str, str]] = []
+    fail_pages: Set[int] = set()
+    rate_limit = (5000, 0)
+    # Called with each request's parameters once its page is chosen
+    after_page: Optional[Callable[[Dict[str, str]], None]] = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        FakeGithub.requests.append(params)
+        page, per_page = int(params["page"]), int(params["per_page"])
+        if page in FakeGithub.fail_pages:
+            FakeGithub.fail_pages.discard(page)
+            self.send_error(500)
+            return
+
+        issues = FakeGithub.other_issues.get(url.path, FakeGithub.issues)
+        if issues is None:
+            self.send_error(404)
+            return
+        if "since" in params:
+            issues = [i for i in issues if i["updated_at"] >= params["since"]]
+        key = "updated_at" if params.get("sort") == "updated" else "number"
+        issues = sorted(issues, key=lambda i: i[key])
+        last_page = max(1, -(-len(issues) // per_page))
+        body = json.dumps(issues[(page - 1) * per_page:page * per_page]).encode("utf-8")
+        if FakeGithub.after_page is not None:
+            FakeGithub.after_page(params)
+
+        self.send_response(200)
+        base = "http://%s:%d%s" % (*self.server.server_address, url.path)
+        self.send_header("Link", '<%s?page=%d&per_page=%d>; rel="last"' % (
+            base, last_page, per_page))
+        self.send_header("X-RateLimit-Remaining", str(FakeGithub.rate_limit[0]))
+        self.send_header("X-RateLimit-Reset", str(FakeGithub.rate_limit[1]))
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@attr.s
+class FakeSession:
+    session = attr.ib(factory=requests.Session)
+
+
+@pytest.fixture
+def github_url():
+    FakeGithub.issues = [make_issue(n) for n in range(1, 251)]
+    FakeGithub.other_issues = {}
+    FakeGithub.requests = []
+    FakeGithub.fail_pages = set()
+    FakeGithub.rate_limit = (5000, 0)
+    FakeGithub.after_page = None
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGithub)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:%d" % server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+class TestGithubSync:
+    def test_backfill_resumes(self, tmp_path, github_url):
+        path = str(tmp_path / "issues.db")
+        cache = GithubCache(path, FakeSession(), api_url=github_url, batch_size=100)
+        FakeGithub.fail_pages = {3}
+        with pytest.raises(requests.HTTPError):
+            cache.update()
+        assert len(cache.issues()) == 200
+
+        FakeGithub.requests = []
+        cache.update()
+        assert len(cache.issues()) == 250
+        backfill_pages = [int(r["page"]) for r in FakeGithub.requests if r["sort"] == "created"]
+        assert backfill_pages == [3]
+
+    def test_incremental_update(self, tmp_path, github_url):
+        path = str(tmp_path / "issues.db")
+        cache = GithubCache(path, FakeSession(), api_url=github_url)
+        cache.update()
+        tomorrow = (dt.datetime.utcnow() + dt.timedelta(days=1)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        changed = dict(make_issue(7, tomorrow), state="closed")
+        FakeGithub.issues[6] = changed
+
+        FakeGithub.requests = []
+        cache.update()
+        assert all(r["sort"] == "updated" for r in FakeGithub.requests)
+        states = {row["number"]: row["state"] for row in cache.issues()}
+        assert states[7] == "closed"
+        assert cache._repo_state(DEFAULT_REPO, "since") == tomorrow.replace("Z", "+00:00")
+
+    def test_syncs_several_repos(self, tmp_path, github_url):
+        FakeGithub.other_issues["/repos/mozilla/other-bugs/issues"] = [
+            make_issue(n) for n in range(1, 121)]
+        path = str(tmp_path / "issues.db")
+        cache = GithubCache(
+            path, FakeSession(), api_url=github_url, batch_size=100,
+            repos=[DEFAULT_REPO, "mozilla/other-bugs"])
+        assert cache.update() == {DEFAULT_REPO: 250, "mozilla/other-bugs": 120}
+        assert cache.repositories() == ["mozilla/other-bugs", DEFAULT_REPO]
+        counts = dict(cache.open_hostname_counts(1000, "mozilla/other-bugs"))
+        assert sum(counts.values()) == 120
+        assert sum(dict(cache.open_hostname_counts(1000)).values()) == 370
+        for repo in cache.repos:
+            assert cache._repo_state(repo, "backfill_done") == "1"
+
+        tomorrow = (dt.datetime.utcnow() + dt.timedelta(days=1)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        FakeGithub.other_issues["/repos/mozilla/other-bugs/issues"][0] = dict(
+            make_issue(1, tomorrow), state="closed")
+        assert cache.update() == {DEFAULT_REPO: 0, "mozilla/other-bugs": 1}
+        assert cache.content(1, "mozilla/other-bugs")["state"] == "closed"
+        assert cache.content(1)["state"] == "open"
+
+    def test_failed_repo_keeps_others(self, tmp_path, github_url):
+        FakeGithub.other_issues["/repos/mozilla/missing/issues"] = None
+        path = str(tmp_path / "issues.db")
+        cache = GithubCache(
+            path, FakeSession(), api_url=github_url, repos=["mozilla/missing", DEFAULT_REPO])
+        with pytest.raises(requests.HTTPError):
+            cache.update()
+        assert cache.repositories() == [DEFAULT_REPO]
+        assert len(cache.issues()) == 250
+
+
+class TestGithubClient:
+    def test_throttles_near_rate_limit(self, monkeypatch, github_url):
+        sleeps = []
+        monkeypatch.setattr("scraper.github.time.sleep", sleeps.append)
+        FakeGithub.rate_limit = (5, int(time.time()) + 60)
+        client = GithubClient(requests.Session(), "webcompat", "web-bugs", github_url)
+        client.page(1)
+        assert sleeps == []
+        client.page(2)
+        assert len(sleeps) == 1 and 50 < sleeps[0] <= 61
+
+    def test_updated_since_survives_updates(self, github_url):
+        FakeGithub.issues = [
+            make_issue(n, "2018-01-01T00:%02d:%02dZ" % divmod(n, 60)) for n in range(1, 251)]
+
+        def bump(params):
+            # Issue 50 changes after the first page is served, so every
+            # later issue moves up a place
+            if FakeGithub.issues[49]["updated_at"] < "2019":
+                FakeGithub.issues[49] = make_issue(50, "2019-01-01T00:00:00Z")
+        FakeGithub.after_page = bump
+
+        client = GithubClient(requests.Session(), "webcompat", "web-bugs", github_url)
+        seen = [issue["number"] for issue in client.updated_since("2018-01-01T00:00:00Z")]
+        assert seen == list(range(1, 251)) + [50]
+
+    def test_updated_since_pages_through_one_second(self, github_url):
+        FakeGithub.issues = [make_issue(n) for n in range(1, 251)]
+        client = GithubClient(requests.Session(), "webcompat", "web-bugs", github_url)
+        seen = [issue["number"] for issue in client.updated_since("2018-01-01T00:00:00Z")]
+        assert seen == list(range(1, 251))
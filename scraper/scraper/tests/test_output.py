@@ -0,0 +1,116 @@
+import datetime as dt
+import gzip
+import json
+import os
+
+from click.testing import CliRunner
+
+from scraper import daemon, dump
+from scraper.output import (
+    MANIFEST, compact_series, encode_counts, encode_dates, write_output, write_sharded)
+
+
+def decode_series(series):
+    # What site/index.html does with each encoding
+    if isinstance(series, list):
+        return series
+    if series["encoding"] == "range":
+        start = dt.date.fromisoformat(series["start"])
+        step = dt.timedelta(days=series["step_days"])
+        return [(start + i * step).isoformat() for i in range(series["length"])]
+    if series["encoding"] == "delta-rle":
+        counts = []
+        value = 0
+        runs = series["runs"]
+        for delta, repeat in zip(runs[::2], runs[1::2]):
+            for _ in range(repeat):
+                value += delta
+                counts.append(value)
+        return counts
+    raise ValueError("Unknown series encoding %r" % series["encoding"])
+
+
+def make_body(n_open=3):
+    return {
+        "last_updated": "2018-08-27T00:00:00",
+        "open": {"example.com": n_open},
+        "last30": {"example.com": 1},
+        "by_repo": {
+            "webcompat/web-bugs": {"open": {"example.com": n_open}, "last30": {"example.com": 1}},
+        },
+        "windows": {"last7": {"example.com": 1}, "last30": {"example.com": 1}},
+        "history": {"weeks": ["2018-08-21"], "counts": {"example.com": [1]}},
+        "clusters": {
+            "example.com": [{"size": 2, "issues": ["web-bugs#1", "web-bugs#2"]}],
+        },
+        "bugzilla": [],
+        "dates_x": ["2016-01-01", "2016-01-02"],
+        "by_partner": {
+            "google.com": {"summary": {"n_open": 1, "open_bugs_y": [0, 1]}, "regression_bugs": []},
+        },
+    }
+
+
+class TestWriteSharded:
+    def test_writes_manifest_and_shards(self, tmp_path):
+        manifest = write_sharded(make_body(), str(tmp_path))
+        with open(tmp_path / MANIFEST) as f:
+            assert json.load(f) == manifest
+        assert manifest["partners"] == ["google.com"]
+        assert set(manifest["files"]) == {
+            "domains", "trends", "clusters", "bugzilla", "dates_x", "partner-google.com"}
+
+        filename = manifest["files"]["partner-google.com"]
+        with open(tmp_path / filename) as f:
+            assert json.load(f)["summary"]["open_bugs_y"] == [0, 1]
+        with gzip.open(str(tmp_path / (filename + ".gz"))) as f:
+            assert json.load(f)["summary"]["n_open"] == 1
+
+    def test_names_follow_content(self, tmp_path):
+        first = write_sharded(make_body(3), str(tmp_path))
+        second = write_sharded(make_body(4), str(tmp_path))
+        assert first["files"]["dates_x"] == second["files"]["dates_x"]
+        assert first["files"]["domains"] != second["files"]["domains"]
+        # The previous generation survives one more write, then goes away
+        assert os.path.exists(tmp_path / first["files"]["domains"])
+        write_sharded(make_body(5), str(tmp_path))
+        assert not os.path.exists(tmp_path / first["files"]["domains"])
+        assert not os.path.exists(tmp_path / (first["files"]["domains"] + ".gz"))
+
+    def test_single_file_replaces_manifest(self, tmp_path):
+        write_output(make_body(), str(tmp_path), sharded=True)
+        write_output(make_body(4), str(tmp_path / "webcompat.json"))
+        assert not os.path.exists(tmp_path / MANIFEST)
+        with open(tmp_path / "webcompat.json") as f:
+            assert json.load(f)["open"] == {"example.com": 4}
+
+    def test_sharded_needs_output(self, tmp_path):
+        for cli in (dump.cli, daemon.cli):
+            result = CliRunner().invoke(cli, ["--sharded", str(tmp_path / "issues.db")])
+            assert result.exit_code == 2
+            assert "--sharded needs an OUTPUT directory" in result.output
+            assert not os.path.exists(tmp_path / "issues.db")
+
+
+class TestCompactSeries:
+    def test_counts_round_trip(self):
+        for counts in [[], [0], [5, 5, 5, 6, 6, 4, 4, 4, 4], [3, 2, 1, 0, 0, 0, 7]]:
+            assert decode_series(encode_counts(counts)) == counts
+        assert encode_counts([1, 1, 1, 1, 2])["runs"] == [1, 1, 0, 3, 1, 1]
+
+    def test_dates(self):
+        dates = ["2016-02-27", "2016-02-28", "2016-02-29", "2016-03-01"]
+        encoded = encode_dates(dates)
+        assert encoded == {"encoding": "range", "start": "2016-02-27", "step_days": 1, "length": 4}
+        assert decode_series(encoded) == dates
+        # Gaps can't be described by a range, so those are left alone
+        assert encode_dates(["2016-01-01", "2016-01-03"]) == ["2016-01-01", "2016-01-03"]
+
+    def test_compact_series(self):
+        body = make_body()
+        compact = compact_series(body)
+        assert body == make_body()
+        assert decode_series(compact["dates_x"]) == body["dates_x"]
+        summary = compact["by_partner"]["google.com"]["summary"]
+        assert decode_series(summary["open_bugs_y"]) == [0, 1]
+        assert summary["n_open"] == 1
@@ -0,0 +1,17 @@
+from scraper.ranks import DomainRanks
+
+
+class TestDomainRanks:
+    def test_find(self):
+        ranks = DomainRanks({"example.com": "#1", "co.uk": "#2", "bbc.co.uk": "#3"})
+        assert ranks.find("example.com") == "example.com"
+        assert ranks.find("m.example.com") == "example.com"
+        assert ranks.find("notexample.com") is None
+        assert ranks.find("localhost") is None
+        # The first-listed ranked suffix wins, like the linear scan it replaced
+        assert ranks.find("www.bbc.co.uk") == "co.uk"
+
+    def test_annotate(self):
+        ranks = DomainRanks({"example.com": "#1"})
+        assert ranks.annotate("mobile.example.com") == "mobile.example.com #1"
+        assert ranks.annotate("example.org") == "example.org"
@@ -0,0 +1,69 @@
+import random
+
+import numpy as np
+
+from scraper.similarity import NUM_HASHES, find_clusters, signatures, tokens
+
+
+def words(rng, n, vocabulary=5000):
+    return ["word%d" % rng.randrange(vocabulary) for _ in range(n)]
+
+
+def shingles(text):
+    t = tokens(text)
+    return {tuple(t[i:i + 3]) for i in range(len(t) - 2)}
+
+
+def jaccard(a, b):
+    a, b = shingles(a), shingles(b)
+    return len(a & b) / len(a | b)
+
+
+class TestSimilarity:
+    def test_tokens_skip_template(self):
+        body = (
+            "<!-- @browser: Firefox 62.0 -->\n"
+            "**URL**: https://www.example.com/watch?v=1\n\n"
+            "**Problem type**: Video doesn't play\n"
+            "<details><summary>Browser Configuration</summary>gfx.webrender: false</details>\n")
+        assert tokens(body) == ["video", "doesn", "t", "play"]
+
+    def test_signatures_estimate_similarity(self):
+        rng = random.Random(0)
+        base = words(rng, 200)
+        texts = [" ".join(base)]
+        for changed in (10, 40, 200):
+            text = list(base)
+            for i in rng.sample(range(len(text)), changed):
+                text[i] = "other%d" % i
+            texts.append(" ".join(text))
+        texts += ["", "**URL**: https://example.com/", "two words"]
+
+        computed, has_words = signatures(texts)
+        assert computed.shape == (len(texts), NUM_HASHES)
+        assert has_words.tolist() == [True] * 4 + [False, False, True]
+        for i in (1, 2, 3):
+            estimate = (computed[0] == computed[i]).mean()
+            assert abs(estimate - jaccard(texts[0], texts[i])) < 0.2
+        # Signatures don't depend on what else is in the batch
+        assert (signatures(texts[1:2])[0][0] == computed[1]).all()
+
+    def test_find_clusters(self):
+        rng = random.Random(1)
+        report = words(rng, 60)
+        texts = [" ".join(report)] * 3 + [" ".join(words(rng, 60)) for _ in range(3)]
+        # A chain: each copy differs from the last by a few words
+        chain = list(report)
+        for i in range(3):
+            chain[i * 20:i * 20 + 2] = ["changed%d" % i] * 2
+            texts.append(" ".join(chain))
+        computed, _ = signatures(texts)
+
+        keys = np.zeros(len(texts), dtype=int)
+        labels = find_clusters(keys, computed)
+        assert labels.tolist() == [0, 0, 0, 3, 4, 5, 0, 0, 0]
+
+        # Identical reports for different sites stay apart
+        keys[1] = 1
+        labels = find_clusters(keys, computed)
+        assert labels[1] == 1 and labels[2] == 0
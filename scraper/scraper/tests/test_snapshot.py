@@ -0,0 +1,120 @@
+import os
+
+import attr
+import pandas as pd
+import pytest
+
+import generate_fixtures
+from scraper.cache import BugzillaCache, GithubCache
+from scraper.dump import dump, load_issues
+from scraper.timing import Timer
+
+pytest.importorskip("pyarrow")
+from scraper import snapshot  # noqa: E402
+
+
+class FakeBugzillaClient:
+    def __init__(self, bugs):
+        self.bugs = bugs
+
+    def search(self, params):
+        if params.get("f1") == "see_also":
+            return self.bugs
+        return generate_fixtures.generate_platform_rel()["bugs"]
+
+
+def issue(number, created_at, state="open", updated_at="2018-01-01T00:00:00Z"):
+    return dict(
+        attr.asdict(generate_fixtures.WebcompatIssue.for_url(
+            "https://example%d.com/" % (number % 3), number=number, state=state,
+            created_at=created_at)),
+        updated_at=updated_at)
+
+
+@pytest.fixture
+def caches(tmp_path):
+    path = str(tmp_path / "issues.db")
+    cache = GithubCache(path, None)
+    cache._store([
+        issue(n, "2017-%02d-15T00:00:00Z" % (n % 4 + 1), updated_at="2017-12-%02dT00:00:00Z" % n)
+        for n in range(11, 31)
+    ])
+    see_also = [attr.asdict(generate_fixtures.BugzillaRow.dupe_of([11, 12, 13]))]
+    bugzilla_cache = BugzillaCache(path, FakeBugzillaClient(see_also))
+    bugzilla_cache.update()
+    return cache, bugzilla_cache
+
+
+def by_key(frame):
+    return frame.sort_values(["repo", "number"]).reset_index(drop=True)
+
+
+class TestSnapshot:
+    def test_roundtrip(self, tmp_path, caches):
+        cache, bugzilla_cache = caches
+        directory = str(tmp_path / "snapshot")
+        manifest = snapshot.export(cache, bugzilla_cache, directory)
+        assert manifest["months"] == ["2017-01", "2017-02", "2017-03", "2017-04"]
+        assert os.path.exists(os.path.join(directory, "issues", "month=2017-01", "part-0.arrow"))
+
+        pd.testing.assert_frame_equal(
+            by_key(snapshot.read_issues(directory)), by_key(load_issues(cache)))
+        assert sorted(snapshot.read_see_also(directory).webcompat_id) == [11, 12, 13]
+
+        from_cache = dump(cache, bugzilla_cache)
+        from_snapshot = dump(cache, bugzilla_cache, snapshot=directory)
+        del from_cache["last_updated"], from_snapshot["last_updated"]
+        assert from_snapshot == from_cache
+
+    def test_rewrites_only_changed_months(self, tmp_path, caches):
+        cache, bugzilla_cache = caches
+        directory = str(tmp_path / "snapshot")
+        snapshot.export(cache, bugzilla_cache, directory)
+        partition = snapshot.partition_path(directory, "2017-01")
+        mtime = os.stat(partition).st_mtime_ns
+
+        cache._store([
+            issue(14, "2017-03-15T00:00:00Z", state="closed", updated_at="2018-02-01T00:00:00Z"),
+            issue(31, "2017-06-15T00:00:00Z", updated_at="2018-02-01T00:00:00Z"),
+        ])
+        timer = Timer()
+        manifest = snapshot.export(cache, bugzilla_cache, directory, timer)
+        assert manifest["months"] == ["2017-01", "2017-02", "2017-03", "2017-04", "2017-06"]
+        assert os.stat(partition).st_mtime_ns == mtime
+        assert [span.name for span in timer.spans] == ["export_issues"]
+
+        pd.testing.assert_frame_equal(
+            by_key(snapshot.read_issues(directory)), by_key(load_issues(cache)))
+
+        timer = Timer()
+        snapshot.export(cache, bugzilla_cache, directory, timer)
+        assert timer.spans == []
+
+    def test_picks_up_issues_synced_late(self, tmp_path, caches):
+        cache, bugzilla_cache = caches
+        directory = str(tmp_path / "snapshot")
+        snapshot.export(cache, bugzilla_cache, directory)
+        # Last updated before everything already exported, but written after
+        cache._store(
+            [issue(1, "2017-02-15T00:00:00Z", updated_at="2017-01-01T00:00:00Z")],
+            "mozilla/other-bugs")
+        snapshot.export(cache, bugzilla_cache, directory)
+        pd.testing.assert_frame_equal(
+            by_key(snapshot.read_issues(directory)), by_key(load_issues(cache)))
+
+    def test_many_hostnames(self, tmp_path, caches):
+        # Each month alone has few enough hostnames for pandas to use int8
+        # dictionary indices, but not all of them together
+        cache, bugzilla_cache = caches
+        cache._store([
+            dict(attr.asdict(generate_fixtures.WebcompatIssue.for_url(
+                "https://site%d.example/" % n, number=n,
+                created_at="20%02d-%02d-15T00:00:00Z" % (10 + n // 120, n // 10 % 12 + 1))),
+                updated_at="2018-01-01T00:00:00Z")
+            for n in range(100, 400)
+        ])
+        directory = str(tmp_path / "snapshot")
+        snapshot.export(cache, bugzilla_cache, directory)
+        issues = snapshot.read_issues(directory)
+        assert issues.hostname.nunique() == 303
+        pd.testing.assert_frame_equal(by_key(issues), by_key(load_issues(cache)))
@@ -0,0 +1,48 @@
+import pytest
+
+from scraper.suffixes import PublicSuffixList, public_suffixes, site_of
+
+
+class TestPublicSuffixList:
+    @pytest.mark.parametrize("hostname,expected", [
+        # From the list's own test vectors
+        ("COM", None),
+        ("WwW.example.COM", "example.com"),
+        (".example.com", None),
+        ("example", None),
+        ("a.b.example.example", "example.example"),
+        ("uk.com", None),
+        ("a.b.example.uk.com", "example.uk.com"),
+        ("c.mm", None),
+        ("a.b.c.mm", "b.c.mm"),
+        ("ac.jp", None),
+        ("www.test.ac.jp", "test.ac.jp"),
+        ("a.b.ide.kyoto.jp", "b.ide.kyoto.jp"),
+        ("c.kobe.jp", None),
+        ("city.kobe.jp", "city.kobe.jp"),
+        ("www.city.kobe.jp", "city.kobe.jp"),
+        ("a.b.test.ck", "b.test.ck"),
+        ("www.ck", "www.ck"),
+        ("www.www.ck", "www.ck"),
+        ("foo.bar.co.uk", "bar.co.uk"),
+    ])
+    def test_registrable_domain(self, hostname, expected):
+        assert public_suffixes().registrable_domain(hostname) == expected
+
+    def test_rules(self):
+        psl = PublicSuffixList(["com", "*.example", "!keep.example"])
+        assert psl.registrable_domain("a.b.com") == "b.com"
+        assert psl.registrable_domain("a.b.c.example") == "b.c.example"
+        assert psl.registrable_domain("a.keep.example") == "keep.example"
+
+
+class TestSiteOf:
+    def test_groups_subdomains(self):
+        assert site_of("m.example.com") == site_of("mobile.example.com") == "example.com"
+        assert site_of("example.co.uk") == "example.co.uk"
+        assert site_of("someone.github.io") == "someone.github.io"
+
+    def test_keeps_what_it_cant_group(self):
+        assert site_of("127.0.0.1") == "127.0.0.1"
+        assert site_of("localhost") == "localhost"
+        assert site_of("None") == "None"
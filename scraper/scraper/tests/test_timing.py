@@ -0,0 +1,46 @@
+import pytest
+
+from scraper.timing import Timer, memory_mb, reset_peak
+
+
+class TestTimer:
+    def test_nested_stages(self):
+        timer = Timer()
+        with timer.stage("dump"):
+            with timer.stage("load_issues") as span:
+                span.rows = 3
+        report = timer.report()
+        assert [stage["name"] for stage in report["stages"]] == ["dump", "dump/load_issues"]
+        outer, inner = report["stages"]
+        assert inner["rows"] == 3
+        assert outer["seconds"] >= inner["seconds"]
+
+    @pytest.mark.skipif(
+        memory_mb() is None or not reset_peak(), reason="needs /proc memory accounting")
+    def test_memory_per_stage(self):
+        timer = Timer(track_peak=True)
+        with timer.stage("dump"):
+            with timer.stage("big"):
+                block = b"x" * 2**27
+                del block
+            with timer.stage("small"):
+                block = b"x" * 2**20
+                del block
+        outer, big, small = timer.report()["stages"]
+        # The block is freed before each stage ends, but its peak is kept
+        started_at = big["rss_mb"] - big["rss_delta_mb"]
+        assert big["peak_rss_mb"] - started_at >= 100
+        assert abs(big["rss_delta_mb"]) < 50
+        assert outer["peak_rss_mb"] >= big["peak_rss_mb"]
+        assert small["peak_rss_mb"] < big["peak_rss_mb"] - 100
+
+    @pytest.mark.skipif(memory_mb() is None, reason="needs /proc memory accounting")
+    def test_leaves_peak_alone(self):
+        block = b"x" * 2**27
+        del block
+        peak = memory_mb()[1]
+        timer = Timer()
+        with timer.stage("dump") as span:
+            pass
+        assert memory_mb()[1] >= peak
+        assert span.rss_mb is not None and span.peak_rss_mb is None
@@ -0,0 +1,108 @@
+import json
+import os
+
+from click.testing import CliRunner
+import pytest
+
+from scraper import topsites
+from scraper.ranks import WORLD_RANKS_PATH
+
+ALEXA_DIR = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, os.pardir, "alexa")
+
+SITE = """
+<aws:Site>
+  <aws:DataUrl>{domain}</aws:DataUrl>
+  <aws:Country>
+    <aws:Rank>{rank}</aws:Rank>
+    <aws:Reach><aws:PerMillion>{reach}</aws:PerMillion></aws:Reach>
+  </aws:Country>
+</aws:Site>"""
+
+
+def write_topsites(path, sites):
+    with open(path, "w") as f:
+        f.write(
+            '<aws:TopSitesResponse xmlns:aws="http://ats.amazonaws.com/doc/2005-10-05">'
+            '<aws:Response xmlns:aws="http://ats.amazonaws.com/doc/2005-07-11">'
+            "<aws:TopSitesResult><aws:Alexa><aws:TopSites><aws:Country><aws:Sites>")
+        for rank, (domain, reach) in enumerate(sites, 1):
+            f.write(SITE.format(domain=domain, rank=rank, reach=reach))
+        f.write("</aws:Sites></aws:Country></aws:TopSites></aws:Alexa>"
+                "</aws:TopSitesResult></aws:Response></aws:TopSitesResponse>")
+
+
+class TestTopsites:
+    def test_parse_country(self, tmp_path):
+        path = str(tmp_path / "usa.xml")
+        write_topsites(path, [("google.com", 800000), ("example.com", 10.5)])
+        assert topsites.parse_country(path) == [
+            ("google.com", 1, 800000.0), ("example.com", 2, 10.5)]
+
+    def test_parse_country_missing_field(self, tmp_path):
+        path = str(tmp_path / "usa.xml")
+        write_topsites(path, [("google.com", 800000), ("example.com", 10.5)])
+        with open(path) as f:
+            xml = f.read()
+        with open(path, "w") as f:
+            f.write(xml.replace("<aws:Rank>2</aws:Rank>", ""))
+        with pytest.raises(ValueError, match="usa.xml: site 2"):
+            topsites.parse_country(path)
+
+    def test_condense(self):
+        assert topsites.condense({
+            "china": [("baidu.com", 1, 500.0), ("google.com", 9, 1.0)],
+            "usa": [("google.com", 1, 800.0), ("baidu.com", 50, 1.0)],
+            "france": [("tied.example", 3, 287.0)],
+            "germany": [("tied.example", 4, 226.36619718309859)],
+        }) == {
+            "baidu.com": "🇨🇳 #1",
+            "google.com": "🇺🇸 #1",
+            "tied.example": "🇫🇷 #3",
+        }
+
+    def test_build_caches_parsed_files(self, tmp_path, monkeypatch):
+        write_topsites(str(tmp_path / "usa.xml"), [("google.com", 800000)])
+        write_topsites(str(tmp_path / "france.xml"), [("lemonde.fr", 300000)])
+        write_topsites(str(tmp_path / "unknown.xml"), [("ignored.example", 1)])
+        expected = {"lemonde.fr": "🇫🇷 #1", "google.com": "🇺🇸 #1"}
+        assert topsites.build(str(tmp_path)) == expected
+
+        parsed = []
+        parse_country = topsites.parse_country
+
+        def counting_parse(path):
+            parsed.append(os.path.basename(path))
+            return parse_country(path)
+
+        monkeypatch.setattr(topsites, "parse_country", counting_parse)
+        assert topsites.build(str(tmp_path)) == expected
+        # Touched but unchanged files are recognized by their hash
+        os.utime(str(tmp_path / "usa.xml"), ns=(0, 0))
+        assert topsites.build(str(tmp_path)) == expected
+        assert parsed == []
+
+        write_topsites(str(tmp_path / "usa.xml"), [("bing.com", 5), ("google.com", 800000)])
+        assert topsites.build(str(tmp_path)) == dict(expected, **{"bing.com": "🇺🇸 #1",
+                                                                  "google.com": "🇺🇸 #2"})
+        assert parsed == ["usa.xml"]
+
+    def test_cli_needs_input_files(self, tmp_path):
+        output = tmp_path / "ranks.json"
+        output.write_text("{}")
+        runner = CliRunner()
+        result = runner.invoke(topsites.cli, ["--output", str(output)])
+        assert result.exit_code != 0
+        result = runner.invoke(topsites.cli, ["--output", str(output), str(tmp_path)])
+        assert result.exit_code == 1
+        assert "no <country>.xml" in result.output
+
+        write_topsites(str(tmp_path / "usa.xml"), [("google.com", 800000)])
+        result = runner.invoke(topsites.cli, ["--output", str(output), str(tmp_path)])
+        assert result.exit_code == 0, result.output
+        assert json.loads(output.read_text()) == {"google.com": "🇺🇸 #1"}
+
+    @pytest.mark.skipif(not os.path.isdir(ALEXA_DIR), reason="no alexa data")
+    def test_matches_bundled_ranks(self, tmp_path):
+        ranks = topsites.build(ALEXA_DIR, cache_path=str(tmp_path / "cache.json"))
+        with open(WORLD_RANKS_PATH) as f:
+            assert json.dumps(ranks) + "\n" == f.read()
@@ -0,0 +1,101 @@
+from contextlib import contextmanager
+import datetime as dt
+import json
+import re
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import attr
+
+
+def memory_mb() -> Optional[Tuple[float, float]]:
+    """Return (resident set size, its peak) in megabytes, where /proc has them."""
+    try:
+        with open("/proc/self/status") as f:
+            status = f.read()
+    except OSError:
+        return None
+    fields = dict(re.findall(r"^(VmRSS|VmHWM):\s+(\d+) kB", status, re.MULTILINE))
+    if len(fields) < 2:
+        return None
+    return int(fields["VmRSS"]) / 2**10, int(fields["VmHWM"]) / 2**10
+
+
+def reset_peak() -> bool:
+    """Start measuring the peak resident set size from now; Linux only."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return False
+    return True
+
+
+@attr.s
+class Span:
+    name: str = attr.ib()
+    start: float = attr.ib()
+    seconds: float = attr.ib(default=0.0)
+    rows: Optional[int] = attr.ib(default=None)
+    rss_mb: Optional[float] = attr.ib(default=None)
+    rss_delta_mb: Optional[float] = attr.ib(default=None)
+    peak_rss_mb: Optional[float] = attr.ib(default=None)
+
+
+class Timer:
+    """Records how long each named stage of a run takes, and its memory use.
+
+    Stages nest; a stage started inside another is reported as
+    "outer/inner". Code being timed can set rows on the span it is handed.
+    Each span records resident memory at its end and how much that grew
+    over the stage. With track_peak, it also records the peak during the
+    stage. The kernel keeps a single peak for the process, so that resets
+    it at every stage boundary, and carries the peak so far into each stage
+    still open; anything else reading the process's peak then sees only
+    the current stage's.
+    """
+
+    def __init__(self, track_peak: bool = False) -> None:
+        self.started = dt.datetime.now()
+        self._origin = time.perf_counter()
+        self._stack: List[str] = []
+        self._peaks: List[float] = []
+        self._tracks_peak = track_peak and reset_peak()
+        self.spans: List[Span] = []
+
+    def _take_peak(self) -> Optional[Tuple[float, float]]:
+        memory = memory_mb()
+        if memory is not None and self._tracks_peak:
+            self._peaks = [max(peak, memory[1]) for peak in self._peaks]
+            reset_peak()
+        return memory
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[Span]:
+        before = self._take_peak()
+        self._stack.append(name)
+        self._peaks.append(0.0)
+        span = Span("/".join(self._stack), time.perf_counter() - self._origin)
+        try:
+            yield span
+        finally:
+            span.seconds = time.perf_counter() - self._origin - span.start
+            after = self._take_peak()
+            self._stack.pop()
+            peak = self._peaks.pop()
+            if before is not None and after is not None:
+                span.rss_mb = after[0]
+                span.rss_delta_mb = after[0] - before[0]
+                if self._tracks_peak:
+                    span.peak_rss_mb = peak
+            self.spans.append(span)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "started": self.started.isoformat(),
+            "stages": [attr.asdict(span) for span in sorted(self.spans, key=lambda s: s.start)],
+        }
+
+    def write(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
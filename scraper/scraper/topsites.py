@@ -0,0 +1,214 @@
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+import xml.etree.ElementTree as ET
+
+import click
+
+from .output import write_atomic
+from .ranks import WORLD_RANKS_PATH, world_ranks
+
+FLAGS = {
+    "china": "🇨🇳",
+    "france": "🇫🇷",
+    "germany": "🇩🇪",
+    "global": "🌎",
+    "usa": "🇺🇸",
+    "russia": "🇷🇺",
+}
+
+# Millions of internet users
+INTERNET_USERS = {
+    "global": 3000,
+    "china": 721,
+    "usa": 287,
+    "russia": 102,
+    "france": 56,
+    "germany": 71,
+}
+
+ATS = "{http://ats.amazonaws.com/doc/2005-07-11}"
+SITES = ATS + "Sites"
+SITE = ATS + "Site"
+DATA_URL = ATS + "DataUrl"
+COUNTRY = ATS + "Country"
+RANK = ATS + "Rank"
+PER_MILLION = "{0}Reach/{0}PerMillion".format(ATS)
+
+Site = Tuple[str, int, float]
+
+
+def parse_country(path: str) -> List[Site]:
+    """Return (domain, rank, reach per million) for each site in a TopSites file.
+
+    The file is parsed as a stream, picking up fields as their elements
+    end. Each site is dropped from the tree once read, so memory doesn't
+    grow with the length of the list.
+    """
+    sites: List[Site] = []
+    parent = None
+    domain: Optional[str] = None
+    rank: Optional[str] = None
+    reach: Optional[str] = None
+    for event, elem in ET.iterparse(path, events=("start", "end")):
+        tag = elem.tag
+        if event == "start":
+            if tag == SITES:
+                parent = elem
+        elif tag == DATA_URL:
+            domain = elem.text
+        elif tag == COUNTRY:
+            # The site's rank in this country, not the <Global> one
+            rank = elem.findtext(RANK)
+            reach = elem.findtext(PER_MILLION)
+        elif tag == SITE:
+            if domain is None or rank is None or reach is None:
+                raise ValueError("%s: site %d has no DataUrl, Rank or PerMillion" % (
+                    path, len(sites) + 1))
+            sites.append((domain, int(rank), float(reach)))
+            domain = rank = reach = None
+            if parent is not None:
+                parent.remove(elem)
+    return sites
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """Parsed sites per file, stored as JSON next to the source files.
+
+    An entry is reused if the file's size and mtime are unchanged, or if
+    they changed but its contents hash the same. Sites are stored as three
+    parallel lists, which load much faster than a list per site.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.dirty = False
+        try:
+            with open(path) as f:
+                self.entries: Dict[str, Dict[str, Any]] = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, path: str) -> Optional[List[Site]]:
+        entry = self.entries.get(os.path.basename(path))
+        if entry is None:
+            return None
+        stat = os.stat(path)
+        if (entry["size"], entry["mtime"]) != (stat.st_size, stat.st_mtime_ns):
+            if entry["sha256"] != file_hash(path):
+                return None
+            entry["size"], entry["mtime"] = stat.st_size, stat.st_mtime_ns
+            self.dirty = True
+        return list(zip(entry["domains"], entry["ranks"], entry["reach"]))
+
+    def put(self, path: str, sites: List[Site]) -> None:
+        stat = os.stat(path)
+        domains, ranks, reach = zip(*sites) if sites else ((), (), ())
+        self.entries[os.path.basename(path)] = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "sha256": file_hash(path),
+            "domains": domains,
+            "ranks": ranks,
+            "reach": reach,
+        }
+        self.dirty = True
+
+    def save(self) -> None:
+        if self.dirty:
+            write_atomic(self.path, json.dumps(self.entries).encode("utf-8"))
+            self.dirty = False
+
+
+def parse_all(paths: List[str], cache: ParseCache, max_workers: Optional[int] = None):
+    """Return {path: sites}, parsing the files the cache can't answer for in parallel."""
+    parsed = {path: cache.get(path) for path in paths}
+    stale = [path for path, sites in parsed.items() if sites is None]
+    if len(stale) > 1 and max_workers != 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            fresh = list(executor.map(parse_country, stale))
+    else:
+        fresh = [parse_country(path) for path in stale]
+    for path, sites in zip(stale, fresh):
+        cache.put(path, sites)
+        parsed[path] = sites
+    return parsed
+
+
+def condense(by_country: Dict[str, List[Site]]) -> Dict[str, str]:
+    """Label each domain with the country where it reaches the most users.
+
+    Domains keep the order they were first seen in, and ties go to the
+    country listed first, so the output is stable.
+    """
+    best: Dict[str, Tuple[float, str, int]] = {}
+    for country, sites in by_country.items():
+        latest = {domain: (rank, per_million) for domain, rank, per_million in sites}
+        for domain, (rank, per_million) in latest.items():
+            reach = per_million * INTERNET_USERS[country]
+            if domain not in best or reach > best[domain][0]:
+                best[domain] = (reach, country, rank)
+    return {
+        domain: "{} #{}".format(FLAGS[country], rank)
+        for domain, (_, country, rank) in best.items()
+    }
+
+
+def build(
+        directory: str,
+        cache_path: Optional[str] = None,
+        max_workers: Optional[int] = None) -> Dict[str, str]:
+    """Rank the sites listed in the Alexa TopSites responses in directory.
+
+    directory holds a <country>.xml for some of the countries in FLAGS;
+    ValueError is raised if it holds none. Parsed files are cached in
+    cache_path, which by default is a file in directory.
+    """
+    paths = {
+        country: os.path.join(directory, country + ".xml")
+        for country in FLAGS
+        if os.path.exists(os.path.join(directory, country + ".xml"))
+    }
+    if not paths:
+        raise ValueError("%s has no <country>.xml TopSites files" % directory)
+    cache = ParseCache(cache_path or os.path.join(directory, ".condense-cache.json"))
+    parsed = parse_all(list(paths.values()), cache, max_workers)
+    cache.save()
+    return condense({country: parsed[path] for country, path in paths.items()})
+
+
+@click.command()
+@click.option("--output", "-o", default=WORLD_RANKS_PATH, show_default=True,
+              help="Where to write the rankings; - for stdout.")
+@click.option("--cache", "cache_path",
+              help="Where to keep parsed files. Defaults to .condense-cache.json in DIRECTORY.")
+@click.option("--workers", type=int, help="Processes to parse files with.")
+@click.argument("directory", type=click.Path(exists=True, file_okay=False))
+def cli(output, cache_path, workers, directory):
+    """Condense the top sites lists in DIRECTORY into one ranking."""
+    try:
+        ranks = build(directory, cache_path, workers)
+    except ValueError as e:
+        # Don't replace the rankings with an empty or partial set
+        raise click.ClickException(str(e))
+    data = json.dumps(ranks) + "\n"
+    if output == "-":
+        click.echo(data, nl=False)
+        return
+    write_atomic(output, data.encode("utf-8"))
+    world_ranks.cache_clear()
+    click.echo("Wrote %d sites to %s" % (len(ranks), output))
+
+
+if __name__ == "__main__":
+    cli()
@@ -12,10 +12,14 @@ setup(
         "click",
         "dateutil",
         "github3.py",
+        "numpy",
         "pandas",
         "requests",
     ],
     extras_require={
+        "arrow": [
+            "pyarrow",
+        ],
         "test": [
             "pytest",
         ]